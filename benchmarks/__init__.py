@@ -0,0 +1,15 @@
+"""Benchmarks for the client hot paths; run them with python -m benchmarks.run.
+
+The repository's websocket/ directory is not a package of its own: the websocket-client
+distribution owns the `websocket` name (websocket_manager imports WebSocketApp from it). The
+directory is added to that package's search path here so the benchmarks can import the client
+modules.
+"""
+import os
+
+import websocket
+
+_WEBSOCKET_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'websocket')
+if _WEBSOCKET_DIR not in websocket.__path__:
+    websocket.__path__.append(_WEBSOCKET_DIR)
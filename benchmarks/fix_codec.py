@@ -0,0 +1,192 @@
+"""FIX parsing and encoding: simplefix (as FixConnection used it, decoding every field into a
+dict for string lookups) against fix.codec, and FixConnection's send and receive paths.
+
+Run from the repository root: python -m benchmarks.run fix.
+"""
+import time
+from typing import Callable, Dict, List, Tuple
+
+import simplefix
+
+from benchmarks.fixtures import FIX_SENDER_ID, FIX_TARGET_ID, load_fix_messages
+from benchmarks.run import benchmark, timed
+from fix.client import FixConnection
+from fix.codec import FixDecoder, FixEncoder
+
+# The tags the session and order manager read from an execution report
+READ_TAGS = [simplefix.TAG_MSGSEQNUM, simplefix.TAG_SENDER_COMPID, simplefix.TAG_TARGET_COMPID,
+             simplefix.TAG_BEGINSTRING, simplefix.TAG_SENDING_TIME, simplefix.TAG_CLORDID,
+             simplefix.TAG_ORDERID, simplefix.TAG_ORDSTATUS, simplefix.TAG_CUMQTY,
+             simplefix.TAG_AVGPX]
+SENDING_TIME = '20240102-03:04:05.678'
+
+
+def chunks(data: bytes, size: int = 4096) -> List[bytes]:
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def parse_simplefix(data: List[bytes]) -> List[Dict[bytes, str]]:
+    parser = simplefix.FixParser()
+    parsed = []
+    for chunk in data:
+        parser.append_buffer(chunk)
+        while True:
+            msg = parser.get_message()
+            if msg is None:
+                break
+            decoded = {k: v.decode() for k, v in msg.pairs}
+            parsed.append({tag: decoded.get(tag) for tag in READ_TAGS})
+    return parsed
+
+
+def parse_codec(data: List[bytes]) -> List[Dict[bytes, str]]:
+    decoder = FixDecoder()
+    parsed = []
+    for chunk in data:
+        decoder.feed(chunk)
+        for frame in decoder:
+            frame.raw.decode()
+            parsed.append({tag: frame.get(tag) for tag in READ_TAGS})
+    return parsed
+
+
+def orders(count: int = 5000) -> List[List[Tuple[bytes, object]]]:
+    return [[
+        (simplefix.TAG_HANDLINST, simplefix.HANDLINST_AUTO_PRIVATE),
+        (simplefix.TAG_CLORDID, f'client-{i}'),
+        (simplefix.TAG_SYMBOL, 'BTC-PERP'),
+        (simplefix.TAG_SIDE, simplefix.SIDE_BUY if i % 2 else simplefix.SIDE_SELL),
+        (simplefix.TAG_PRICE, 40000.5 + i % 50),
+        (simplefix.TAG_ORDERQTY, 0.25),
+        (simplefix.TAG_ORDTYPE, simplefix.ORDTYPE_LIMIT),
+        (simplefix.TAG_TIMEINFORCE, simplefix.TIMEINFORCE_GOOD_TILL_CANCEL),
+    ] for i in range(count)]
+
+
+def encode_simplefix(messages: List[List[Tuple[bytes, object]]]) -> List[bytes]:
+    encoded = []
+    for seq_num, fields in enumerate(messages, 1):
+        msg = simplefix.FixMessage()
+        msg.append_pair(simplefix.TAG_BEGINSTRING, 'FIX.4.2')
+        msg.append_pair(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_NEW_ORDER_SINGLE)
+        msg.append_pair(simplefix.TAG_SENDER_COMPID, FIX_TARGET_ID)
+        msg.append_pair(simplefix.TAG_TARGET_COMPID, FIX_SENDER_ID)
+        msg.append_pair(simplefix.TAG_MSGSEQNUM, seq_num)
+        msg.append_pair(simplefix.TAG_SENDING_TIME, SENDING_TIME)
+        for tag, value in fields:
+            msg.append_pair(tag, value)
+        encoded.append(msg.encode())
+    return encoded
+
+
+def encode_codec(messages: List[List[Tuple[bytes, object]]]) -> List[bytes]:
+    encoder = FixEncoder(FIX_TARGET_ID, FIX_SENDER_ID)
+    return [encoder.encode(simplefix.MSGTYPE_NEW_ORDER_SINGLE, seq_num, fields, SENDING_TIME)
+            for seq_num, fields in enumerate(messages, 1)]
+
+
+def _parse(parse: Callable[[List[bytes]], List]) -> Tuple[Callable[[], float], int]:
+    data = chunks(load_fix_messages())
+    return timed(lambda: parse(data)), len(parse_codec(data))
+
+
+@benchmark('fix.codec.parse.simplefix')
+def fix_codec_parse_simplefix() -> Tuple[Callable[[], float], int]:
+    return _parse(parse_simplefix)
+
+
+@benchmark('fix.codec.parse')
+def fix_codec_parse() -> Tuple[Callable[[], float], int]:
+    data = chunks(load_fix_messages())
+    assert parse_simplefix(data) == parse_codec(data)
+    return _parse(parse_codec)
+
+
+def _encode(encode: Callable[[List], List[bytes]]) -> Tuple[Callable[[], float], int]:
+    messages = orders()
+    return timed(lambda: encode(messages)), len(messages)
+
+
+@benchmark('fix.codec.encode.simplefix')
+def fix_codec_encode_simplefix() -> Tuple[Callable[[], float], int]:
+    return _encode(encode_simplefix)
+
+
+@benchmark('fix.codec.encode')
+def fix_codec_encode() -> Tuple[Callable[[], float], int]:
+    messages = orders(100)
+    assert encode_simplefix(messages) == encode_codec(messages)
+    return _encode(encode_codec)
+
+
+class _NullSocket:
+    def __init__(self, data: bytes = b'', chunk_size: int = 4096) -> None:
+        self._data = memoryview(data)
+        self._offset = 0
+        self._chunk_size = chunk_size
+
+    def setsockopt(self, *args) -> None:
+        pass
+
+    def sendall(self, data: bytes) -> None:
+        pass
+
+    def recv(self, size: int) -> bytes:
+        chunk = self._data[self._offset:self._offset + min(size, self._chunk_size)]
+        self._offset += len(chunk)
+        return bytes(chunk)
+
+    def recv_into(self, buffer, size: int = 0) -> int:
+        chunk = self._data[self._offset:self._offset + min(size or len(buffer),
+                                                           self._chunk_size)]
+        buffer[:len(chunk)] = chunk
+        self._offset += len(chunk)
+        return len(chunk)
+
+    def shutdown(self, how: int) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+@benchmark('fix.encode')
+def fix_encode() -> Tuple[Callable[[], float], int]:
+    """FixConnection.send of new orders to a socket that discards the bytes."""
+    orders = [{
+        simplefix.TAG_MSGTYPE: simplefix.MSGTYPE_NEW_ORDER_SINGLE,
+        simplefix.TAG_HANDLINST: simplefix.HANDLINST_AUTO_PRIVATE,
+        simplefix.TAG_CLORDID: f'client-{i}',
+        simplefix.TAG_SYMBOL: 'BTC-PERP',
+        simplefix.TAG_SIDE: simplefix.SIDE_BUY if i % 2 else simplefix.SIDE_SELL,
+        simplefix.TAG_PRICE: 40000.5,
+        simplefix.TAG_ORDERQTY: 0.25,
+        simplefix.TAG_ORDTYPE: simplefix.ORDTYPE_LIMIT,
+        simplefix.TAG_TIMEINFORCE: simplefix.TIMEINFORCE_GOOD_TILL_CANCEL,
+    } for i in range(2000)]
+
+    def run() -> float:
+        conn = FixConnection(_NullSocket(), FIX_TARGET_ID, FIX_SENDER_ID, heartbeats=False)
+        start = time.perf_counter()
+        for order in orders:
+            conn.send(order)
+        return time.perf_counter() - start
+    return run, len(orders)
+
+
+@benchmark('fix.parse')
+def fix_parse() -> Tuple[Callable[[], float], int]:
+    """Read, parse and validate a recorded stream of execution reports via
+    FixConnection.messages."""
+    data = load_fix_messages()
+    count = data.count(b'\x0110=')
+
+    def run() -> float:
+        conn = FixConnection(_NullSocket(data), FIX_TARGET_ID, FIX_SENDER_ID,
+                              heartbeats=False)
+        start = time.perf_counter()
+        received = sum(1 for _ in conn.messages)
+        elapsed = time.perf_counter() - start
+        assert received == count, f'parsed {received} of {count} messages'
+        return elapsed
+    return run, count
@@ -0,0 +1,159 @@
+"""Message fixtures for the benchmarks.
+
+The websocket fixture holds frames in the shape sent by wss://ftx.com/ws/ (orderbook partial and
+updates with valid checksums, trades and ticker messages for a few markets). The FIX fixture is
+the byte stream of a session's execution reports as received from FTX. Regenerate with
+python -m benchmarks.fixtures
+"""
+import json
+import os
+import random
+from typing import List
+
+import simplefix
+
+from websocket.orderbook import OrderBook
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+WS_MESSAGES_PATH = os.path.join(FIXTURES_DIR, 'ws_messages.jsonl')
+FIX_MESSAGES_PATH = os.path.join(FIXTURES_DIR, 'fix_messages.bin')
+FIX_SENDER_ID = 'FTX'
+FIX_TARGET_ID = 'bench'
+
+MARKETS = {'BTC-PERP': 40000.0, 'ETH-PERP': 2500.0, 'SOL/USD': 150.0}
+
+
+def generate_ws_messages(count: int = 1500, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    books = {market: OrderBook() for market in MARKETS}
+    now = 1640995200.0
+    messages = []
+
+    def orderbook_message(market: str, action: str, bids: list, asks: list) -> str:
+        book = books[market]
+        book.update('bids', bids)
+        book.update('asks', asks)
+        return json.dumps({'channel': 'orderbook', 'market': market, 'type': action, 'data': {
+            'time': now, 'checksum': book.checksum(), 'bids': bids, 'asks': asks,
+            'action': action,
+        }})
+
+    for market, mid in MARKETS.items():
+        tick = mid / 40000
+        messages.append(json.dumps({'type': 'subscribed', 'channel': 'orderbook',
+                                    'market': market}))
+        messages.append(orderbook_message(
+            market, 'partial',
+            [[round(mid - tick * (i + 1), 6), round(rng.uniform(0.01, 5), 4)] for i in range(100)],
+            [[round(mid + tick * (i + 1), 6), round(rng.uniform(0.01, 5), 4)] for i in range(100)],
+        ))
+
+    while len(messages) < count:
+        now += rng.expovariate(200)
+        market = rng.choice(list(MARKETS))
+        mid = MARKETS[market]
+        tick = mid / 40000
+        kind = rng.random()
+        if kind < 0.8:
+            bids, asks = [], []
+            for _ in range(rng.randint(1, 4)):
+                level = int(rng.expovariate(0.1))
+                size = 0 if rng.random() < 0.3 else round(rng.uniform(0.01, 5), 4)
+                if rng.random() < 0.5:
+                    bids.append([round(mid - tick * (level + 1), 6), size])
+                else:
+                    asks.append([round(mid + tick * (level + 1), 6), size])
+            messages.append(orderbook_message(market, 'update', bids, asks))
+        elif kind < 0.95:
+            side = rng.choice(['buy', 'sell'])
+            messages.append(json.dumps({'channel': 'trades', 'market': market, 'type': 'update',
+                                        'data': [{
+                                            'id': len(messages), 'price': mid,
+                                            'size': round(rng.uniform(0.001, 2), 4),
+                                            'side': side, 'liquidation': False,
+                                            'time': '2022-01-01T00:00:00.123456+00:00',
+                                        }]}))
+        else:
+            best_bid, best_ask = books[market].bids.best(), books[market].asks.best()
+            messages.append(json.dumps({'channel': 'ticker', 'market': market, 'type': 'update',
+                                        'data': {'bid': best_bid[0], 'ask': best_ask[0],
+                                                 'bidSize': best_bid[1], 'askSize': best_ask[1],
+                                                 'last': mid, 'time': now}}))
+    return messages
+
+
+def generate_fix_messages(count: int = 2000, seed: int = 0) -> bytes:
+    """A logon followed by new / partial fill / fill / cancel execution reports, with
+    consecutive sequence numbers from FIX_SENDER_ID to FIX_TARGET_ID."""
+    rng = random.Random(seed)
+    encoded = []
+
+    def message(seq_num: int, pairs: list) -> bytes:
+        msg = simplefix.FixMessage()
+        msg.append_pair(simplefix.TAG_BEGINSTRING, 'FIX.4.2')
+        msg.append_pair(simplefix.TAG_SENDER_COMPID, FIX_SENDER_ID)
+        msg.append_pair(simplefix.TAG_TARGET_COMPID, FIX_TARGET_ID)
+        msg.append_pair(simplefix.TAG_MSGSEQNUM, seq_num)
+        msg.append_pair(simplefix.TAG_SENDING_TIME, '20220101-00:00:00.000')
+        for tag, value in pairs:
+            msg.append_pair(tag, value)
+        return msg.encode()
+
+    encoded.append(message(1, [(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_LOGON),
+                               (simplefix.TAG_ENCRYPTMETHOD, 0),
+                               (simplefix.TAG_HEARTBTINT, 30)]))
+    order_id = 1000000
+    while len(encoded) < count:
+        order_id += 1
+        market = rng.choice(list(MARKETS))
+        price, size = MARKETS[market], round(rng.uniform(0.01, 5), 4)
+        side = rng.choice([simplefix.SIDE_BUY, simplefix.SIDE_SELL])
+        filled = 0.
+        for exec_type, status in rng.choice([
+                [(simplefix.EXECTYPE_NEW, simplefix.ORDSTATUS_NEW),
+                 (simplefix.EXECTYPE_CANCELED, simplefix.ORDSTATUS_CANCELED)],
+                [(simplefix.EXECTYPE_NEW, simplefix.ORDSTATUS_NEW),
+                 (simplefix.EXECTYPE_PARTIAL_FILL, simplefix.ORDSTATUS_PARTIALLY_FILLED),
+                 (simplefix.EXECTYPE_FILL, simplefix.ORDSTATUS_FILLED)]]):
+            last = 0. if exec_type in (simplefix.EXECTYPE_NEW, simplefix.EXECTYPE_CANCELED) else \
+                round((size - filled) / (2 if exec_type == simplefix.EXECTYPE_PARTIAL_FILL else 1),
+                      4)
+            filled += last
+            encoded.append(message(len(encoded) + 1, [
+                (simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_EXECUTION_REPORT),
+                (simplefix.TAG_ORDERID, order_id),
+                (simplefix.TAG_CLORDID, f'client-{order_id}'),
+                (simplefix.TAG_EXECID, f'{order_id}-{len(encoded)}'),
+                (simplefix.TAG_EXECTYPE, exec_type),
+                (simplefix.TAG_ORDSTATUS, status),
+                (simplefix.TAG_SYMBOL, market),
+                (simplefix.TAG_SIDE, side),
+                (simplefix.TAG_ORDERQTY, size),
+                (simplefix.TAG_PRICE, price),
+                (simplefix.TAG_CUMQTY, round(filled, 4)),
+                (simplefix.TAG_LEAVESQTY, 0 if status in (simplefix.ORDSTATUS_FILLED,
+                                                          simplefix.ORDSTATUS_CANCELED)
+                 else round(size - filled, 4)),
+                (simplefix.TAG_AVGPX, price if filled else 0),
+                (simplefix.TAG_LASTQTY, last),
+                (simplefix.TAG_LASTPX, price if last else 0),
+            ]))
+    return b''.join(encoded)
+
+
+def load_ws_messages() -> List[str]:
+    with open(WS_MESSAGES_PATH) as f:
+        return [line.rstrip('\n') for line in f]
+
+
+def load_fix_messages() -> bytes:
+    with open(FIX_MESSAGES_PATH, 'rb') as f:
+        return f.read()
+
+
+if __name__ == '__main__':
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    with open(WS_MESSAGES_PATH, 'w') as f:
+        f.writelines(message + '\n' for message in generate_ws_messages())
+    with open(FIX_MESSAGES_PATH, 'wb') as f:
+        f.write(generate_fix_messages())
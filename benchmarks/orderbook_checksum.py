@@ -0,0 +1,113 @@
+"""Orderbook delta application + checksum, against the previous sort-per-update path, and
+get_orderbook snapshots.
+
+Run from the repository root: python -m benchmarks.run orderbook.
+"""
+import random
+import zlib
+from collections import defaultdict
+from itertools import zip_longest
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.fixtures import load_ws_messages
+from benchmarks.run import benchmark, timed
+from benchmarks.ws_dispatch import OfflineWebsocketClient
+from websocket.orderbook import OrderBook
+
+
+def generate_updates(count: int = 20000, levels: int = 400, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    updates = []
+    for _ in range(count):
+        data = {'bids': [], 'asks': []}
+        for _ in range(rng.randint(1, 3)):
+            side = rng.choice(['bids', 'asks'])
+            offset = min(int(rng.expovariate(0.05)), levels) * 0.5
+            price = 10000.0 - offset if side == 'bids' else 10000.5 + offset
+            data[side].append([price, rng.choice([0.0, 0.0, 0.01, 0.5, 1.25, 3.0])])
+        updates.append(data)
+    return updates
+
+
+def legacy_checksum(book: Dict[str, Dict[float, float]]) -> int:
+    orderbook = {
+        side: sorted(
+            [(price, quantity) for price, quantity in list(book[side].items()) if quantity],
+            key=lambda order: order[0] * (-1 if side == 'bids' else 1)
+        )
+        for side in {'bids', 'asks'}
+    }
+    checksum_data = [
+        ':'.join([f'{float(order[0])}:{float(order[1])}' for order in (bid, offer) if order])
+        for (bid, offer) in zip_longest(orderbook['bids'][:100], orderbook['asks'][:100])
+    ]
+    return int(zlib.crc32(':'.join(checksum_data).encode()))
+
+
+def run_legacy(updates: List[Dict]) -> List[int]:
+    book: Dict[str, Dict[float, float]] = {side: defaultdict(float) for side in {'bids', 'asks'}}
+    checksums = []
+    for data in updates:
+        for side in {'bids', 'asks'}:
+            for price, size in data[side]:
+                if size:
+                    book[side][price] = size
+                else:
+                    book[side].pop(price, None)
+        checksums.append(legacy_checksum(book))
+    return checksums
+
+
+def run_incremental(updates: List[Dict], every: int = 1) -> List[int]:
+    book = OrderBook()
+    checksums = []
+    for i, data in enumerate(updates):
+        for side in {'bids', 'asks'}:
+            book.update(side, data[side])
+        if i % every == 0:
+            checksums.append(book.checksum())
+    return checksums
+
+
+@benchmark('orderbook.update_checksum.legacy')
+def orderbook_update_checksum_legacy() -> Tuple[Callable[[], float], int]:
+    """The previous path: sort both sides and checksum the whole book on every update."""
+    updates = generate_updates(5000)
+    return timed(lambda: run_legacy(updates)), len(updates)
+
+
+@benchmark('orderbook.update_checksum')
+def orderbook_update_checksum() -> Tuple[Callable[[], float], int]:
+    updates = generate_updates(5000)
+    assert run_legacy(updates[:2000]) == run_incremental(updates[:2000])
+    return timed(lambda: run_incremental(updates)), len(updates)
+
+
+@benchmark('orderbook.update_checksum.every10')
+def orderbook_update_checksum_every10() -> Tuple[Callable[[], float], int]:
+    updates = generate_updates(5000)
+    return timed(lambda: run_incremental(updates, 10)), len(updates)
+
+
+def _snapshot(depth: Optional[int]) -> Tuple[Callable[[], float], int]:
+    messages = load_ws_messages()
+    client = OfflineWebsocketClient()
+    client.prime(messages)
+    for message in messages:
+        client._on_message(None, message)
+    markets = ['BTC-PERP', 'ETH-PERP', 'SOL/USD'] * 5000
+
+    def run() -> None:
+        for market in markets:
+            client.get_orderbook(market, depth)
+    return timed(run), len(markets)
+
+
+@benchmark('orderbook.snapshot.full')
+def orderbook_snapshot_full() -> Tuple[Callable[[], float], int]:
+    return _snapshot(None)
+
+
+@benchmark('orderbook.snapshot.depth10')
+def orderbook_snapshot_depth10() -> Tuple[Callable[[], float], int]:
+    return _snapshot(10)
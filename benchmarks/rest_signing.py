@@ -0,0 +1,100 @@
+"""Per-request overhead of building and signing REST requests: the previous Request +
+double prepare() path against FtxClient._prepare_request, and a whole request without the
+network.
+
+Run from the repository root: python -m benchmarks.run rest.
+"""
+import hmac
+import time
+import urllib.parse
+from typing import Any, Callable, Dict, List, Tuple
+
+from requests import PreparedRequest, Request, Response
+
+from benchmarks.run import benchmark, timed
+from rest.client import FtxClient
+
+API_KEY = 'api-key'
+API_SECRET = 'api-secret'
+SUBACCOUNT = 'my subaccount'
+
+
+def legacy_prepare(method: str, path: str, **kwargs) -> PreparedRequest:
+    request = Request(method, FtxClient._ENDPOINT + path, **kwargs)
+    ts = int(time.time() * 1000)
+    prepared = request.prepare()
+    signature_payload = f'{ts}{prepared.method}{prepared.path_url}'.encode()
+    if prepared.body:
+        signature_payload += prepared.body
+    signature = hmac.new(API_SECRET.encode(), signature_payload, 'sha256').hexdigest()
+    request.headers['FTX-KEY'] = API_KEY
+    request.headers['FTX-SIGN'] = signature
+    request.headers['FTX-TS'] = str(ts)
+    request.headers['FTX-SUBACCOUNT'] = urllib.parse.quote(SUBACCOUNT)
+    return request.prepare()
+
+
+def order_requests(count: int = 5000) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """The request mix of high-frequency order entry: place, modify and cancel."""
+    requests = []
+    for i in range(count // 3):
+        requests.append(('POST', 'orders', {'json': {
+            'market': 'BTC-PERP', 'side': 'buy' if i % 2 else 'sell', 'price': 40000. + i % 50,
+            'size': 0.01 * (1 + i % 7), 'type': 'limit', 'reduceOnly': False, 'ioc': False,
+            'postOnly': True, 'clientId': f'client-{i}'}}))
+        requests.append(('POST', f'orders/{1000000 + i}/modify',
+                         {'json': {'price': 40001. + i % 50}}))
+        requests.append(('DELETE', f'orders/{1000000 + i}', {'json': None}))
+    return requests
+
+
+def _prepare_all(prepare: Callable[..., PreparedRequest]) -> Tuple[Callable[[], float], int]:
+    requests = order_requests()
+
+    def run() -> None:
+        for method, path, kwargs in requests:
+            prepare(method, path, **kwargs)
+    return timed(run), len(requests)
+
+
+@benchmark('rest.prepare.legacy')
+def rest_prepare_legacy() -> Tuple[Callable[[], float], int]:
+    """The previous path: Request + prepare() twice."""
+    return _prepare_all(legacy_prepare)
+
+
+@benchmark('rest.prepare')
+def rest_prepare() -> Tuple[Callable[[], float], int]:
+    client = FtxClient(API_KEY, API_SECRET, SUBACCOUNT)
+    for method, path, kwargs in order_requests(30):
+        legacy, fast = legacy_prepare(method, path, **kwargs), \
+            client._prepare_request(method, path, **kwargs)
+        assert (legacy.url, legacy.body) == (fast.url, fast.body)
+        # Headers match apart from the signature, which depends on the millisecond timestamp
+        assert {k: v for k, v in legacy.headers.items() if k not in ('FTX-SIGN', 'FTX-TS')} == \
+            {k: v for k, v in fast.headers.items() if k not in ('FTX-SIGN', 'FTX-TS')}
+    return _prepare_all(client._prepare_request)
+
+
+@benchmark('rest.request')
+def rest_request() -> Tuple[Callable[[], float], int]:
+    """Build, sign and prepare a request and process its response, without the network."""
+    client = FtxClient('api-key', 'api-secret', 'subaccount')
+    response = Response()
+    response.status_code = 200
+    response._content = b'{"success": true, "result": null}'
+    client._session.send = lambda request, **kwargs: response
+    calls = [
+        ('GET', 'orders', {'params': {'market': 'BTC-PERP'}}),
+        ('GET', 'markets/BTC-PERP/orderbook', {'params': {'depth': 20}}),
+        ('POST', 'orders', {'json': {
+            'market': 'BTC-PERP', 'side': 'buy', 'price': 40000.5, 'size': 0.25,
+            'type': 'limit', 'reduceOnly': False, 'ioc': False, 'postOnly': True,
+            'clientId': 'client-1'}}),
+        ('DELETE', 'orders/123456789', {'json': None}),
+    ] * 250
+
+    def run() -> None:
+        for method, path, kwargs in calls:
+            client._send_request(method, path, **kwargs)
+    return timed(run), len(calls)
@@ -0,0 +1,143 @@
+"""Benchmark suite for the client hot paths, with results comparable across runs.
+
+Run from the repository root:
+    python -m benchmarks.run                      # print results
+    python -m benchmarks.run --save-baseline      # record benchmarks/baseline.json
+    python -m benchmarks.run --output results.json --max-regression 0.1
+
+Each benchmark reports the best time per operation over `--repeat` runs on the recorded
+fixtures in benchmarks/fixtures. When a baseline exists, every result is compared against it
+and the exit status is 1 if any benchmark got slower by more than `--max-regression`.
+Baselines are machine specific, so none is committed: record one on the machine the
+comparison runs on.
+
+The benchmarks themselves live in one module per area (AREAS), registered with @benchmark and
+timed with `timed`; filters such as `python -m benchmarks.run fix.` run one area.
+"""
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+AREAS = ['benchmarks.rest_signing', 'benchmarks.ws_dispatch', 'benchmarks.orderbook_checksum',
+         'benchmarks.fix_codec']
+
+# A benchmark prepares its inputs and returns (run, number of operations per run). `run` is
+# called once per repeat and may do per-run setup before returning the time it measured.
+Benchmark = Callable[[], Tuple[Callable[[], float], int]]
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str) -> Callable[[Benchmark], Benchmark]:
+    def register(f: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = f
+        return f
+    return register
+
+
+def timed(f: Callable[[], None]) -> Callable[[], float]:
+    """A benchmark run that times all of f."""
+    def run() -> float:
+        start = time.perf_counter()
+        f()
+        return time.perf_counter() - start
+    return run
+
+
+def load_benchmarks() -> None:
+    for area in AREAS:
+        importlib.import_module(area)
+
+
+def run_benchmarks(names: List[str], repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name in names:
+        run, ops = BENCHMARKS[name]()
+        timings = []
+        for _ in range(repeat):
+            # Like timeit, keep collections out of the measurements
+            gc.collect()
+            gc.disable()
+            try:
+                timings.append(run())
+            finally:
+                gc.enable()
+        results[name] = {'seconds_per_op': min(timings) / ops, 'ops': ops}
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            max_regression: float) -> List[str]:
+    """Names of the benchmarks that are more than `max_regression` slower than the baseline."""
+    return [name for name, result in results.items() if name in baseline and
+            result['seconds_per_op'] > baseline[name]['seconds_per_op'] * (1 + max_regression)]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filters', nargs='*',
+                        help='only run benchmarks whose name contains one of these')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='allowed slowdown against the baseline, as a fraction')
+    args = parser.parse_args(argv)
+
+    load_benchmarks()
+    names = [name for name in BENCHMARKS
+             if not args.filters or any(f in name for f in args.filters)]
+    results = run_benchmarks(names, args.repeat)
+    report = {
+        'meta': {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+        },
+        'results': results,
+    }
+
+    baseline = {}
+    if not args.save_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)['results']
+        else:
+            print(f'No baseline at {args.baseline}, nothing to compare against; record one '
+                  f'with --save-baseline', file=sys.stderr)
+    for name, result in results.items():
+        line = f'{name:<34} {result["seconds_per_op"] * 1e6:10.3f} us/op'
+        if name in baseline:
+            change = result['seconds_per_op'] / baseline[name]['seconds_per_op'] - 1
+            line += f' {change:+8.1%} vs baseline'
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Saved baseline to {args.baseline}')
+    elif baseline:
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f'Regressed by more than {args.max_regression:.0%}: {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    # The area modules register with benchmarks.run, not with this __main__ copy of it
+    from benchmarks.run import main as run_main
+    run_main()
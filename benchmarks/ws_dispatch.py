@@ -0,0 +1,75 @@
+"""Decode + dispatch throughput of FtxWebsocketClient._on_message over recorded frames.
+
+Run from the repository root: python -m benchmarks.run ws.
+"""
+import json
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.fixtures import load_ws_messages
+from benchmarks.run import benchmark, timed
+from websocket.client import Decoder, FtxWebsocketClient
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OfflineWebsocketClient(FtxWebsocketClient):
+    """Client that never touches the network, with the fixture markets already subscribed."""
+
+    def send(self, message) -> None:
+        pass
+
+    def prime(self, messages: List[str]) -> None:
+        self._reset_data()
+        for market in {json.loads(message).get('market') for message in messages} - {None}:
+            for channel in ('orderbook', 'trades', 'ticker'):
+                self._subscriptions.append({'channel': channel, 'market': market})
+
+
+def _decode(decoder: Callable[[str], Dict]) -> Tuple[Callable[[], float], int]:
+    messages = load_ws_messages()
+
+    def run() -> None:
+        for message in messages:
+            decoder(message)
+    return timed(run), len(messages)
+
+
+@benchmark('ws.decode.json')
+def ws_decode_json() -> Tuple[Callable[[], float], int]:
+    return _decode(json.loads)
+
+
+if orjson is not None:
+    @benchmark('ws.decode.orjson')
+    def ws_decode_orjson() -> Tuple[Callable[[], float], int]:
+        return _decode(orjson.loads)
+
+
+def _dispatch(decoder: Optional[Decoder]) -> Tuple[Callable[[], float], int]:
+    messages = load_ws_messages()
+    client = OfflineWebsocketClient(decoder=decoder)
+
+    def run() -> float:
+        client.prime(messages)
+        start = time.perf_counter()
+        for message in messages:
+            client._on_message(None, message)
+        return time.perf_counter() - start
+    return run, len(messages)
+
+
+@benchmark('ws.dispatch')
+def ws_dispatch() -> Tuple[Callable[[], float], int]:
+    """Decode, dispatch and apply recorded frames with the default client settings."""
+    return _dispatch(None)
+
+
+if orjson is not None:
+    @benchmark('ws.dispatch.json')
+    def ws_dispatch_json() -> Tuple[Callable[[], float], int]:
+        """As ws.dispatch, with the json decoder instead of the default orjson."""
+        return _dispatch(json.loads)
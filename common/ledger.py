@@ -0,0 +1,338 @@
+"""Positions and balances kept in process from fills, so exposure can be read without a REST
+round trip.
+
+A Ledger is seeded from one REST snapshot, then follows fills and order updates from the
+websocket or FIX execution reports (use one source per account; the same fill seen on both
+would be counted twice). Reads are plain dict lookups. reconcile() replaces the local state with
+a fresh REST snapshot and reports what had drifted; start_reconciling() runs it periodically.
+
+    ledger = Ledger(client)
+    ledger.reconcile()
+    ledger.follow(ws)                   # or ledger.follow_fix(fix_client.orders)
+    ledger.start_reconciling(60)
+    ledger.position('BTC-PERP').size, ledger.balance('USD')
+
+Positions are per market, with sizes signed (negative for shorts), the average price of the
+open position and the PnL realized by reducing it. Balances follow spot trades and fees; futures
+PnL reaches them only when reconcile() picks up the exchange's settlement.
+"""
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+from common.markets import MarketRegistry
+
+logger = logging.getLogger(__name__)
+
+# Sizes closer to zero than this are float noise from adding up fills
+_EPSILON = 1e-9
+
+
+class Position:
+    """State of one market. Replaced, never modified, on every change, so a Position read from
+    the ledger is a consistent snapshot."""
+
+    __slots__ = ('market', 'size', 'avg_price', 'realized_pnl', 'fees', 'open_buy_size',
+                 'open_sell_size')
+
+    def __init__(self, market: str, size: float = 0., avg_price: float = 0.,
+                 realized_pnl: float = 0., fees: float = 0., open_buy_size: float = 0.,
+                 open_sell_size: float = 0.) -> None:
+        self.market = market
+        self.size = size
+        self.avg_price = avg_price
+        self.realized_pnl = realized_pnl
+        self.fees = fees
+        self.open_buy_size = open_buy_size
+        self.open_sell_size = open_sell_size
+
+    def _replace(self, **changes: float) -> 'Position':
+        fields = {field: getattr(self, field) for field in self.__slots__}
+        fields.update(changes)
+        return Position(**fields)
+
+    def with_fill(self, side: str, price: float, size: float, fee: float = 0.) -> 'Position':
+        signed_size = size if side == 'buy' else -size
+        position_size, avg_price, realized_pnl = self.size, self.avg_price, self.realized_pnl
+        new_size = position_size + signed_size
+        if abs(new_size) < _EPSILON:
+            new_size = 0.
+        if position_size == 0. or (position_size > 0) == (signed_size > 0):
+            # Opening or adding
+            avg_price = (avg_price * abs(position_size) + price * size) / abs(new_size)
+        else:
+            closed_size = min(size, abs(position_size))
+            realized_pnl += closed_size * (price - avg_price) * (1 if position_size > 0 else -1)
+            if new_size == 0.:
+                avg_price = 0.
+            elif (new_size > 0) != (position_size > 0):
+                # Flipped: what is left was opened at this fill's price
+                avg_price = price
+        return self._replace(size=new_size, avg_price=avg_price, realized_pnl=realized_pnl,
+                             fees=self.fees + fee)
+
+    @property
+    def notional(self) -> float:
+        return self.size * self.avg_price
+
+    def unrealized_pnl(self, mark_price: float) -> float:
+        return self.size * (mark_price - self.avg_price)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Position):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return (f'Position({self.market!r}, {self.size} @ {self.avg_price}, '
+                f'realized {self.realized_pnl}, open {self.open_buy_size}/{self.open_sell_size})')
+
+
+def _spot_currencies(market: str, data: Optional[Dict[str, Any]] = None
+                     ) -> Optional[Tuple[str, str]]:
+    if data is not None and data.get('baseCurrency'):
+        return data['baseCurrency'], data['quoteCurrency']
+    if '/' in market:
+        base, quote = market.split('/', 1)
+        return base, quote
+    return None
+
+
+class Ledger:
+    def __init__(self, rest_client=None, max_fill_ids: int = 10000,
+                 markets: Optional[MarketRegistry] = None) -> None:
+        """rest_client, an FtxClient of the account, is what reconcile() snapshots. The ids of
+        the last max_fill_ids fills are kept so that fills replayed after a reconnect are not
+        applied twice. markets, if given, supplies the quote currency that FIX fees are charged
+        in; otherwise it is taken from a spot market's name, and is USD for futures."""
+        self._rest_client = rest_client
+        self._markets = markets
+        self._lock = threading.Lock()
+        self._positions: Dict[str, Position] = {}
+        self._balances: Dict[str, float] = {}
+        # order id -> (market, side, remaining size) of open orders
+        self._open_orders: Dict[Hashable, Tuple[str, str, float]] = {}
+        self._fill_ids: Set[Hashable] = set()
+        self._fill_id_order: Deque[Hashable] = deque()
+        self._max_fill_ids = max_fill_ids
+        # Bumped by every change, so reconcile() can tell whether one raced its snapshot
+        self._version = 0
+        self._reconciler: Optional[threading.Thread] = None
+        self._stop_reconciling = threading.Event()
+
+    def position(self, market: str) -> Position:
+        position = self._positions.get(market)
+        return position if position is not None else Position(market)
+
+    def positions(self) -> Dict[str, Position]:
+        return {market: position for market, position in self._positions.items()
+                if position.size or position.open_buy_size or position.open_sell_size}
+
+    def balance(self, coin: str) -> float:
+        return self._balances.get(coin, 0.)
+
+    def balances(self) -> Dict[str, float]:
+        return dict(self._balances)
+
+    def _seen_fill(self, fill_id: Hashable) -> bool:
+        """With the lock held: whether fill_id was applied before, remembering it if not."""
+        if fill_id in self._fill_ids:
+            return True
+        self._fill_ids.add(fill_id)
+        self._fill_id_order.append(fill_id)
+        if len(self._fill_id_order) > self._max_fill_ids:
+            self._fill_ids.discard(self._fill_id_order.popleft())
+        return False
+
+    def apply_fill(self, market: str, side: str, price: float, size: float, fee: float = 0.,
+                   fee_currency: Optional[str] = None, fill_id: Optional[Hashable] = None,
+                   currencies: Optional[Tuple[str, str]] = None) -> bool:
+        """Apply a fill; returns False if fill_id was already applied. currencies, the base and
+        quote coin of a spot market, default to those in its name."""
+        with self._lock:
+            if fill_id is not None and self._seen_fill(fill_id):
+                return False
+            self._positions[market] = self.position(market).with_fill(side, price, size, fee)
+            currencies = currencies or _spot_currencies(market)
+            balances = self._balances
+            if currencies is not None:
+                base, quote = currencies
+                signed_size = size if side == 'buy' else -size
+                balances[base] = balances.get(base, 0.) + signed_size
+                balances[quote] = balances.get(quote, 0.) - signed_size * price
+            if fee and fee_currency:
+                balances[fee_currency] = balances.get(fee_currency, 0.) - fee
+            self._version += 1
+            return True
+
+    def apply_order(self, order_id: Hashable, market: str, side: str,
+                    remaining_size: float) -> None:
+        """Track the unfilled size of an order, 0 once it is closed."""
+        with self._lock:
+            previous = self._open_orders.pop(order_id, None)
+            position = self.position(market)
+            buy_size, sell_size = position.open_buy_size, position.open_sell_size
+            if previous is not None:
+                previous_market, previous_side, previous_size = previous
+                if previous_market != market:
+                    self._positions[previous_market] = self._without_order(
+                        self.position(previous_market), previous_side, previous_size)
+                elif previous_side == 'buy':
+                    buy_size -= previous_size
+                else:
+                    sell_size -= previous_size
+            if remaining_size > 0:
+                self._open_orders[order_id] = (market, side, remaining_size)
+                if side == 'buy':
+                    buy_size += remaining_size
+                else:
+                    sell_size += remaining_size
+            self._positions[market] = position._replace(
+                open_buy_size=buy_size if buy_size > _EPSILON else 0.,
+                open_sell_size=sell_size if sell_size > _EPSILON else 0.)
+            self._version += 1
+
+    @staticmethod
+    def _without_order(position: Position, side: str, size: float) -> Position:
+        if side == 'buy':
+            return position._replace(open_buy_size=max(0., position.open_buy_size - size))
+        return position._replace(open_sell_size=max(0., position.open_sell_size - size))
+
+    def handle_fill(self, fill: Dict[str, Any]) -> bool:
+        """Apply a fill in the REST / websocket format."""
+        market = fill['market']
+        return self.apply_fill(market, fill['side'], fill['price'], fill['size'],
+                               fill.get('fee') or 0., fill.get('feeCurrency'),
+                               ('fill', fill['id']) if fill.get('id') is not None else None,
+                               _spot_currencies(market, fill))
+
+    def handle_order(self, order: Dict[str, Any]) -> None:
+        """Apply an order in the REST / websocket format."""
+        remaining = order.get('remainingSize') if order.get('status') != 'closed' else 0.
+        self.apply_order(('order', order['id']), order['market'], order['side'],
+                         remaining or 0.)
+
+    def follow(self, ws_client) -> List:
+        """Subscribe to the fills and orders channels of an FtxWebsocketClient (of the same
+        account). Returns the subscriptions; close them to stop."""
+        return [
+            ws_client.subscribe('fills', callback=lambda event: self.handle_fill(event.data)),
+            ws_client.subscribe('orders', callback=lambda event: self.handle_order(event.data)),
+        ]
+
+    def follow_fix(self, order_manager) -> None:
+        """Apply the execution reports of a FixOrderManager (FixClient.orders)."""
+        order_manager.add_listener(self.handle_execution_report)
+
+    def handle_execution_report(self, order, msg) -> None:
+        """Listener for FixOrderManager: applies the fill an execution report carries, if any,
+        and the order's remaining size."""
+        last_size = msg.get(32)  # LastQty
+        if last_size and float(last_size) > 0:
+            exec_id = msg.get(17)  # ExecID
+            self.apply_fill(order.symbol, order.side, float(msg.get(31)),  # LastPx
+                            float(last_size), float(msg.get(12) or 0.),  # Commission
+                            self._quote_currency(order.symbol),
+                            ('exec', exec_id) if exec_id else None)
+        order_id = order.order_id or order.client_order_id
+        if order_id is not None:
+            remaining = order.remaining_size if order.is_open else 0
+            self.apply_order(('order', str(order_id)), order.symbol, order.side,
+                             float(remaining or 0))
+
+    def _quote_currency(self, market: str) -> str:
+        info = self._markets.get(market) if self._markets is not None else None
+        if info is not None and info.quote_currency:
+            return info.quote_currency
+        currencies = _spot_currencies(market)
+        return currencies[1] if currencies is not None else 'USD'
+
+    def reconcile(self, retries: int = 3) -> Optional[List[str]]:
+        """Replace positions, balances and open orders with a REST snapshot. Returns a
+        description of every value that differed. A snapshot taken while a fill or order update
+        arrived may be stale or ahead, so it is discarded and retaken, up to retries times;
+        returns None, having replaced nothing, if every attempt raced an update."""
+        for _ in range(retries + 1):
+            drift = self._reconcile_once()
+            if drift is not None:
+                return drift
+        logger.info('Ledger not reconciled: updates arrived during every REST snapshot')
+        return None
+
+    def _reconcile_once(self) -> Optional[List[str]]:
+        version = self._version
+        rest_positions = self._rest_client.get_positions(show_avg_price=True)
+        rest_balances = self._rest_client.get_balances()
+        rest_orders = self._rest_client.get_open_orders()
+        with self._lock:
+            if self._version != version:
+                return None
+            open_orders = {('order', order['id']): (order['market'], order['side'],
+                                                    order['remainingSize'])
+                           for order in rest_orders if order.get('remainingSize')}
+            open_sizes: Dict[str, List[float]] = {}
+            for market, side, size in open_orders.values():
+                sizes = open_sizes.setdefault(market, [0., 0.])
+                sizes[0 if side == 'buy' else 1] += size
+            rest_by_market = {position['future']: position for position in rest_positions}
+            positions = {}
+            for market in {*self._positions, *rest_by_market, *open_sizes}:
+                local = self._positions.get(market) or Position(market)
+                rest = rest_by_market.get(market)
+                size, avg_price, realized_pnl = local.size, local.avg_price, local.realized_pnl
+                if rest is not None:
+                    size = rest['netSize']
+                    avg_price = rest.get('recentAverageOpenPrice') or rest.get('entryPrice') or 0.
+                    realized_pnl = rest.get('realizedPnl', realized_pnl)
+                elif _spot_currencies(market) is None:
+                    size = avg_price = 0.
+                # Spot holdings are reconciled through the balances instead
+                buy_size, sell_size = open_sizes.get(market, (0., 0.))
+                positions[market] = local._replace(
+                    size=size, avg_price=avg_price, realized_pnl=realized_pnl,
+                    open_buy_size=buy_size, open_sell_size=sell_size)
+            balances = {balance['coin']: balance['total'] for balance in rest_balances}
+
+            drift = [f'{market}: {self.position(market)} != {position}'
+                     for market, position in positions.items()
+                     if self._differs(self.position(market), position)]
+            drift += [f'{coin}: {self._balances.get(coin, 0.)} != {total}'
+                      for coin, total in balances.items()
+                      if abs(self._balances.get(coin, 0.) - total) > _EPSILON]
+            self._positions = positions
+            self._balances = balances
+            self._open_orders = open_orders
+            self._version += 1
+        if drift:
+            logger.info('Ledger reconciled with REST: %s', '; '.join(drift))
+        return drift
+
+    @staticmethod
+    def _differs(local: Position, rest: Position) -> bool:
+        return any(abs(getattr(local, field) - getattr(rest, field)) > _EPSILON
+                   for field in ('size', 'open_buy_size', 'open_sell_size'))
+
+    def start_reconciling(self, interval: float) -> None:
+        """reconcile() every interval seconds on a background thread until stop()."""
+        if self._reconciler is not None:
+            return
+        self._stop_reconciling.clear()
+        self._reconciler = threading.Thread(target=self._reconcile_periodically,
+                                            args=(interval,), daemon=True)
+        self._reconciler.start()
+
+    def _reconcile_periodically(self, interval: float) -> None:
+        while not self._stop_reconciling.wait(interval):
+            try:
+                self.reconcile()
+            except Exception:
+                logger.warning('Error reconciling ledger', exc_info=True)
+
+    def stop(self) -> None:
+        self._stop_reconciling.set()
+        if self._reconciler is not None:
+            self._reconciler.join()
+            self._reconciler = None
@@ -0,0 +1,305 @@
+"""Market metadata shared by the REST, websocket and FIX clients.
+
+MarketRegistry loads markets and futures once and keeps them as compact MarketInfo records,
+indexed by name, underlying, type and expiry. Each record precomputes what rounding needs
+(increments as floats and Decimals, and the number of decimals to round to), so rounding a
+price or size costs a dict lookup and a few float operations instead of a scan over
+list_markets(). refresh() and websocket 'markets' updates only replace the records that changed.
+
+    markets = MarketRegistry(FtxClient())
+    markets.refresh()
+    markets.follow(ws)                          # apply updates from the websocket markets channel
+    client = FtxClient(key, secret, markets=markets)    # place_order rounds price and size
+    markets['BTC-PERP'].round_price(40000.37, 'buy')
+    markets.by_underlying('BTC')
+
+The vectorized helpers (round_prices, round_sizes, validate_orders) require numpy.
+"""
+import math
+import threading
+from decimal import ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_EVEN, Decimal
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from ciso8601 import parse_datetime
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the vectorized helpers
+    np = None
+
+Number = Union[float, Decimal]
+
+# Tolerance, in increments, for floats that are a hair off a multiple of the increment
+_EPSILON = 1e-9
+
+_DECIMAL_ROUNDING = {None: ROUND_HALF_EVEN, 'buy': ROUND_FLOOR, 'sell': ROUND_CEILING}
+
+
+def _decimals(increment: float) -> int:
+    return max(0, -Decimal(repr(increment)).normalize().as_tuple().exponent)
+
+
+class MarketInfo:
+    """Trading parameters of one market. Records are replaced, never modified, when a market
+    changes, so they can be held on to and shared between threads."""
+
+    # Set from the API; equality compares these. The other slots are derived from them.
+    FIELDS = ('name', 'type', 'future_type', 'underlying', 'base_currency', 'quote_currency',
+              'price_increment', 'size_increment', 'min_provide_size', 'enabled', 'expiry')
+    __slots__ = FIELDS + ('price_decimals', 'size_decimals', '_price_increment_decimal',
+                          '_size_increment_decimal')
+
+    def __init__(self, name: str, type: str, price_increment: float, size_increment: float,
+                 min_provide_size: Optional[float] = None, underlying: Optional[str] = None,
+                 future_type: Optional[str] = None, base_currency: Optional[str] = None,
+                 quote_currency: Optional[str] = None, enabled: bool = True,
+                 expiry: Optional[float] = None) -> None:
+        """type is 'spot' or 'future'; future_type is the future's own type ('perpetual',
+        'future', 'move', ...); expiry is a unix timestamp."""
+        self.name = name
+        self.type = type
+        self.future_type = future_type
+        self.underlying = underlying
+        self.base_currency = base_currency
+        self.quote_currency = quote_currency
+        self.price_increment = float(price_increment)
+        self.size_increment = float(size_increment)
+        self.min_provide_size = float(min_provide_size or size_increment)
+        self.enabled = enabled
+        self.expiry = expiry
+        self.price_decimals = _decimals(self.price_increment)
+        self.size_decimals = _decimals(self.size_increment)
+        self._price_increment_decimal = Decimal(repr(self.price_increment))
+        self._size_increment_decimal = Decimal(repr(self.size_increment))
+
+    @classmethod
+    def from_api(cls, market: Dict[str, Any], future: Optional[Dict[str, Any]] = None
+                 ) -> 'MarketInfo':
+        """From a market as returned by REST /markets or the websocket markets channel, and its
+        future from /futures (the websocket channel nests it in the market)."""
+        future = future or market.get('future') or {}
+        expiry = future.get('expiry')
+        return cls(
+            market['name'], market.get('type') or ('future' if future else 'spot'),
+            market['priceIncrement'], market['sizeIncrement'], market.get('minProvideSize'),
+            underlying=market.get('underlying') or future.get('underlying') or
+            market.get('baseCurrency'),
+            future_type=future.get('type'),
+            base_currency=market.get('baseCurrency'),
+            quote_currency=market.get('quoteCurrency'),
+            enabled=market.get('enabled', True),
+            expiry=parse_datetime(expiry).timestamp() if expiry else None,
+        )
+
+    def _fields(self) -> Tuple:
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, MarketInfo):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return (f'MarketInfo({self.name!r}, {self.type!r}, '
+                f'price_increment={self.price_increment}, size_increment={self.size_increment})')
+
+    def round_price(self, price: Number, side: Optional[str] = None) -> Number:
+        """Round to a multiple of the price increment: to the nearest one, or with a side
+        passively (down for buys, up for sells). Decimals are rounded exactly and stay
+        Decimals."""
+        if isinstance(price, Decimal):
+            increment = self._price_increment_decimal
+            return (price / increment).to_integral_value(_DECIMAL_ROUNDING[side]) * increment
+        steps = price / self.price_increment
+        if side is None:
+            steps = round(steps)
+        elif side == 'buy':
+            steps = math.floor(steps + _EPSILON)
+        else:
+            steps = math.ceil(steps - _EPSILON)
+        return round(steps * self.price_increment, self.price_decimals)
+
+    def round_size(self, size: Number) -> Number:
+        """Round down to a multiple of the size increment, so an order is never larger than
+        asked for."""
+        if isinstance(size, Decimal):
+            increment = self._size_increment_decimal
+            return (size / increment).to_integral_value(ROUND_FLOOR) * increment
+        return round(math.floor(size / self.size_increment + _EPSILON) * self.size_increment,
+                     self.size_decimals)
+
+    def validate_order(self, price: Optional[Number], size: Number) -> None:
+        """Raise ValueError unless the price (None for market orders) and size are positive
+        multiples of their increments."""
+        if not self.enabled:
+            raise ValueError(f'{self.name} is not enabled for trading')
+        if price is not None:
+            if price <= 0:
+                raise ValueError(f'Price {price} for {self.name} is not positive')
+            if self.round_price(price) != price:
+                raise ValueError(f'Price {price} is not a multiple of the {self.name} price '
+                                 f'increment {self.price_increment}')
+        if size <= 0:
+            raise ValueError(f'Size for {self.name} is below its size increment '
+                             f'{self.size_increment}')
+        if self.round_size(size) != size:
+            raise ValueError(f'Size {size} is not a multiple of the {self.name} size increment '
+                             f'{self.size_increment}')
+
+    def round_order(self, price: Optional[Number], size: Number,
+                    side: Optional[str] = None) -> Tuple[Optional[Number], Number]:
+        """Rounded price (None stays None) and size, raising ValueError if the order is left
+        empty or the market is disabled."""
+        if price is not None:
+            price = self.round_price(price, side)
+        size = self.round_size(size)
+        self.validate_order(price, size)
+        return price, size
+
+    def round_prices(self, prices, side: Optional[str] = None) -> 'np.ndarray':
+        """round_price over an array of prices."""
+        steps = _require_numpy().asarray(prices, dtype=float) / self.price_increment
+        if side is None:
+            steps = np.rint(steps)
+        elif side == 'buy':
+            steps = np.floor(steps + _EPSILON)
+        else:
+            steps = np.ceil(steps - _EPSILON)
+        return np.round(steps * self.price_increment, self.price_decimals)
+
+    def round_sizes(self, sizes) -> 'np.ndarray':
+        """round_size over an array of sizes."""
+        steps = np.floor(_require_numpy().asarray(sizes, dtype=float) / self.size_increment +
+                         _EPSILON)
+        return np.round(steps * self.size_increment, self.size_decimals)
+
+    def validate_orders(self, prices, sizes) -> 'np.ndarray':
+        """Boolean mask of the orders that validate_order accepts."""
+        prices = _require_numpy().asarray(prices, dtype=float)
+        sizes = np.asarray(sizes, dtype=float)
+        if not self.enabled:
+            return np.zeros(np.broadcast(prices, sizes).shape, dtype=bool)
+        return ((prices > 0) & (self.round_prices(prices) == prices) &
+                (sizes > 0) & (self.round_sizes(sizes) == sizes))
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('numpy is required for the vectorized market helpers')
+    return np
+
+
+class _Indexes(NamedTuple):
+    by_name: Dict[str, MarketInfo]
+    by_underlying: Dict[str, Tuple[MarketInfo, ...]]
+    by_type: Dict[str, Tuple[MarketInfo, ...]]
+    by_expiry: Dict[float, Tuple[MarketInfo, ...]]
+
+
+def _build_indexes(markets: Dict[str, MarketInfo]) -> _Indexes:
+    by_underlying: Dict[str, List[MarketInfo]] = {}
+    by_type: Dict[str, List[MarketInfo]] = {}
+    by_expiry: Dict[float, List[MarketInfo]] = {}
+    for name in sorted(markets):
+        market = markets[name]
+        if market.underlying is not None:
+            by_underlying.setdefault(market.underlying, []).append(market)
+        by_type.setdefault(market.type, []).append(market)
+        if market.future_type is not None and market.future_type != market.type:
+            by_type.setdefault(market.future_type, []).append(market)
+        if market.expiry is not None:
+            by_expiry.setdefault(market.expiry, []).append(market)
+    return _Indexes(
+        markets,
+        {key: tuple(values) for key, values in by_underlying.items()},
+        {key: tuple(values) for key, values in by_type.items()},
+        {key: tuple(values) for key, values in by_expiry.items()},
+    )
+
+
+class MarketRegistry:
+    def __init__(self, rest_client=None) -> None:
+        """rest_client, an FtxClient, is what refresh() loads markets and futures from."""
+        self._rest_client = rest_client
+        self._lock = threading.Lock()
+        # Replaced rather than mutated so readers need no lock
+        self._indexes = _build_indexes({})
+
+    def refresh(self) -> List[str]:
+        """Load all markets and futures from REST, replacing the records that changed and
+        dropping markets that are gone. Returns the names of the added, changed and removed
+        markets."""
+        futures = {future['name']: future for future in self._rest_client.list_futures()}
+        return self.update(self._rest_client.list_markets(), futures, complete=True)
+
+    def update(self, markets: Iterable[Dict[str, Any]],
+               futures: Optional[Dict[str, Dict[str, Any]]] = None,
+               complete: bool = False) -> List[str]:
+        """Apply markets in the API's format (and futures by name). With complete, markets not
+        given are removed. Returns the names of the markets that changed."""
+        futures = futures or {}
+        with self._lock:
+            current = self._indexes.by_name
+            updated = dict(current)
+            changed = []
+            seen = set()
+            for market in markets:
+                info = MarketInfo.from_api(market, futures.get(market['name']))
+                seen.add(info.name)
+                if current.get(info.name) != info:
+                    updated[info.name] = info
+                    changed.append(info.name)
+            if complete:
+                for name in current.keys() - seen:
+                    del updated[name]
+                    changed.append(name)
+            if changed:
+                self._indexes = _build_indexes(updated)
+            return changed
+
+    def follow(self, ws_client):
+        """Subscribe to the markets channel of an FtxWebsocketClient and apply its updates.
+        Returns the subscription; close it to stop."""
+        return ws_client.subscribe('markets', callback=self._apply_markets_update)
+
+    def _apply_markets_update(self, event) -> None:
+        self.update(event.data.values(), complete=event.action == 'partial')
+
+    def get(self, name: str) -> Optional[MarketInfo]:
+        return self._indexes.by_name.get(name)
+
+    def __getitem__(self, name: str) -> MarketInfo:
+        return self._indexes.by_name[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._indexes.by_name
+
+    def __len__(self) -> int:
+        return len(self._indexes.by_name)
+
+    def __iter__(self) -> Iterator[MarketInfo]:
+        return iter(list(self._indexes.by_name.values()))
+
+    def by_underlying(self, underlying: str) -> Tuple[MarketInfo, ...]:
+        return self._indexes.by_underlying.get(underlying, ())
+
+    def by_type(self, type: str) -> Tuple[MarketInfo, ...]:
+        """Markets of a type ('spot', 'future') or future type ('perpetual', 'move', ...)."""
+        return self._indexes.by_type.get(type, ())
+
+    def by_expiry(self, expiry: float) -> Tuple[MarketInfo, ...]:
+        return self._indexes.by_expiry.get(expiry, ())
+
+    def expiries(self) -> List[float]:
+        return sorted(self._indexes.by_expiry)
+
+    def round_order(self, market: str, price: Optional[Number], size: Number,
+                    side: Optional[str] = None) -> Tuple[Optional[Number], Number]:
+        """MarketInfo.round_order for a market by name; orders for markets the registry does
+        not know are returned unchanged for the exchange to judge."""
+        info = self._indexes.by_name.get(market)
+        if info is None:
+            return price, size
+        return info.round_order(price, size, side)
@@ -0,0 +1,232 @@
+"""Latency histograms and counters for the REST, websocket and FIX clients.
+
+Clients take an optional MetricsRegistry (metrics=None by default, which skips all
+instrumentation). Histograms are log-linear in the style of HdrHistogram: values are bucketed
+with 2**significant_bits sub-buckets per power of two, so every recorded value is kept within a
+relative error of 2**-(significant_bits - 1) at a fixed memory cost, and percentiles are read
+from the buckets.
+
+    metrics = MetricsRegistry()
+    client = FtxClient(key, secret, metrics=metrics)
+    ...
+    print(metrics.to_prometheus())
+    metrics.send_statsd('127.0.0.1', 8125)
+"""
+import re
+import socket
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Histogram:
+    def __init__(self, unit: float = 1e-6, significant_bits: int = 7,
+                 max_value_bits: int = 40) -> None:
+        """Values are recorded in multiples of `unit` (microseconds for values in seconds) up to
+        2**max_value_bits units; larger values land in the last bucket."""
+        self._unit = unit
+        self._bits = significant_bits
+        self._half = 1 << (significant_bits - 1)
+        self._max_units = (1 << max_value_bits) - 1
+        self._counts = [0] * self._index(self._max_units) + [0]
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def _index(self, units: int) -> int:
+        exponent = units.bit_length() - self._bits
+        if exponent <= 0:
+            return units
+        return exponent * self._half + (units >> exponent)
+
+    def _bucket_bounds(self, index: int) -> Tuple[int, int]:
+        if index < 2 * self._half:
+            return index, index
+        exponent = index // self._half - 1
+        mantissa = index - exponent * self._half
+        return mantissa << exponent, ((mantissa + 1) << exponent) - 1
+
+    def record(self, value: float) -> None:
+        units = min(max(int(value / self._unit), 0), self._max_units)
+        index = self._index(units)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def percentiles(self, quantiles: Sequence[float]) -> List[Optional[float]]:
+        """Values at the given quantiles (0 to 1), as bucket midpoints clamped to the recorded
+        min and max."""
+        with self._lock:
+            counts, count, low, high = list(self._counts), self.count, self.min, self.max
+        if not count:
+            return [None] * len(quantiles)
+        targets = sorted((max(1, int(q * count + 0.5)), i) for i, q in enumerate(quantiles))
+        values: List[Optional[float]] = [None] * len(quantiles)
+        seen, t = 0, 0
+        for index, bucket_count in enumerate(counts):
+            if not bucket_count:
+                continue
+            seen += bucket_count
+            while t < len(targets) and targets[t][0] <= seen:
+                lower, upper = self._bucket_bounds(index)
+                value = (lower + upper + 1) / 2 * self._unit
+                values[targets[t][1]] = min(max(value, low), high)
+                t += 1
+            if t == len(targets):
+                break
+        return values
+
+    def percentile(self, quantile: float) -> Optional[float]:
+        return self.percentiles([quantile])[0]
+
+    def buckets(self) -> Iterator[Tuple[float, int]]:
+        """(upper bound, count) of every non-empty bucket, in increasing order."""
+        with self._lock:
+            counts = list(self._counts)
+        for index, bucket_count in enumerate(counts):
+            if bucket_count:
+                yield (self._bucket_bounds(index)[1] + 1) * self._unit, bucket_count
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = [0] * len(self._counts)
+            self.count = 0
+            self.sum = 0.
+            self.min = self.max = None
+
+
+class Counter:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class MetricsRegistry:
+    """Named histograms and counters, each optionally split by labels."""
+
+    def __init__(self, prefix: str = 'ftx_') -> None:
+        self._prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], Counter] = {}
+        self._exported_counts: Dict[Tuple[str, Labels], int] = {}
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def counter(self, name: str, **labels: str) -> Counter:
+        key = (name, tuple(sorted(labels.items())))
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter())
+        return counter
+
+    def to_prometheus(self) -> str:
+        """Text exposition format: histograms as summaries (quantiles, _sum and _count)."""
+        lines = []
+        for name, series in _by_name(self._counters).items():
+            lines.append(f'# TYPE {self._prefix}{name} counter')
+            for labels, counter in series:
+                lines.append(f'{self._prefix}{name}{_prometheus_labels(labels)} {counter.value}')
+        for name, series in _by_name(self._histograms).items():
+            lines.append(f'# TYPE {self._prefix}{name} summary')
+            for labels, histogram in series:
+                for quantile, value in zip(_QUANTILES, histogram.percentiles(_QUANTILES)):
+                    if value is not None:
+                        quantile_labels = labels + (('quantile', str(quantile)),)
+                        lines.append(f'{self._prefix}{name}{_prometheus_labels(quantile_labels)} '
+                                     f'{value!r}')
+                lines.append(f'{self._prefix}{name}_sum{_prometheus_labels(labels)} '
+                             f'{histogram.sum!r}')
+                lines.append(f'{self._prefix}{name}_count{_prometheus_labels(labels)} '
+                             f'{histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def to_statsd(self) -> List[str]:
+        """StatsD lines: counters as deltas since the previous export, histogram quantiles,
+        mean and max as gauges in milliseconds."""
+        lines = []
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = list(self._histograms.items())
+        for key, counter in counters:
+            value = counter.value
+            delta = value - self._exported_counts.get(key, 0)
+            self._exported_counts[key] = value
+            if delta:
+                lines.append(f'{_statsd_name(self._prefix, *key)}:{delta}|c')
+        for key, histogram in histograms:
+            name = _statsd_name(self._prefix, *key)
+            if not histogram.count:
+                continue
+            for quantile, value in zip(_QUANTILES, histogram.percentiles(_QUANTILES)):
+                lines.append(f'{name}.p{str(quantile * 100).rstrip("0").rstrip(".")}:'
+                             f'{value * 1e3:.3f}|g')
+            lines.append(f'{name}.mean:{histogram.mean * 1e3:.3f}|g')
+            lines.append(f'{name}.max:{histogram.max * 1e3:.3f}|g')
+        return lines
+
+    def send_statsd(self, host: str = '127.0.0.1', port: int = 8125,
+                    max_packet_size: int = 1400) -> None:
+        packets, packet = [], ''
+        for line in self.to_statsd():
+            if packet and len(packet) + len(line) + 1 > max_packet_size:
+                packets.append(packet)
+                packet = ''
+            packet = f'{packet}\n{line}' if packet else line
+        if packet:
+            packets.append(packet)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for packet in packets:
+                sock.sendto(packet.encode(), (host, port))
+
+
+def _by_name(metrics: Dict) -> Dict[str, List]:
+    grouped: Dict[str, List] = {}
+    for (name, labels), metric in sorted(list(metrics.items()), key=lambda item: item[0]):
+        grouped.setdefault(name, []).append((labels, metric))
+    return grouped
+
+
+_PROMETHEUS_ESCAPE = {'\\': '\\\\', '"': '\\"', '\n': '\\n'}
+_PROMETHEUS_ESCAPES = re.compile(r'[\\"\n]')
+
+
+def _prometheus_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        f'{key}="{_PROMETHEUS_ESCAPES.sub(lambda m: _PROMETHEUS_ESCAPE[m.group()], value)}"'
+        for key, value in labels) + '}'
+
+
+_STATSD_UNSAFE = re.compile(r'[^A-Za-z0-9_\-]')
+
+
+def _statsd_name(prefix: str, name: str, labels: Labels) -> str:
+    return '.'.join([prefix + name] + [_STATSD_UNSAFE.sub('_', value.replace('{}', 'param'))
+                                       for _, value in labels])
@@ -0,0 +1,167 @@
+"""Record raw websocket / FIX frames to an append-only log and replay them through the clients.
+
+Log layout: an 8 byte magic header followed by records of
+    receive time (uint64 ns since the epoch) | source (uint8) | length (uint32) | payload
+all little-endian. The file is grown in chunks and written through mmap; a zero receive time
+marks the end of the data, so a log cut short by a crash can still be read and appended to.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+SOURCE_WEBSOCKET = 1
+SOURCE_FIX = 2
+
+_MAGIC = b'FTXREC1\n'
+_RECORD_HEADER = struct.Struct('<QBI')
+
+
+class FrameLogWriter:
+    def __init__(self, path: str, chunk_size: int = 16 * 1024 * 1024) -> None:
+        self._chunk_size = chunk_size
+        self._lock = threading.Lock()
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            self._size = os.path.getsize(path)
+            self._mmap = mmap.mmap(self._file.fileno(), self._size)
+            if self._mmap[:len(_MAGIC)] != _MAGIC:
+                raise ValueError(f'{path} is not a frame log')
+            self._offset = _end_of_records(self._mmap)
+        else:
+            self._size = 0
+            self._mmap = None
+            self._grow(len(_MAGIC))
+            self._mmap[:len(_MAGIC)] = _MAGIC
+            self._offset = len(_MAGIC)
+
+    def _grow(self, needed: int) -> None:
+        size = self._size + max(self._chunk_size, needed)
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.truncate(size)
+        self._size = size
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+
+    def append(self, source: int, payload: Union[bytes, str],
+               received_at_ns: Optional[int] = None) -> None:
+        if isinstance(payload, str):
+            payload = payload.encode()
+        record_size = _RECORD_HEADER.size + len(payload)
+        with self._lock:
+            # Keep room for a zeroed end-of-data header after the record
+            if self._offset + record_size + _RECORD_HEADER.size > self._size:
+                self._grow(record_size + _RECORD_HEADER.size)
+            _RECORD_HEADER.pack_into(self._mmap, self._offset,
+                                     received_at_ns or time.time_ns(), source, len(payload))
+            start = self._offset + _RECORD_HEADER.size
+            self._mmap[start:start + len(payload)] = payload
+            self._offset = start + len(payload)
+
+    def websocket(self, raw_message: Union[bytes, str]) -> None:
+        self.append(SOURCE_WEBSOCKET, raw_message)
+
+    def fix(self, data: bytes) -> None:
+        self.append(SOURCE_FIX, data)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._mmap.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._mmap is None:
+                return
+            self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+            self._file.truncate(self._offset)
+            self._file.close()
+
+    def __enter__(self) -> 'FrameLogWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _end_of_records(data: Union[mmap.mmap, memoryview]) -> int:
+    offset = len(_MAGIC)
+    while offset + _RECORD_HEADER.size <= len(data):
+        received_at_ns, _, length = _RECORD_HEADER.unpack_from(data, offset)
+        if not received_at_ns or offset + _RECORD_HEADER.size + length > len(data):
+            break
+        offset += _RECORD_HEADER.size + length
+    return offset
+
+
+class FrameLogReader:
+    def __init__(self, path: str) -> None:
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f'{path} is not a frame log')
+
+    def __iter__(self) -> Iterator[Tuple[int, int, memoryview]]:
+        """Yield (received_at_ns, source, payload) per record. Payloads are views into the
+        mapped file and are only valid until the reader is closed."""
+        data = memoryview(self._mmap)
+        offset = len(_MAGIC)
+        while offset + _RECORD_HEADER.size <= len(data):
+            received_at_ns, source, length = _RECORD_HEADER.unpack_from(data, offset)
+            start = offset + _RECORD_HEADER.size
+            if not received_at_ns or start + length > len(data):
+                break
+            yield received_at_ns, source, data[start:start + length]
+            offset = start + length
+
+    def close(self) -> None:
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Payload views are still referenced; the mapping is released with them
+            pass
+        self._file.close()
+
+    def __enter__(self) -> 'FrameLogReader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def paced(records: Iterator[Tuple[int, int, memoryview]], speed: Optional[float] = 1.,
+          sleep: Callable[[float], None] = time.sleep) -> Iterator[Tuple[int, int, memoryview]]:
+    """Yield records at their recorded pace: speed=1 for wall-clock time, >1 to accelerate and
+    None to replay as fast as possible."""
+    first_ns = start = None
+    for record in records:
+        if speed:
+            if first_ns is None:
+                first_ns, start = record[0], time.monotonic()
+            delay = start + (record[0] - first_ns) / 1e9 / speed - time.monotonic()
+            if delay > 0:
+                sleep(delay)
+        yield record
+
+
+def replay(path: str, handlers: Dict[int, Callable[[memoryview], None]],
+           speed: Optional[float] = 1., sleep: Callable[[float], None] = time.sleep) -> int:
+    """Feed each recorded frame to the handler for its source. Returns the number of frames
+    replayed."""
+    count = 0
+    with FrameLogReader(path) as reader:
+        for _, source, payload in paced(iter(reader), speed, sleep):
+            handler = handlers.get(source)
+            if handler is not None:
+                handler(payload)
+                count += 1
+    return count
+
+
+def load_frames(path: str, source: int) -> List[bytes]:
+    with FrameLogReader(path) as reader:
+        return [bytes(payload) for _, frame_source, payload in reader if frame_source == source]
@@ -1,9 +1,7 @@
 from socket import SHUT_RDWR, SOL_TCP, TCP_NODELAY, socket
 import time
-from typing import Iterator, Union
+from typing import Callable, Dict, Iterator, Tuple, Union
 from gevent.lock import BoundedSemaphore
-from simplefix import FixMessage, FixParser
-from werkzeug.datastructures import ImmutableMultiDict
 from contextlib import ExitStack, closing
 from datetime import datetime
 from decimal import Decimal
@@ -16,30 +14,94 @@ from urllib.parse import urlparse
 from uuid import uuid4
 
 import gevent
-from gevent.event import Event
+from gevent.event import AsyncResult, Event
 import simplefix
-from simplefix.message import fix_val
+
+from common.markets import MarketRegistry
+from common.metrics import MetricsRegistry
+from fix.codec import FixDecodeError, FixDecoder, FixEncoder, FixFrame, encode_value
+from fix.order_manager import FixOrderManager
+from fix.session_store import FixSessionStore
+from fix.timer import Timer, default_scheduler
 
 logger = logging.getLogger(__name__)
 
 
 
+# Requests whose acknowledgement latency is measured, by the ClOrdID they carry, and the
+# responses that acknowledge them
+_ACKED_REQUESTS = {
+    simplefix.MSGTYPE_NEW_ORDER_SINGLE: 'new_order',
+    simplefix.MSGTYPE_ORDER_CANCEL_REQUEST: 'cancel',
+    simplefix.MSGTYPE_ORDER_MASS_CANCEL_REQUEST: 'mass_cancel',
+}
+_ACK_RESPONSES = {
+    simplefix.MSGTYPE_EXECUTION_REPORT,
+    simplefix.MSGTYPE_ORDER_CANCEL_REJECT,
+    simplefix.MSGTYPE_ORDER_MASS_CANCEL_REPORT,
+}
+_MAX_PENDING_ACKS = 100000
+
+# Session messages are never resent; a ResendRequest covering them is answered with a gap fill
+_SESSION_MESSAGES = {
+    simplefix.MSGTYPE_HEARTBEAT,
+    simplefix.MSGTYPE_TEST_REQUEST,
+    simplefix.MSGTYPE_RESEND_REQUEST,
+    simplefix.MSGTYPE_REJECT,
+    simplefix.MSGTYPE_SEQUENCE_RESET,
+    simplefix.MSGTYPE_LOGOUT,
+    simplefix.MSGTYPE_LOGON,
+}
+# Header fields written anew when a stored message is resent
+_HEADER_TAGS = {
+    simplefix.TAG_BEGINSTRING,
+    simplefix.TAG_BODYLENGTH,
+    simplefix.TAG_MSGTYPE,
+    simplefix.TAG_SENDER_COMPID,
+    simplefix.TAG_TARGET_COMPID,
+    simplefix.TAG_MSGSEQNUM,
+    simplefix.TAG_SENDING_TIME,
+    simplefix.TAG_POSSDUPFLAG,
+    simplefix.TAG_ORIGSENDINGTIME,
+    simplefix.TAG_CHECKSUM,
+}
+
+
 class FixConnection:
-    def __init__(self, sock: socket, sender_id: str, target_id: Optional[str] = None) -> None:
+    def __init__(self, sock: socket, sender_id: str, target_id: Optional[str] = None,
+                 frame_recorder: Optional[Callable[[memoryview], None]] = None,
+                 metrics: Optional[MetricsRegistry] = None,
+                 store: Optional[FixSessionStore] = None, heartbeats: bool = True) -> None:
+        """frame_recorder is called with a view of every chunk received, valid only during the
+        call. Sequence numbers continue from those in `store`, which also keeps the messages
+        sent for answering ResendRequests; by default the session starts from 1 in memory.
+
+        With heartbeats, the connection sends Heartbeats when it has been idle for the heartbeat
+        interval (HeartBtInt of the Logon sent), a TestRequest when nothing was received for as
+        long, and closes 10 seconds later if still nothing arrives."""
         self._sock = sock
+        self._frame_recorder = frame_recorder
+        self._metrics = metrics
+        self._pending_acks: Dict[str, Tuple[float, str]] = {}
         sock.setsockopt(SOL_TCP, TCP_NODELAY, 1)
-        self._next_send_seq_num = 1
-        self._next_recv_seq_num = 1
+        self._store = store if store is not None else FixSessionStore()
+        # Highest sequence number seen beyond a gap, while a ResendRequest is outstanding
+        self._resend_up_to: Optional[int] = None
         self._sender_id = sender_id
         self._target_id = target_id
-        self._last_send_time = time.time()
-        self._last_recv_time = time.time()
+        self._encoder = FixEncoder(sender_id, target_id)
+        self._last_send_time = time.monotonic()
+        self._last_recv_time = time.monotonic()
         self._heartbeat_interval = 30.
+        self._heartbeats = heartbeats
+        self._timer: Optional[Timer] = None
+        self._test_request_time = 0.
         self._has_session = False
         self._disconnected = Event()
         self._send_lock = BoundedSemaphore(1)
 
         gevent.spawn(self._close_on_exit)
+        self._schedule_timer()
 
         self.messages = self._get_messages()
 
@@ -47,7 +109,11 @@ class FixConnection:
     def connected(self) -> bool:
         return not self._disconnected.is_set()
 
-    def _get_messages(self) -> Iterator[FixMessage]:
+    @property
+    def next_send_seq_num(self) -> int:
+        return self._store.next_send_seq_num
+
+    def _get_messages(self) -> Iterator[FixFrame]:
         try:
             for msg in self._read_messages():
                 if not self._validate_message(msg):
@@ -57,39 +123,47 @@ class FixConnection:
                     pass
                 elif msg.message_type == simplefix.MSGTYPE_TEST_REQUEST:
                     self._send_heartbeat(msg.get(simplefix.TAG_TESTREQID))
+                elif msg.message_type == simplefix.MSGTYPE_RESEND_REQUEST:
+                    self._resend(int(msg.get(simplefix.TAG_BEGINSEQNO) or 1),
+                                 int(msg.get(simplefix.TAG_ENDSEQNO) or 0))
+                elif msg.message_type == simplefix.MSGTYPE_SEQUENCE_RESET:
+                    pass
                 elif msg.message_type == simplefix.MSGTYPE_LOGOUT:
                     self.close()
                 else:
+                    if self._metrics is not None and msg.message_type in _ACK_RESPONSES:
+                        self._record_ack(msg)
                     yield msg
         finally:
             self.close()
 
-    def _read_messages(self) -> Iterator[FixMessage]:
-        parser = FixParser()
+    def _record_ack(self, msg: FixFrame) -> None:
+        pending = self._pending_acks.pop(msg.get(simplefix.TAG_CLORDID), None)
+        if pending is not None:
+            sent_at, request = pending
+            self._metrics.histogram('fix_ack_seconds', request=request).record(
+                time.perf_counter() - sent_at)
+
+    def _read_messages(self) -> Iterator[FixFrame]:
+        decoder = FixDecoder()
         while True:
             try:
-                buf = self._sock.recv(4096)
+                if not decoder.recv_into(self._sock):
+                    return
             except OSError:
                 return
-            if not buf:
-                return
-            parser.append_buffer(buf)
+            if self._frame_recorder is not None:
+                self._frame_recorder(decoder.last_received)
 
-            while True:
-                try:
-                    msg = parser.get_message()
-                except Exception:
-                    logger.warning('Error parsing FIX message', exc_info=True)
-                    return
-                if msg is None:
-                    break
-                yield msg
+            try:
+                yield from decoder
+            except FixDecodeError:
+                logger.warning('Error parsing FIX message', exc_info=True)
+                return
 
-    def _validate_message(self, msg: FixMessage) -> bool:
+    def _validate_message(self, msg: FixFrame) -> bool:
         try:
-            # Hack to make msg.get return decoded strings.
-            decoded = ImmutableMultiDict([(k, v.decode()) for k, v in msg.pairs])
-            msg.get = lambda key: decoded.get(fix_val(key))
+            msg.raw.decode()
         except ValueError:
             self.reject_message(
                 msg, reason='Invalid encoding',
@@ -99,16 +173,10 @@ class FixConnection:
 
         if self._target_id is None and msg.get(simplefix.TAG_SENDER_COMPID):
             self._target_id = msg.get(simplefix.TAG_SENDER_COMPID)
+            self._encoder.set_target_id(self._target_id)
 
-        if msg.get(simplefix.TAG_MSGSEQNUM):
-            if msg.get(simplefix.TAG_MSGSEQNUM) == str(self._next_recv_seq_num):
-                self._next_recv_seq_num += 1
-            else:
-                self.reject_message(
-                    msg, reason='Incorrect sequence number',
-                    tag_id=simplefix.TAG_MSGSEQNUM,
-                    error_code=simplefix.SESSIONREJECTREASON_VALUE_INCORRECT_FOR_THIS_TAG)
-                return False
+        if msg.get(simplefix.TAG_MSGSEQNUM) and not self._check_sequence(msg):
+            return False
 
         for tag, description in [(simplefix.TAG_MSGTYPE, 'message type'),
                                  (simplefix.TAG_BEGINSTRING, 'begin string'),
@@ -142,39 +210,154 @@ class FixConnection:
                 error_code=simplefix.SESSIONREJECTREASON_VALUE_INCORRECT_FOR_THIS_TAG)
             return False
 
-        self._last_recv_time = time.time()
+        self._last_recv_time = time.monotonic()
 
         return True
 
+    def _check_sequence(self, msg: FixFrame) -> bool:
+        """Advance the expected sequence number; returns False if msg is not to be processed
+        because it is a duplicate or arrived after a gap."""
+        try:
+            seq_num = int(msg.get(simplefix.TAG_MSGSEQNUM))
+        except ValueError:
+            self.reject_message(
+                msg, reason='Invalid sequence number',
+                tag_id=simplefix.TAG_MSGSEQNUM,
+                error_code=simplefix.SESSIONREJECTREASON_INCOORECT_DATA_FORMAT_FOR_VALUE)
+            return False
+        msg_type = msg.message_type
+        if msg_type == simplefix.MSGTYPE_LOGON and msg.get(simplefix.TAG_RESETSEQNUMFLAG) == 'Y':
+            self._store.set_next_recv_seq_num(seq_num)
+            self._resend_up_to = None
+        expected = self._store.next_recv_seq_num
+
+        if msg_type == simplefix.MSGTYPE_SEQUENCE_RESET and \
+                msg.get(simplefix.TAG_GAPFILLFLAG) != 'Y':
+            # Reset mode applies whatever the sequence number of the message itself
+            new_seq_num = int(msg.get(simplefix.TAG_NEWSEQNO) or 0)
+            if new_seq_num < expected:
+                self.reject_message(
+                    msg, reason='NewSeqNo lower than expected sequence number',
+                    tag_id=simplefix.TAG_NEWSEQNO,
+                    error_code=simplefix.SESSIONREJECTREASON_VALUE_INCORRECT_FOR_THIS_TAG)
+                return False
+            self._store.set_next_recv_seq_num(new_seq_num)
+            return True
+
+        if seq_num == expected:
+            if msg_type == simplefix.MSGTYPE_SEQUENCE_RESET:
+                self._store.set_next_recv_seq_num(max(int(msg.get(simplefix.TAG_NEWSEQNO) or 0),
+                                                      seq_num + 1))
+            else:
+                self._store.set_next_recv_seq_num(seq_num + 1)
+            if self._resend_up_to is not None and \
+                    self._store.next_recv_seq_num > self._resend_up_to:
+                self._resend_up_to = None
+            return True
+
+        if seq_num > expected:
+            if self._resend_up_to is None:
+                logger.warning('Sequence gap: expected %d, received %d; requesting resend',
+                               expected, seq_num)
+                self.send({
+                    simplefix.TAG_MSGTYPE: simplefix.MSGTYPE_RESEND_REQUEST,
+                    simplefix.TAG_BEGINSEQNO: expected,
+                    simplefix.TAG_ENDSEQNO: 0,
+                })
+            self._resend_up_to = max(self._resend_up_to or 0, seq_num)
+            # The logon response is still processed; everything else is resent after the gap
+            return msg_type == simplefix.MSGTYPE_LOGON
+
+        if msg.get(simplefix.TAG_POSSDUPFLAG) == 'Y':
+            # Already processed
+            return False
+        logger.error('Sequence number %d lower than expected %d', seq_num, expected)
+        self.send({
+            simplefix.TAG_MSGTYPE: simplefix.MSGTYPE_LOGOUT,
+            simplefix.TAG_TEXT: f'MsgSeqNum too low, expecting {expected} but received {seq_num}',
+        })
+        self._has_session = False
+        self.close()
+        return False
+
     def send(self, values: dict) -> None:
+        msg_type = values[simplefix.TAG_MSGTYPE]
+        fields = [(key, value) for key, value in values.items()
+                  if key != simplefix.TAG_MSGTYPE and key != simplefix.TAG_SENDING_TIME]
         with self._send_lock:
-            msg = FixMessage()
-            msg.append_pair(simplefix.TAG_BEGINSTRING, 'FIX.4.2')
-            msg.append_pair(simplefix.TAG_SENDER_COMPID, self._sender_id)
-            msg.append_pair(simplefix.TAG_TARGET_COMPID, self._target_id)
-            msg.append_pair(simplefix.TAG_MSGSEQNUM, self._next_send_seq_num)
-            for key, value in values.items():
-                if isinstance(value, datetime):
-                    msg.append_utc_timestamp(key, value)
-                else:
-                    msg.append_pair(key, value)
-            if not msg.get(simplefix.TAG_SENDING_TIME):
-                msg.append_utc_timestamp(simplefix.TAG_SENDING_TIME)
-            encoded = msg.encode()
-            self._last_send_time = time.time()
-            self._next_send_seq_num += 1
-
-            try:
-                print('send', encoded.replace(b'\x01', b'|'))
-                self._sock.sendall(encoded)
-            except OSError:
-                self.close(clean=False)
+            if msg_type == simplefix.MSGTYPE_LOGON and \
+                    encode_value(values.get(simplefix.TAG_RESETSEQNUMFLAG)) == b'Y':
+                self._store.reset()
+                self._resend_up_to = None
+            seq_num = self._store.next_send_seq_num
+            encoded = self._encoder.encode(msg_type, seq_num, fields,
+                                           values.get(simplefix.TAG_SENDING_TIME))
+            self._store.add_sent(seq_num, None if msg_type in _SESSION_MESSAGES else encoded)
+            self._last_send_time = time.monotonic()
+            if self._metrics is not None:
+                self._track_ack(values)
+
+            if not self._write(encoded):
                 return
 
-            if msg.message_type == simplefix.MSGTYPE_LOGON:
+            if msg_type == simplefix.MSGTYPE_LOGON:
                 self._has_session = True
+                if values.get(simplefix.TAG_HEARTBTINT):
+                    self._heartbeat_interval = float(values[simplefix.TAG_HEARTBTINT])
+                    self._schedule_timer()
+
+    def _write(self, encoded: bytes) -> bool:
+        try:
+            self._sock.sendall(encoded)
+        except OSError:
+            self.close(clean=False)
+            return False
+        return True
 
-    def reject_message(self, msg: FixMessage, reason: str, *,
+    def _resend(self, begin: int, end: int) -> None:
+        """Answer a ResendRequest: stored messages are sent again with PossDupFlag set and
+        everything else is skipped with gap fills."""
+        with self._send_lock:
+            last = self._store.next_send_seq_num - 1
+            if not end or end > last:
+                end = last
+            logger.info('Resending messages %d to %d', begin, end)
+            next_seq_num = begin
+            for seq_num, stored in self._store.get_sent(begin, end):
+                if seq_num > next_seq_num and not self._send_gap_fill(next_seq_num, seq_num):
+                    return
+                original = FixFrame.parse(bytes(stored))
+                fields = [(simplefix.TAG_POSSDUPFLAG, 'Y'),
+                          (simplefix.TAG_ORIGSENDINGTIME,
+                           original.get_bytes(simplefix.TAG_SENDING_TIME)),
+                          *((tag, value) for tag, value in original.pairs
+                            if tag not in _HEADER_TAGS)]
+                if not self._write(self._encoder.encode(original.message_type, seq_num,
+                                                        fields)):
+                    return
+                next_seq_num = seq_num + 1
+            if next_seq_num <= end:
+                self._send_gap_fill(next_seq_num, end + 1)
+            self._last_send_time = time.monotonic()
+
+    def _send_gap_fill(self, seq_num: int, new_seq_num: int) -> bool:
+        return self._write(self._encoder.encode(simplefix.MSGTYPE_SEQUENCE_RESET, seq_num, [
+            (simplefix.TAG_POSSDUPFLAG, 'Y'),
+            (simplefix.TAG_GAPFILLFLAG, 'Y'),
+            (simplefix.TAG_NEWSEQNO, new_seq_num),
+        ]))
+
+    def _track_ack(self, values: dict) -> None:
+        request = _ACKED_REQUESTS.get(values.get(simplefix.TAG_MSGTYPE))
+        cl_ord_id = values.get(simplefix.TAG_CLORDID)
+        if request is None or cl_ord_id is None:
+            return
+        if len(self._pending_acks) >= _MAX_PENDING_ACKS:
+            # Never acknowledged; drop the oldest
+            del self._pending_acks[next(iter(self._pending_acks))]
+        self._pending_acks[str(cl_ord_id)] = (time.perf_counter(), request)
+
+    def reject_message(self, msg: FixFrame, reason: str, *,
                        tag_id: Optional[Union[bytes, int]] = None,
                        error_code: Union[bytes, int]) -> None:
         params = {
@@ -188,9 +371,35 @@ class FixConnection:
             params[371] = tag_id
         self.send(params)
 
-    # Run this every few seconds
+    def _schedule_timer(self) -> None:
+        """Wake up when the next heartbeat or receive timeout is due. Sends and receives only
+        update timestamps; the timer reschedules itself from them when it fires."""
+        if not self._heartbeats or not self.connected:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        silent_until = self._last_recv_time + self._heartbeat_interval
+        if self._test_request_time >= self._last_recv_time:
+            # A TestRequest is outstanding
+            silent_until += 10
+        self._timer = default_scheduler().call_at(
+            min(self._last_send_time + self._heartbeat_interval, silent_until), self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        # Sending can block, which the scheduler greenlet must not
+        gevent.spawn(self._run_timers)
+
+    def _run_timers(self) -> None:
+        if not self.connected:
+            return
+        # A TestRequest also counts as a heartbeat
+        self._check_last_message_time()
+        self._maybe_send_heartbeat()
+        self._schedule_timer()
+
     def _maybe_send_heartbeat(self) -> None:
-        if time.time() - self._last_send_time > self._heartbeat_interval:
+        if time.monotonic() - self._last_send_time >= self._heartbeat_interval:
             self._send_heartbeat()
 
     def _send_heartbeat(self, test_req_id: Optional[str] = None) -> None:
@@ -203,12 +412,13 @@ class FixConnection:
             data[simplefix.TAG_TESTREQID] = test_req_id
         self.send(data)
 
-    # Run this every few seconds
     def _check_last_message_time(self) -> None:
-        elapsed = time.time() - self._last_recv_time
-        if elapsed > self._heartbeat_interval + 10:
+        elapsed = time.monotonic() - self._last_recv_time
+        if elapsed >= self._heartbeat_interval + 10:
             self.close()
-        elif elapsed > self._heartbeat_interval and self._has_session:
+        elif elapsed >= self._heartbeat_interval and self._has_session and \
+                self._test_request_time < self._last_recv_time:
+            self._test_request_time = time.monotonic()
             self.send({
                 simplefix.TAG_MSGTYPE: simplefix.MSGTYPE_TEST_REQUEST,
                 simplefix.TAG_TESTREQID: datetime.now(),
@@ -218,6 +428,9 @@ class FixConnection:
         if self._disconnected.is_set():
             return
         self._disconnected.set()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
         if clean and self._has_session:
             self._has_session = False
             self.send({
@@ -238,18 +451,42 @@ class FixConnection:
 
 
 class FixClient:
-    """FIX client to use for testing."""
+    """FIX client with local order state.
+
+    Incoming order messages are applied to `orders`, a FixOrderManager. send_order,
+    cancel_order and cancel_all_limit_orders return gevent AsyncResults that resolve when the
+    exchange responds; see FixOrderManager for what each resolves to. They raise ConnectionError
+    once the session is lost, and results still pending then fail with it. Other application
+    messages are passed to on_message if given.
+
+    With a session_store (e.g. a FileSessionStore), sequence numbers and sent messages persist
+    across connections, so a new connection resumes the session where the previous one stopped
+    and can answer the exchange's ResendRequests.
+
+    With markets, send_order rounds prices passively and sizes down to the market's increments.
+    """
 
     def __init__(self, url: str, client_id: str, target_id: str,
-                 subaccount_name: Optional[str] = None) -> None:
+                 subaccount_name: Optional[str] = None,
+                 frame_recorder: Optional[Callable[[memoryview], None]] = None,
+                 metrics: Optional[MetricsRegistry] = None,
+                 order_manager: Optional[FixOrderManager] = None,
+                 on_message: Optional[Callable[[FixFrame], None]] = None,
+                 session_store: Optional[FixSessionStore] = None,
+                 markets: Optional[MarketRegistry] = None) -> None:
         self._url = url
         self._client_id = client_id
         self._target_id = target_id
         self._conn: Optional[FixConnection] = None
         self._connected = Event()
-        self._next_seq_num = 1
+        self._session_store = session_store
         self._have_connected = False
         self._subaccount_name = subaccount_name
+        self._frame_recorder = frame_recorder
+        self._metrics = metrics
+        self.orders = order_manager or FixOrderManager()
+        self._on_message = on_message
+        self._markets = markets
 
     def connect(self) -> None:
         if self._have_connected:
@@ -271,12 +508,18 @@ class FixClient:
                 sock = stack.enter_context(context.wrap_socket(sock,
                                                                server_hostname=parsed_url.hostname))
             conn: FixConnection = stack.enter_context(
-                closing(FixConnection(sock, self._client_id, self._target_id)))
+                closing(FixConnection(sock, self._client_id, self._target_id,
+                                      self._frame_recorder, self._metrics,
+                                      self._session_store)))
             self._conn = conn
             self._connected.set()
 
-            for msg in conn.messages:
-                print(msg)
+            try:
+                for msg in conn.messages:
+                    if not self.orders.handle_message(msg) and self._on_message is not None:
+                        self._on_message(msg)
+            finally:
+                self.orders.fail_pending(ConnectionError('FIX session disconnected'))
             logger.info('Disconnected')
 
     def send(self, values: dict) -> None:
@@ -285,12 +528,32 @@ class FixClient:
         assert self._conn is not None
         self._conn.send(values)
 
-    def login(self, secret: str, cancel_on_disconnect: Optional[str] = None) -> None:
+    def _check_session(self) -> None:
+        # Requests tracked once the session is lost would never resolve: its pending requests
+        # were already failed when it disconnected
+        self.connect()
+        assert self._conn is not None
+        if not self._conn.connected:
+            raise ConnectionError('FIX session disconnected')
+
+    def _send_tracked(self, values: dict, result: AsyncResult) -> AsyncResult:
+        try:
+            self.send(values)
+        except Exception as e:
+            self.orders.fail_request(result, e)
+            raise
+        return result
+
+    def login(self, secret: str, cancel_on_disconnect: Optional[str] = None,
+              reset_seq_num: bool = False) -> None:
+        """Log on with the next sequence number of the session, or from 1 with reset_seq_num."""
+        self.connect()
+        assert self._conn is not None
         send_time_str = datetime.now().strftime('%Y%m%d-%H:%M:%S')
-        sign_target = b'\x01'.join([fix_val(val) for val in [
+        sign_target = b'\x01'.join([encode_value(val) for val in [
             send_time_str,
             simplefix.MSGTYPE_LOGON,
-            self._next_seq_num,
+            1 if reset_seq_num else self._conn.next_send_seq_num,
             self._client_id,
             self._target_id,
         ]])
@@ -301,6 +564,7 @@ class FixClient:
             simplefix.TAG_ENCRYPTMETHOD: 0,
             simplefix.TAG_HEARTBTINT: 30,
             simplefix.TAG_RAWDATA: signed,
+            **({simplefix.TAG_RESETSEQNUMFLAG: 'Y'} if reset_seq_num else {}),
             **({8013: cancel_on_disconnect} if cancel_on_disconnect else {}),
             **({simplefix.TAG_ACCOUNT: self._subaccount_name} if self._subaccount_name else {}),
         })
@@ -326,21 +590,29 @@ class FixClient:
         })
 
     def cancel_all_limit_orders(self, market: Optional[str] = None,
-                                client_cancel_id: Optional[str] = None) -> None:
-        self.send({
+                                client_cancel_id: Optional[str] = None) -> AsyncResult:
+        self._check_session()
+        result = self.orders.track_mass_cancel(client_cancel_id)
+        return self._send_tracked({
             simplefix.TAG_MSGTYPE: simplefix.MSGTYPE_ORDER_MASS_CANCEL_REQUEST,
             530: 1 if market else 7,
             **({simplefix.TAG_CLORDID: client_cancel_id} if client_cancel_id else {}),
             **({simplefix.TAG_SYMBOL: market} if market else {}),
-        })
+        }, result)
 
     def send_order(self, symbol: str, side: str, price: Decimal, size: Decimal,
                    reduce_only: bool = False, client_order_id: Optional[str] = None,
-                   ioc: bool = False) -> None:
-        self.send({
+                   ioc: bool = False) -> AsyncResult:
+        if client_order_id is None:
+            client_order_id = str(uuid4())
+        if self._markets is not None:
+            price, size = self._markets.round_order(symbol, price, size, side)
+        self._check_session()
+        result = self.orders.track_order(client_order_id, symbol, side, price, size)
+        return self._send_tracked({
             simplefix.TAG_MSGTYPE: simplefix.MSGTYPE_NEW_ORDER_SINGLE,
             simplefix.TAG_HANDLINST: simplefix.HANDLINST_AUTO_PRIVATE,
-            simplefix.TAG_CLORDID: uuid4() if client_order_id is None else client_order_id,
+            simplefix.TAG_CLORDID: client_order_id,
             simplefix.TAG_SYMBOL: symbol,
             simplefix.TAG_SIDE: (simplefix.SIDE_BUY if side == 'buy'
                                  else simplefix.SIDE_SELL),
@@ -350,10 +622,12 @@ class FixClient:
             simplefix.TAG_TIMEINFORCE: simplefix.TIMEINFORCE_GOOD_TILL_CANCEL if not ioc else \
                 simplefix.TIMEINFORCE_IMMEDIATE_OR_CANCEL,
             **({simplefix.TAG_EXECINST: simplefix.EXECINST_DO_NOT_INCREASE} if reduce_only else {}),
-        })
+        }, result)
 
     def cancel_order(self, order_id: Optional[str] = None,
-                     client_order_id: Optional[str] = None) -> None:
+                     client_order_id: Optional[str] = None) -> AsyncResult:
+        self._check_session()
+        result = self.orders.track_cancel(order_id, client_order_id)
         req = {
             simplefix.TAG_MSGTYPE: simplefix.MSGTYPE_ORDER_CANCEL_REQUEST,
         }
@@ -361,7 +635,7 @@ class FixClient:
             req[simplefix.TAG_ORDERID] = order_id
         if client_order_id is not None:
             req[simplefix.TAG_CLORDID] = client_order_id
-        self.send(req)
+        return self._send_tracked(req, result)
 
 
 # To start up:
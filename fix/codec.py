@@ -0,0 +1,215 @@
+"""FIX 4.x framing, parsing and encoding without building per-field objects.
+
+FixDecoder receives straight into a reusable bytearray and cuts complete messages out of it
+using only BodyLength (9); each FixFrame keeps the raw bytes of one message and looks fields up
+on demand, so a message costs one copy plus a scan per tag actually read. FixEncoder writes
+outgoing messages from pre-encoded header fragments.
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+SOH = b'\x01'
+
+Tag = Union[int, str, bytes]
+
+_tag_keys: Dict[Tag, bytes] = {}
+
+
+def _tag_key(tag: Tag) -> bytes:
+    key = _tag_keys.get(tag)
+    if key is None:
+        key = _tag_keys[tag] = tag if isinstance(tag, bytes) else str(tag).encode()
+    return key
+
+
+class FixDecodeError(ValueError):
+    pass
+
+
+class FixFrame:
+    """One received message. get() returns field values as str like the session code expects;
+    get_bytes() returns them undecoded."""
+
+    __slots__ = ('raw', 'message_type', '_fields')
+
+    def __init__(self, raw: bytes, message_type: bytes) -> None:
+        self.raw = raw
+        self.message_type = message_type
+        self._fields: Optional[Dict[bytes, Optional[bytes]]] = None
+
+    @classmethod
+    def parse(cls, raw: bytes) -> 'FixFrame':
+        """Frame a single complete message."""
+        start = raw.find(b'\x0135=')
+        if start < 0:
+            raise FixDecodeError('Missing MsgType')
+        return cls(raw, raw[start + 4:raw.index(SOH, start + 4)])
+
+    def get_bytes(self, tag: Tag) -> Optional[bytes]:
+        key = _tag_key(tag)
+        fields = self._fields
+        if fields is None:
+            fields = self._fields = {}
+        elif key in fields:
+            return fields[key]
+        raw = self.raw
+        if raw.startswith(key + b'='):
+            start = len(key) + 1
+        else:
+            start = raw.find(SOH + key + b'=')
+            if start < 0:
+                fields[key] = None
+                return None
+            start += len(key) + 2
+        value = fields[key] = raw[start:raw.index(SOH, start)]
+        return value
+
+    def get(self, tag: Tag) -> Optional[str]:
+        value = self.get_bytes(tag)
+        return None if value is None else value.decode()
+
+    @property
+    def pairs(self) -> Iterator[Tuple[bytes, bytes]]:
+        for field in self.raw.split(SOH)[:-1]:
+            tag, _, value = field.partition(b'=')
+            yield tag, value
+
+    def encode(self) -> bytes:
+        return self.raw
+
+    def __str__(self) -> str:
+        return self.raw.replace(SOH, b'|').decode(errors='replace')
+
+    __repr__ = __str__
+
+
+class FixDecoder:
+    """Incremental decoder over a reusable receive buffer.
+
+        decoder = FixDecoder()
+        while decoder.recv_into(sock):
+            for frame in decoder:
+                ...
+    """
+
+    def __init__(self, buffer_size: int = 65536) -> None:
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+        self._last_start = 0
+
+    def _reserve(self, size: int) -> None:
+        if len(self._buffer) - self._end >= size:
+            return
+        pending = self._end - self._start
+        if pending + size <= len(self._buffer):
+            # Move the partial message to the front instead of reallocating
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+        else:
+            buffer = bytearray(max(2 * len(self._buffer), pending + size))
+            buffer[:pending] = self._view[self._start:self._end]
+            self._view.release()
+            self._buffer, self._view = buffer, memoryview(buffer)
+        self._start, self._end = 0, pending
+        self._last_start = pending
+
+    def recv_into(self, sock, min_free: int = 4096) -> int:
+        """Receive once from sock into the buffer; returns the number of bytes received (0 when
+        the connection is closed)."""
+        self._reserve(min_free)
+        self._last_start = self._end
+        received = sock.recv_into(self._view[self._end:])
+        self._end += received
+        return received
+
+    @property
+    def last_received(self) -> memoryview:
+        """View of the bytes appended by the latest recv_into / feed, valid until the next."""
+        return self._view[self._last_start:self._end]
+
+    def feed(self, data: bytes) -> None:
+        self._reserve(len(data))
+        self._last_start = self._end
+        self._buffer[self._end:self._end + len(data)] = data
+        self._end += len(data)
+
+    def __iter__(self) -> Iterator[FixFrame]:
+        buffer, end = self._buffer, self._end
+        while True:
+            start = self._start
+            if start == end:
+                self._start = self._end = 0
+                return
+            body_length_at = buffer.find(b'\x019=', start, end)
+            if body_length_at < 0:
+                return
+            if buffer[start:start + 2] != b'8=':
+                raise FixDecodeError('BeginString must be the first field')
+            body_start = buffer.find(SOH, body_length_at + 3, end)
+            if body_start < 0:
+                return
+            try:
+                body_length = int(buffer[body_length_at + 3:body_start])
+            except ValueError:
+                raise FixDecodeError('Invalid BodyLength') from None
+            checksum_at = body_start + 1 + body_length
+            # 10=NNN<SOH>
+            message_end = checksum_at + 7
+            if message_end > end:
+                return
+            if buffer[checksum_at:checksum_at + 3] != b'10=' or buffer[message_end - 1] != 1:
+                raise FixDecodeError('Invalid BodyLength or CheckSum field')
+            if buffer[body_start + 1:body_start + 4] != b'35=':
+                raise FixDecodeError('MsgType must be the third field')
+            message_type = bytes(buffer[body_start + 4:buffer.index(SOH, body_start + 4)])
+            self._start = message_end
+            yield FixFrame(bytes(self._view[start:message_end]), message_type)
+
+
+class FixEncoder:
+    """Encodes messages with the standard header (8, 9, 35, 49, 56, 34, 52) built from
+    pre-encoded fragments followed by the body fields in the order given."""
+
+    def __init__(self, sender_id: str, target_id: Optional[str] = None,
+                 begin_string: str = 'FIX.4.2') -> None:
+        self._begin_string = f'8={begin_string}\x019='.encode()
+        self._sender_id = sender_id
+        self._comp_ids = b''
+        self._time_second = -1
+        self._time_prefix = b''
+        self.set_target_id(target_id)
+
+    def set_target_id(self, target_id: Optional[str]) -> None:
+        self._comp_ids = f'\x0149={self._sender_id}\x0156={target_id}\x0134='.encode()
+
+    def sending_time(self) -> bytes:
+        now = time.time()
+        second = int(now)
+        if second != self._time_second:
+            self._time_second = second
+            self._time_prefix = time.strftime('%Y%m%d-%H:%M:%S.', time.gmtime(second)).encode()
+        return self._time_prefix + b'%03d' % int((now - second) * 1000)
+
+    def encode(self, message_type: bytes, seq_num: int, fields: Iterable[Tuple[Tag, Any]],
+               sending_time: Any = None) -> bytes:
+        body = [b'35=', message_type, self._comp_ids, b'%d' % seq_num, b'\x0152=',
+                encode_value(sending_time) if sending_time is not None else self.sending_time()]
+        for tag, value in fields:
+            body += (SOH, _tag_key(tag), b'=', encode_value(value))
+        body.append(SOH)
+        encoded_body = b''.join(body)
+        message = b'%s%d\x01%s' % (self._begin_string, len(encoded_body), encoded_body)
+        return message + b'10=%03d\x01' % (sum(message) % 256)
+
+
+def encode_value(value: Any) -> bytes:
+    # As simplefix's fix_val, with datetimes as UTCTimestamps in milliseconds
+    if type(value) is bytes:
+        return value
+    if type(value) is str:
+        return value.encode()
+    if isinstance(value, datetime):
+        return value.strftime('%Y%m%d-%H:%M:%S.').encode() + b'%03d' % (value.microsecond // 1000)
+    return str(value).encode()
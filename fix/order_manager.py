@@ -0,0 +1,281 @@
+"""Local order state for a FIX session.
+
+FixOrderManager keeps every order of the session indexed by ClOrdID and OrderID, applies
+incoming ExecutionReports to it and resolves the gevent AsyncResults returned by FixClient's
+send_order, cancel_order and cancel_all_limit_orders when the matching response arrives.
+Listeners (e.g. common.ledger.Ledger.follow_fix) see every execution report once it is applied.
+"""
+import logging
+import time
+from collections import deque
+from decimal import Decimal
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import simplefix
+from gevent.event import AsyncResult
+
+from fix.codec import FixFrame
+
+logger = logging.getLogger(__name__)
+
+# OrdStatus (39) values
+ORDER_STATUSES = {
+    '0': 'new',
+    '1': 'partially_filled',
+    '2': 'filled',
+    '3': 'done_for_day',
+    '4': 'cancelled',
+    '5': 'replaced',
+    '6': 'pending_cancel',
+    '7': 'stopped',
+    '8': 'rejected',
+    '9': 'suspended',
+    'A': 'pending_new',
+    'C': 'expired',
+    'E': 'pending_replace',
+}
+CLOSED_STATUSES = frozenset({'filled', 'cancelled', 'rejected', 'expired', 'done_for_day'})
+
+_TAG_ORIG_CLORDID = 41
+_TAG_MASS_CANCEL_RESPONSE = 531
+_TAG_TOTAL_AFFECTED_ORDERS = 533
+
+
+class FixRequestRejected(Exception):
+    def __init__(self, reason: str, msg_type: bytes) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.msg_type = msg_type
+
+
+class FixOrder:
+    __slots__ = ('client_order_id', 'order_id', 'symbol', 'side', 'price', 'size',
+                 'filled_size', 'avg_fill_price', 'status', 'reject_reason', 'created_at',
+                 'updated_at')
+
+    def __init__(self, client_order_id: Optional[str], symbol: str, side: str,
+                 price: Optional[Decimal], size: Optional[Decimal],
+                 status: str = 'pending_new') -> None:
+        self.client_order_id = client_order_id
+        self.order_id: Optional[str] = None
+        self.symbol = symbol
+        self.side = side
+        self.price = price
+        self.size = size
+        self.filled_size = Decimal(0)
+        self.avg_fill_price: Optional[Decimal] = None
+        self.status = status
+        self.reject_reason: Optional[str] = None
+        self.created_at = self.updated_at = time.time()
+
+    @property
+    def is_open(self) -> bool:
+        return self.status not in CLOSED_STATUSES
+
+    @property
+    def remaining_size(self) -> Optional[Decimal]:
+        return None if self.size is None else self.size - self.filled_size
+
+    def __repr__(self) -> str:
+        return (f'FixOrder({self.client_order_id!r}, {self.order_id!r}, {self.symbol!r}, '
+                f'{self.side} {self.filled_size}/{self.size} @ {self.price}, {self.status})')
+
+
+def _decimal(value: Optional[str]) -> Optional[Decimal]:
+    return Decimal(value) if value else None
+
+
+class FixOrderManager:
+    def __init__(self, max_closed_orders: int = 10000) -> None:
+        """Closed orders stay indexed until more than max_closed_orders have closed since."""
+        self._by_client_id: Dict[str, FixOrder] = {}
+        self._by_order_id: Dict[str, FixOrder] = {}
+        self._closed: Deque[FixOrder] = deque()
+        self._max_closed_orders = max_closed_orders
+        self._pending_orders: Dict[str, AsyncResult] = {}
+        # Keyed by ('id', OrderID) or ('client', ClOrdID) of the order being cancelled
+        self._pending_cancels: Dict[Tuple[str, str], AsyncResult] = {}
+        self._pending_mass_cancels: Dict[Optional[str], Deque[AsyncResult]] = {}
+        self._listeners: List[Callable[[FixOrder, FixFrame], None]] = []
+
+    def add_listener(self, listener: Callable[[FixOrder, FixFrame], None]) -> None:
+        """Call listener(order, execution_report) after each execution report is applied."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[FixOrder, FixFrame], None]) -> None:
+        self._listeners.remove(listener)
+
+    def get_order(self, client_order_id: Optional[str] = None,
+                  order_id: Optional[str] = None) -> Optional[FixOrder]:
+        if order_id is not None:
+            return self._by_order_id.get(str(order_id))
+        return self._by_client_id.get(client_order_id)
+
+    def open_orders(self, symbol: Optional[str] = None) -> List[FixOrder]:
+        orders = {id(order): order for order in (*self._by_client_id.values(),
+                                                 *self._by_order_id.values())}
+        return [order for order in orders.values()
+                if order.is_open and symbol in (None, order.symbol)]
+
+    def track_order(self, client_order_id: str, symbol: str, side: str, price: Decimal,
+                    size: Decimal) -> AsyncResult:
+        """Register an order about to be sent. The result resolves to its FixOrder on the first
+        execution report, or raises FixRequestRejected if it is rejected. Raises ValueError if
+        an order with the same ClOrdID is still pending or open."""
+        existing = self._by_client_id.get(client_order_id)
+        if client_order_id in self._pending_orders or (existing is not None and existing.is_open):
+            raise ValueError(f'Order {client_order_id!r} is already pending or open')
+        self._by_client_id[client_order_id] = FixOrder(
+            client_order_id, symbol, side, Decimal(str(price)), Decimal(str(size)))
+        result = self._pending_orders[client_order_id] = AsyncResult()
+        return result
+
+    def track_cancel(self, order_id: Optional[str] = None,
+                     client_order_id: Optional[str] = None) -> AsyncResult:
+        """Register a cancel about to be sent. The result resolves to the FixOrder once it is
+        closed (cancelled, or filled first), or raises FixRequestRejected on a cancel reject."""
+        assert order_id is not None or client_order_id is not None
+        key = ('id', str(order_id)) if order_id is not None else ('client', client_order_id)
+        order = self._find(*key)
+        result = AsyncResult()
+        if order is not None and not order.is_open:
+            result.set(order)
+        else:
+            self._pending_cancels[key] = result
+        return result
+
+    def track_mass_cancel(self, client_cancel_id: Optional[str] = None) -> AsyncResult:
+        """The result resolves to the number of affected orders (None if not reported) on the
+        mass cancel report, or raises FixRequestRejected if the request was rejected."""
+        result = AsyncResult()
+        self._pending_mass_cancels.setdefault(client_cancel_id, deque()).append(result)
+        return result
+
+    def fail_pending(self, error: Exception) -> None:
+        """Fail every unresolved request, e.g. when the session is lost."""
+        results = [*self._pending_orders.values(), *self._pending_cancels.values(),
+                   *(result for results in self._pending_mass_cancels.values()
+                     for result in results)]
+        self._pending_orders.clear()
+        self._pending_cancels.clear()
+        self._pending_mass_cancels.clear()
+        for result in results:
+            result.set_exception(error)
+
+    def fail_request(self, result: AsyncResult, error: Exception) -> None:
+        """Stop tracking one unresolved request and fail it, e.g. when sending it failed."""
+        for pending in (self._pending_orders, self._pending_cancels):
+            for key in [key for key, value in pending.items() if value is result]:
+                del pending[key]
+        for results in self._pending_mass_cancels.values():
+            if result in results:
+                results.remove(result)
+        if not result.ready():
+            result.set_exception(error)
+
+    def _find(self, kind: str, key: Optional[str]) -> Optional[FixOrder]:
+        if key is None:
+            return None
+        return (self._by_order_id if kind == 'id' else self._by_client_id).get(key)
+
+    def handle_message(self, msg: FixFrame) -> bool:
+        """Apply an application message; returns False if it is not order related."""
+        msg_type = msg.message_type
+        if msg_type == simplefix.MSGTYPE_EXECUTION_REPORT:
+            self._handle_execution_report(msg)
+        elif msg_type == simplefix.MSGTYPE_ORDER_CANCEL_REJECT:
+            self._handle_cancel_reject(msg)
+        elif msg_type == simplefix.MSGTYPE_ORDER_MASS_CANCEL_REPORT:
+            self._handle_mass_cancel_report(msg)
+        else:
+            return False
+        return True
+
+    def _handle_execution_report(self, msg: FixFrame) -> None:
+        client_order_id = msg.get(simplefix.TAG_CLORDID)
+        order_id = msg.get(simplefix.TAG_ORDERID)
+        status = ORDER_STATUSES.get(msg.get(simplefix.TAG_ORDSTATUS), 'unknown')
+
+        order = self._find('id', order_id) or self._find('client', client_order_id)
+        if order is None:
+            # Placed before this session or by another one
+            order = FixOrder(client_order_id, msg.get(simplefix.TAG_SYMBOL),
+                             'buy' if msg.get(simplefix.TAG_SIDE) == '1' else 'sell',
+                             _decimal(msg.get(simplefix.TAG_PRICE)),
+                             _decimal(msg.get(simplefix.TAG_ORDERQTY)))
+            if client_order_id:
+                self._by_client_id[client_order_id] = order
+        if order_id and order.order_id is None:
+            order.order_id = order_id
+            self._by_order_id[order_id] = order
+
+        was_open = order.is_open
+        order.status = status
+        order.updated_at = time.time()
+        filled_size = msg.get(simplefix.TAG_CUMQTY)
+        if filled_size:
+            order.filled_size = Decimal(filled_size)
+        avg_fill_price = msg.get(simplefix.TAG_AVGPX)
+        if order.filled_size and avg_fill_price:
+            order.avg_fill_price = Decimal(avg_fill_price)
+        if status == 'rejected':
+            order.reject_reason = msg.get(simplefix.TAG_TEXT)
+        for listener in self._listeners:
+            try:
+                listener(order, msg)
+            except Exception:
+                logger.exception('Error in execution report listener')
+
+        pending = self._pending_orders.pop(order.client_order_id, None)
+        if pending is not None:
+            if status == 'rejected':
+                pending.set_exception(FixRequestRejected(order.reject_reason or 'Rejected',
+                                                         simplefix.MSGTYPE_NEW_ORDER_SINGLE))
+            else:
+                pending.set(order)
+        if not order.is_open:
+            for key in (('id', order.order_id), ('client', order.client_order_id)):
+                pending = self._pending_cancels.pop(key, None)
+                if pending is not None:
+                    pending.set(order)
+            if was_open:
+                self._retire(order)
+
+    def _retire(self, order: FixOrder) -> None:
+        self._closed.append(order)
+        while len(self._closed) > self._max_closed_orders:
+            old = self._closed.popleft()
+            if old.client_order_id is not None and \
+                    self._by_client_id.get(old.client_order_id) is old:
+                del self._by_client_id[old.client_order_id]
+            if old.order_id is not None and self._by_order_id.get(old.order_id) is old:
+                del self._by_order_id[old.order_id]
+
+    def _handle_cancel_reject(self, msg: FixFrame) -> None:
+        reason = msg.get(simplefix.TAG_TEXT) or 'Cancel rejected'
+        for key in (('id', msg.get(simplefix.TAG_ORDERID)),
+                    ('client', msg.get(simplefix.TAG_CLORDID)),
+                    ('client', msg.get(_TAG_ORIG_CLORDID))):
+            pending = self._pending_cancels.pop(key, None)
+            if pending is not None:
+                pending.set_exception(FixRequestRejected(reason,
+                                                         simplefix.MSGTYPE_ORDER_CANCEL_REQUEST))
+                return
+        logger.warning('Unmatched order cancel reject: %s', reason)
+
+    def _handle_mass_cancel_report(self, msg: FixFrame) -> None:
+        client_cancel_id = msg.get(simplefix.TAG_CLORDID)
+        results = self._pending_mass_cancels.get(client_cancel_id)
+        if not results:
+            return
+        result = results.popleft()
+        if not results:
+            del self._pending_mass_cancels[client_cancel_id]
+        # MassCancelResponse 0 means the request was rejected
+        if msg.get(_TAG_MASS_CANCEL_RESPONSE) == '0':
+            result.set_exception(FixRequestRejected(
+                msg.get(simplefix.TAG_TEXT) or 'Mass cancel rejected',
+                simplefix.MSGTYPE_ORDER_MASS_CANCEL_REQUEST))
+        else:
+            affected = msg.get(_TAG_TOTAL_AFFECTED_ORDERS)
+            result.set(int(affected) if affected else None)
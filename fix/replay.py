@@ -0,0 +1,53 @@
+from typing import Callable, Iterator, Optional
+
+import gevent
+
+from common.recorder import SOURCE_FIX, FrameLogReader, paced
+from fix.client import FixConnection
+
+
+class _ReplaySocket:
+    """Socket stand-in that returns recorded chunks from recv and discards everything sent."""
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self._chunks = chunks
+        self._pending = b''
+
+    def setsockopt(self, *args) -> None:
+        pass
+
+    def recv(self, bufsize: int) -> bytes:
+        if not self._pending:
+            self._pending = next(self._chunks, b'')
+        data, self._pending = self._pending[:bufsize], self._pending[bufsize:]
+        return data
+
+    def recv_into(self, buffer, nbytes: int = 0) -> int:
+        data = self.recv(nbytes or len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def sendall(self, data: bytes) -> None:
+        pass
+
+    def shutdown(self, how: int) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def replay_fix(path: str, sender_id: str, target_id: str,
+               on_message: Callable[[object], None], speed: Optional[float] = 1.) -> int:
+    """Parse and validate the FIX bytes of a frame log through FixConnection as if they had been
+    received from target_id, passing every application message to on_message. Returns the
+    number of messages delivered."""
+    count = 0
+    with FrameLogReader(path) as reader:
+        records = (record for record in reader if record[1] == SOURCE_FIX)
+        chunks = (bytes(payload) for _, _, payload in paced(records, speed, gevent.sleep))
+        conn = FixConnection(_ReplaySocket(chunks), sender_id, target_id, heartbeats=False)
+        for msg in conn.messages:
+            on_message(msg)
+            count += 1
+    return count
@@ -0,0 +1,172 @@
+"""Sequence numbers and sent messages of a FIX session, kept so that a session can be resumed
+after a reconnect and messages the counterparty missed can be resent.
+
+FixSessionStore keeps everything in memory; FileSessionStore persists to an append-only,
+memory-mapped file so a session also survives a restart of the process. Both keep at most
+`max_messages` messages available for resending (older ones are answered with a gap fill), so
+memory stays bounded however long the session runs.
+
+File layout: an 8 byte magic header, the next send and receive sequence numbers (uint64 each),
+then records of
+    sequence number (uint64) | length (uint32) | encoded message
+all little-endian, as in common.recorder: the file is grown in chunks and written through mmap,
+and a zero sequence number marks the end of the data. Writes to the mapping survive a crash of
+the process; call flush() to also make them durable against a crash of the machine.
+"""
+import mmap
+import os
+import struct
+import threading
+from collections import deque
+from typing import Deque, Iterator, Optional, Tuple
+
+_MAGIC = b'FTXFIX1\n'
+_SEQ_NUMS = struct.Struct('<QQ')
+_RECORD_HEADER = struct.Struct('<QI')
+_DATA_START = len(_MAGIC) + _SEQ_NUMS.size
+
+
+class FixSessionStore:
+    def __init__(self, max_messages: int = 10000) -> None:
+        self.next_send_seq_num = 1
+        self.next_recv_seq_num = 1
+        self._messages: Deque[Tuple[int, bytes]] = deque(maxlen=max_messages)
+
+    def add_sent(self, seq_num: int, message: Optional[bytes]) -> None:
+        """Record that seq_num was sent. message is kept for resending unless it is None (for
+        session messages, which are never resent)."""
+        self.next_send_seq_num = seq_num + 1
+        if message is not None:
+            self._messages.append((seq_num, message))
+
+    def set_next_recv_seq_num(self, seq_num: int) -> None:
+        self.next_recv_seq_num = seq_num
+
+    def get_sent(self, begin: int, end: int) -> Iterator[Tuple[int, bytes]]:
+        """Stored messages with sequence numbers from begin to end inclusive, in order."""
+        for seq_num, message in self._messages:
+            if seq_num > end:
+                break
+            if seq_num >= begin:
+                yield seq_num, message
+
+    def reset(self) -> None:
+        """Start a new session from sequence number 1."""
+        self.next_send_seq_num = self.next_recv_seq_num = 1
+        self._messages.clear()
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class FileSessionStore(FixSessionStore):
+    def __init__(self, path: str, max_messages: int = 10000,
+                 chunk_size: int = 4 * 1024 * 1024) -> None:
+        super().__init__(max_messages)
+        self._chunk_size = chunk_size
+        self._lock = threading.Lock()
+        # (sequence number, offset, length) of the last max_messages records
+        self._index: Deque[Tuple[int, int, int]] = deque(maxlen=max_messages)
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, 'r+b' if exists else 'w+b')
+        self._size = 0
+        self._mmap: Optional[mmap.mmap] = None
+        if exists:
+            self._size = os.path.getsize(path)
+            self._mmap = mmap.mmap(self._file.fileno(), self._size)
+            if self._mmap[:len(_MAGIC)] != _MAGIC:
+                raise ValueError(f'{path} is not a FIX session store')
+            self.next_send_seq_num, self.next_recv_seq_num = \
+                _SEQ_NUMS.unpack_from(self._mmap, len(_MAGIC))
+            self._offset = self._load_index()
+        else:
+            self._grow(_DATA_START)
+            self._mmap[:len(_MAGIC)] = _MAGIC
+            self._write_seq_nums()
+            self._offset = _DATA_START
+
+    def _load_index(self) -> int:
+        offset = _DATA_START
+        while offset + _RECORD_HEADER.size <= self._size:
+            seq_num, length = _RECORD_HEADER.unpack_from(self._mmap, offset)
+            start = offset + _RECORD_HEADER.size
+            if not seq_num or start + length > self._size:
+                break
+            self._index.append((seq_num, start, length))
+            offset = start + length
+        return offset
+
+    def _grow(self, needed: int) -> None:
+        size = self._size + max(self._chunk_size, needed)
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.truncate(size)
+        self._size = size
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+
+    def _write_seq_nums(self) -> None:
+        _SEQ_NUMS.pack_into(self._mmap, len(_MAGIC), self.next_send_seq_num,
+                            self.next_recv_seq_num)
+
+    def add_sent(self, seq_num: int, message: Optional[bytes]) -> None:
+        with self._lock:
+            self.next_send_seq_num = seq_num + 1
+            if message is not None:
+                record_size = _RECORD_HEADER.size + len(message)
+                # Keep room for a zeroed end-of-data header after the record
+                if self._offset + record_size + _RECORD_HEADER.size > self._size:
+                    self._grow(record_size + _RECORD_HEADER.size)
+                _RECORD_HEADER.pack_into(self._mmap, self._offset, seq_num, len(message))
+                start = self._offset + _RECORD_HEADER.size
+                self._mmap[start:start + len(message)] = message
+                self._index.append((seq_num, start, len(message)))
+                self._offset = start + len(message)
+            self._write_seq_nums()
+
+    def set_next_recv_seq_num(self, seq_num: int) -> None:
+        with self._lock:
+            self.next_recv_seq_num = seq_num
+            self._write_seq_nums()
+
+    def get_sent(self, begin: int, end: int) -> Iterator[Tuple[int, bytes]]:
+        with self._lock:
+            records = [(seq_num, self._mmap[start:start + length])
+                       for seq_num, start, length in self._index if begin <= seq_num <= end]
+        return iter(records)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.next_send_seq_num = self.next_recv_seq_num = 1
+            self._index.clear()
+            # Truncating and growing again zeroes the old records
+            self._mmap.close()
+            self._mmap = None
+            self._file.truncate(_DATA_START)
+            self._size = _DATA_START
+            self._grow(0)
+            self._mmap[:len(_MAGIC)] = _MAGIC
+            self._write_seq_nums()
+            self._offset = _DATA_START
+
+    def flush(self) -> None:
+        with self._lock:
+            self._mmap.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._mmap is None:
+                return
+            self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+            self._file.truncate(self._offset)
+            self._file.close()
+
+    def __enter__(self) -> 'FileSessionStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,89 @@
+"""Deadline scheduler shared by the FIX connections of a process.
+
+One greenlet keeps a heap of timers and sleeps until the earliest deadline, so any number of
+sessions cost a single wakeup per due timer and nothing while idle. Callbacks run in the
+scheduler greenlet and must not block; spawn a greenlet for anything that does I/O.
+"""
+import heapq
+import itertools
+import logging
+import time
+from typing import Callable, List, Optional
+
+import gevent
+from gevent.event import Event
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    __slots__ = ('deadline', '_order', 'callback')
+
+    def __init__(self, deadline: float, order: int, callback: Callable[[], None]) -> None:
+        self.deadline = deadline
+        self._order = order
+        self.callback: Optional[Callable[[], None]] = callback
+
+    def __lt__(self, other: 'Timer') -> bool:
+        return (self.deadline, self._order) < (other.deadline, other._order)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.callback is None
+
+    def cancel(self) -> None:
+        # Left in the heap and discarded when due
+        self.callback = None
+
+
+class TimerScheduler:
+    def __init__(self) -> None:
+        self._timers: List[Timer] = []
+        self._order = itertools.count()
+        self._wakeup = Event()
+        self._runner: Optional[gevent.Greenlet] = None
+
+    def call_at(self, deadline: float, callback: Callable[[], None]) -> Timer:
+        """Run callback once time.monotonic() reaches deadline."""
+        timer = Timer(deadline, next(self._order), callback)
+        heapq.heappush(self._timers, timer)
+        if self._runner is None or self._runner.dead:
+            self._runner = gevent.spawn(self._run)
+        elif self._timers[0] is timer:
+            self._wakeup.set()
+        return timer
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> Timer:
+        return self.call_at(time.monotonic() + delay, callback)
+
+    def __len__(self) -> int:
+        return sum(1 for timer in self._timers if not timer.cancelled)
+
+    def _run(self) -> None:
+        timers = self._timers
+        while timers:
+            timer = timers[0]
+            if timer.cancelled:
+                heapq.heappop(timers)
+                continue
+            delay = timer.deadline - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                self._wakeup.wait(delay)
+                continue
+            heapq.heappop(timers)
+            callback, timer.callback = timer.callback, None
+            try:
+                callback()
+            except Exception:
+                logger.exception('Error in timer callback')
+
+
+_default_scheduler: Optional[TimerScheduler] = None
+
+
+def default_scheduler() -> TimerScheduler:
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = TimerScheduler()
+    return _default_scheduler
@@ -0,0 +1,177 @@
+"""Drive the REST, websocket and FIX clients against a local MockExchange and report
+throughput and tail latency.
+
+    python -m mock_exchange.load_test --rest-requests 2000 --ws-rate 20000 --fix-orders 2000
+"""
+import argparse
+import contextlib
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+import simplefix
+
+from fix.client import FixConnection
+from mock_exchange.server import MockExchange, MockExchangeConfig, MockExchangeProcess
+from rest.client import FtxClient
+from websocket.client import FtxWebsocketClient
+from websocket.subscriptions import OrderbookDelta
+
+Exchange = Union[MockExchange, MockExchangeProcess]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    if not latencies:
+        return {'count': 0, 'errors': errors, 'elapsed': elapsed}
+
+    def percentile(q: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+    return {
+        'count': len(latencies),
+        'errors': errors,
+        'elapsed': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed else 0.,
+        'p50': percentile(.5),
+        'p90': percentile(.9),
+        'p99': percentile(.99),
+        'p999': percentile(.999),
+        'max': latencies[-1],
+    }
+
+
+def run_rest_load(exchange: Exchange, requests: int = 1000,
+                  concurrency: int = 16) -> Dict[str, float]:
+    """Place `requests` orders through FtxClient with `concurrency` requests in flight."""
+    client = FtxClient('key', exchange.config.api_secret or 'secret', batch_workers=concurrency)
+    client._ENDPOINT = exchange.rest_url
+    market = next(iter(exchange.config.markets))
+    result = client.place_orders([
+        {'market': market, 'side': 'buy', 'price': 1., 'size': 1., 'client_id': str(i)}
+        for i in range(requests)])
+    stats = result.stats()
+    return summarize(result.latencies, result.elapsed, stats['errors'])
+
+
+def run_websocket_load(exchange: Exchange, markets: Optional[List[str]] = None,
+                       duration: float = 5.) -> Dict[str, float]:
+    """Subscribe to the orderbooks of `markets` for `duration` seconds. Latency is measured from
+    the exchange timestamp of each update to its delivery to a subscriber, i.e. after decoding,
+    applying and checksumming."""
+    markets = markets or list(exchange.config.markets)
+    client = FtxWebsocketClient()
+    client._ENDPOINT = exchange.ws_url
+    latencies: List[float] = []
+
+    def on_delta(delta: OrderbookDelta) -> None:
+        if delta.action == 'update':
+            latencies.append(time.time() - delta.time)
+
+    subscription = client.subscribe('orderbook', callback=on_delta)
+    for market in markets:
+        client.get_orderbook(market)
+    start = time.perf_counter()
+    time.sleep(duration)
+    elapsed = time.perf_counter() - start
+    subscription.close()
+    client.ws.close()
+    return summarize(latencies, elapsed)
+
+
+def run_fix_load(exchange: Exchange, orders: int = 1000,
+                 window: int = 50) -> Dict[str, float]:
+    """Send `orders` NewOrderSingles keeping up to `window` unacknowledged, timing each from send
+    to its ExecutionReport."""
+    market = next(iter(exchange.config.markets))
+    host, port = exchange.fix_url.split('://')[1].rsplit(':', 1)
+    sock = socket.create_connection((host, int(port)))
+    with contextlib.closing(FixConnection(sock, 'loadtest', 'FTX')) as conn:
+        conn.send({simplefix.TAG_MSGTYPE: simplefix.MSGTYPE_LOGON,
+                   simplefix.TAG_ENCRYPTMETHOD: 0, simplefix.TAG_HEARTBTINT: 30})
+        assert next(conn.messages).message_type == simplefix.MSGTYPE_LOGON
+
+        sent: Dict[str, float] = {}
+        latencies: List[float] = []
+        next_id = 0
+        start = time.perf_counter()
+
+        def send_order() -> None:
+            nonlocal next_id
+            cl_ord_id = str(next_id)
+            next_id += 1
+            sent[cl_ord_id] = time.perf_counter()
+            conn.send({
+                simplefix.TAG_MSGTYPE: simplefix.MSGTYPE_NEW_ORDER_SINGLE,
+                simplefix.TAG_HANDLINST: simplefix.HANDLINST_AUTO_PRIVATE,
+                simplefix.TAG_CLORDID: cl_ord_id,
+                simplefix.TAG_SYMBOL: market,
+                simplefix.TAG_SIDE: simplefix.SIDE_BUY,
+                simplefix.TAG_PRICE: 1,
+                simplefix.TAG_ORDERQTY: 1,
+                simplefix.TAG_ORDTYPE: simplefix.ORDTYPE_LIMIT,
+            })
+
+        for _ in range(min(window, orders)):
+            send_order()
+        for msg in conn.messages:
+            if msg.message_type != simplefix.MSGTYPE_EXECUTION_REPORT or \
+                    msg.get(simplefix.TAG_EXECTYPE) != simplefix.EXECTYPE_NEW.decode():
+                continue
+            latencies.append(time.perf_counter() - sent.pop(msg.get(simplefix.TAG_CLORDID)))
+            if next_id < orders:
+                send_order()
+            elif not sent:
+                break
+        return summarize(latencies, time.perf_counter() - start)
+
+
+def _format(name: str, stats: Dict[str, float]) -> str:
+    if not stats['count']:
+        return f'{name:<10} no samples'
+    return (f'{name:<10} {stats["count"]:>8} {stats["throughput"]:>10.0f}/s '
+            + ' '.join(f'{key}={stats[key] * 1e3:.2f}ms'
+                       for key in ('p50', 'p90', 'p99', 'p999', 'max'))
+            + (f' errors={stats["errors"]}' if stats['errors'] else ''))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rest-requests', type=int, default=1000)
+    parser.add_argument('--rest-concurrency', type=int, default=16)
+    parser.add_argument('--rest-latency', type=float, default=0.)
+    parser.add_argument('--rest-error-rate', type=float, default=0.)
+    parser.add_argument('--ws-rate', type=float, default=5000.)
+    parser.add_argument('--ws-duration', type=float, default=5.)
+    parser.add_argument('--checksum-error-rate', type=float, default=0.)
+    parser.add_argument('--fix-orders', type=int, default=1000)
+    parser.add_argument('--fix-window', type=int, default=50)
+    parser.add_argument('--fix-latency', type=float, default=0.)
+    parser.add_argument('--in-process', action='store_true',
+                        help='run the exchange in this process (it then shares the GIL with '
+                             'the clients)')
+    args = parser.parse_args()
+
+    config = MockExchangeConfig(
+        rest_latency=args.rest_latency, rest_error_rate=args.rest_error_rate,
+        ws_message_rate=args.ws_rate, checksum_error_rate=args.checksum_error_rate,
+        fix_latency=args.fix_latency)
+    with (MockExchange if args.in_process else MockExchangeProcess)(config) as exchange:
+        if args.rest_requests:
+            print(_format('rest', run_rest_load(exchange, args.rest_requests,
+                                                args.rest_concurrency)))
+        if args.ws_duration:
+            print(_format('websocket', run_websocket_load(exchange,
+                                                          duration=args.ws_duration)))
+        if args.fix_orders:
+            # FIX runs on gevent; keep it off the threads used above
+            result: Dict[str, Dict[str, float]] = {}
+            thread = threading.Thread(target=lambda: result.update(
+                fix=run_fix_load(exchange, args.fix_orders, args.fix_window)))
+            thread.start()
+            thread.join()
+            print(_format('fix', result['fix']))
+
+
+if __name__ == '__main__':
+    main()
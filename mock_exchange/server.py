@@ -0,0 +1,712 @@
+"""Local stand-in for the FTX REST, websocket and FIX endpoints, for offline load testing.
+
+    exchange = MockExchange(MockExchangeConfig(ws_message_rate=5000))
+    exchange.start()
+    client = FtxClient('key', 'secret')
+    client._ENDPOINT = exchange.rest_url
+    ...
+    exchange.stop()
+
+Only the parts of each protocol that the clients in this repository use are implemented: the
+REST `success`/`result` envelope for markets, orders, positions and balances; websocket
+subscribe/unsubscribe with orderbook partial/update/checksum, trades and ticker streams; and the
+FIX 4.2 session layer with order entry, cancels and mass cancels.
+"""
+import base64
+import hashlib
+import hmac
+import itertools
+import json
+import multiprocessing
+import random
+import socket
+import socketserver
+import struct
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import simplefix
+
+from websocket.orderbook import OrderBook
+
+_WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_OPCODE_TEXT = 0x1
+_OPCODE_CLOSE = 0x8
+_OPCODE_PING = 0x9
+_OPCODE_PONG = 0xA
+
+
+class MockExchangeConfig:
+    def __init__(self, markets: Optional[Dict[str, float]] = None,
+                 api_secret: Optional[str] = None, rest_latency: float = 0.,
+                 rest_error_rate: float = 0., ws_message_rate: float = 1000.,
+                 checksum_error_rate: float = 0., reconnect_info_after: Optional[int] = None,
+                 fix_latency: float = 0., fix_fill_rate: float = 0., seed: int = 0) -> None:
+        """
+        markets: market name -> initial mid price
+        api_secret: when set, REST requests must carry a valid FTX-SIGN for it
+        rest_latency / fix_latency: seconds added before each REST response / FIX reply
+        rest_error_rate: fraction of REST requests rejected with HTTP 429
+        ws_message_rate: market data messages per second per websocket connection
+        checksum_error_rate: fraction of orderbook messages sent with a wrong checksum
+        reconnect_info_after: send a 20001 info message and drop each websocket connection
+            after this many market data messages
+        fix_fill_rate: fraction of FIX orders filled immediately after being acknowledged
+        """
+        self.markets = markets or {'BTC-PERP': 40000., 'ETH-PERP': 2500., 'SOL/USD': 150.}
+        self.api_secret = api_secret
+        self.rest_latency = rest_latency
+        self.rest_error_rate = rest_error_rate
+        self.ws_message_rate = ws_message_rate
+        self.checksum_error_rate = checksum_error_rate
+        self.reconnect_info_after = reconnect_info_after
+        self.fix_latency = fix_latency
+        self.fix_fill_rate = fix_fill_rate
+        self.seed = seed
+
+
+class _MarketSimulator:
+    def __init__(self, mid: float, rng: random.Random) -> None:
+        self._rng = rng
+        self.mid = mid
+        self.tick = mid / 40000
+        self.book = OrderBook()
+        self.partial = (
+            [[round(mid - self.tick * (i + 1), 8), round(rng.uniform(0.01, 5), 4)]
+             for i in range(100)],
+            [[round(mid + self.tick * (i + 1), 8), round(rng.uniform(0.01, 5), 4)]
+             for i in range(100)],
+        )
+        self.book.update('bids', self.partial[0])
+        self.book.update('asks', self.partial[1])
+
+    def step(self) -> Tuple[List[List[float]], List[List[float]]]:
+        bids, asks = [], []
+        for _ in range(self._rng.randint(1, 3)):
+            level = int(self._rng.expovariate(0.1))
+            size = 0. if self._rng.random() < 0.3 else round(self._rng.uniform(0.01, 5), 4)
+            if self._rng.random() < 0.5:
+                bids.append([round(self.mid - self.tick * (level + 1), 8), size])
+            else:
+                asks.append([round(self.mid + self.tick * (level + 1), 8), size])
+        self.book.update('bids', bids)
+        self.book.update('asks', asks)
+        return bids, asks
+
+
+class _ExchangeState:
+    """Orders, positions and balances shared by the REST and FIX endpoints."""
+
+    def __init__(self, config: MockExchangeConfig) -> None:
+        self.config = config
+        self.lock = threading.Lock()
+        self.order_ids = itertools.count(1)
+        self.orders: Dict[int, Dict] = {}
+        self.rng = random.Random(config.seed)
+        self.books = {market: _MarketSimulator(mid, random.Random(config.seed))
+                      for market, mid in config.markets.items()}
+        # Messages sent to each FIX client as (fields, SendingTime), by sequence number - 1;
+        # kept across connections for resends
+        self.fix_sent: Dict[str, List[Tuple[List[Tuple[int, Any]], bytes]]] = {}
+
+    def new_order(self, market: str, side: str, price: float, size: float,
+                  client_id: Optional[str] = None, type: str = 'limit',
+                  reduce_only: bool = False, ioc: bool = False, post_only: bool = False) -> Dict:
+        with self.lock:
+            order = {
+                'id': next(self.order_ids), 'market': market, 'side': side, 'price': price,
+                'size': size, 'type': type, 'status': 'open', 'filledSize': 0.,
+                'remainingSize': size, 'avgFillPrice': None, 'reduceOnly': reduce_only,
+                'ioc': ioc, 'postOnly': post_only, 'clientId': client_id,
+                'createdAt': datetime.utcnow().isoformat() + '+00:00',
+            }
+            self.orders[order['id']] = order
+            return dict(order)
+
+    def fill(self, order_id: int) -> Dict:
+        with self.lock:
+            order = self.orders[order_id]
+            order.update(status='closed', filledSize=order['size'], remainingSize=0.,
+                         avgFillPrice=order['price'])
+            return dict(order)
+
+    def cancel(self, order_id: Optional[int] = None,
+               client_id: Optional[str] = None) -> Optional[Dict]:
+        with self.lock:
+            if order_id is None:
+                order_id = next((o['id'] for o in self.orders.values()
+                                 if o['clientId'] == client_id and o['status'] != 'closed'), None)
+            order = self.orders.get(order_id)
+            if order is None or order['status'] == 'closed':
+                return None
+            order.update(status='closed', remainingSize=0.)
+            return dict(order)
+
+    def cancel_all(self, market: Optional[str] = None) -> List[Dict]:
+        with self.lock:
+            cancelled = []
+            for order in self.orders.values():
+                if order['status'] != 'closed' and market in (None, order['market']):
+                    order.update(status='closed', remainingSize=0.)
+                    cancelled.append(dict(order))
+            return cancelled
+
+    def open_orders(self, market: Optional[str] = None) -> List[Dict]:
+        with self.lock:
+            return [dict(o) for o in self.orders.values()
+                    if o['status'] != 'closed' and market in (None, o['market'])]
+
+
+class _RestError(Exception):
+    def __init__(self, status: int, error: str) -> None:
+        super().__init__(error)
+        self.status = status
+        self.error = error
+
+
+class _RestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    state: _ExchangeState
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _handle(self) -> None:
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        config = self.state.config
+        try:
+            if config.rest_latency:
+                time.sleep(config.rest_latency)
+            if config.rest_error_rate and self.state.rng.random() < config.rest_error_rate:
+                raise _RestError(429, 'Do not send more than 30 requests per second')
+            self._authenticate(body)
+            url = urlparse(self.path)
+            if not url.path.startswith('/api/'):
+                raise _RestError(404, 'Not found')
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            result = self._route(url.path[len('/api/'):], params, json.loads(body or b'null'))
+            self._respond(200, {'success': True, 'result': result})
+        except _RestError as e:
+            self._respond(e.status, {'success': False, 'error': e.error})
+
+    do_GET = do_POST = do_DELETE = _handle
+
+    def _respond(self, status: int, data: Dict) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authenticate(self, body: bytes) -> None:
+        secret = self.state.config.api_secret
+        if secret is None:
+            return
+        ts, sign = self.headers.get('FTX-TS'), self.headers.get('FTX-SIGN')
+        if not ts or not sign or not self.headers.get('FTX-KEY'):
+            raise _RestError(401, 'Not logged in')
+        payload = f'{ts}{self.command}{self.path}'.encode() + body
+        if not hmac.compare_digest(sign, hmac.new(secret.encode(), payload,
+                                                  'sha256').hexdigest()):
+            raise _RestError(401, 'Not logged in: Invalid signature')
+
+    def _route(self, path: str, params: Dict[str, str], body: Any) -> Any:
+        state, method, parts = self.state, self.command, path.split('/')
+        if method == 'GET' and path == 'markets':
+            return [{'name': name, 'type': 'future' if '-' in name else 'spot',
+                     'underlying': name.split('-')[0] if '-' in name else None,
+                     'priceIncrement': sim.tick, 'sizeIncrement': 0.0001,
+                     'minProvideSize': 0.0001, 'price': sim.mid, 'enabled': True}
+                    for name, sim in state.books.items()]
+        if method == 'GET' and path == 'futures':
+            return [{'name': name, 'underlying': name.split('-')[0], 'type': 'perpetual',
+                     'expiry': None, 'perpetual': True} for name in state.books if '-' in name]
+        if method == 'GET' and len(parts) == 3 and parts[0] == 'markets' and \
+                parts[2] == 'orderbook':
+            sim = state.books.get(parts[1])
+            if sim is None:
+                raise _RestError(404, 'No such market')
+            depth = int(params.get('depth', 20))
+            return {side: [list(level) for level in levels]
+                    for side, levels in sim.book.snapshot(depth).items()}
+        if method == 'POST' and path == 'orders':
+            if body.get('market') not in state.books:
+                raise _RestError(400, 'No such market')
+            if not body.get('size'):
+                raise _RestError(400, 'Invalid size')
+            return state.new_order(body['market'], body['side'], body['price'], body['size'],
+                                   body.get('clientId'), body.get('type', 'limit'),
+                                   body.get('reduceOnly', False), body.get('ioc', False),
+                                   body.get('postOnly', False))
+        if method == 'POST' and len(parts) == 3 and parts[0] == 'orders' and \
+                parts[2] == 'modify':
+            with state.lock:
+                order = state.orders.get(int(parts[1]))
+                if order is None or order['status'] == 'closed':
+                    raise _RestError(400, 'Order already closed')
+                order.update({key: body[key] for key in ('price', 'size', 'clientId')
+                              if key in body})
+                return dict(order)
+        if method == 'GET' and path == 'orders':
+            return state.open_orders(params.get('market'))
+        if method == 'GET' and len(parts) == 2 and parts[0] == 'orders':
+            order = state.orders.get(int(parts[1]))
+            if order is None:
+                raise _RestError(404, 'Order not found')
+            return dict(order)
+        if method == 'DELETE' and path == 'orders':
+            state.cancel_all((body or {}).get('market'))
+            return 'Orders queued for cancellation'
+        if method == 'DELETE' and len(parts) == 2 and parts[0] == 'orders':
+            if state.cancel(int(parts[1])) is None:
+                raise _RestError(400, 'Order already closed')
+            return 'Order queued for cancellation'
+        if method == 'GET' and path in ('positions', 'fills', 'conditional_orders'):
+            return []
+        if method == 'GET' and path == 'wallet/balances':
+            return [{'coin': 'USD', 'free': 1e6, 'total': 1e6, 'usdValue': 1e6}]
+        if method == 'GET' and path == 'account':
+            return {'collateral': 1e6, 'freeCollateral': 1e6, 'positions': [],
+                    'username': 'mock'}
+        raise _RestError(404, 'Not found')
+
+
+class _WebsocketConnection:
+    def __init__(self, sock: socket.socket, config: MockExchangeConfig, seed: int) -> None:
+        self._sock = sock
+        self._config = config
+        self._rng = random.Random(seed)
+        self._send_lock = threading.Lock()
+        self._subscriptions: Dict[Tuple[str, str], _MarketSimulator] = {}
+        self._subscriptions_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._trade_ids = itertools.count(1)
+
+    def run(self) -> None:
+        try:
+            self._handshake()
+            threading.Thread(target=self._publish, daemon=True).start()
+            while not self._closed.is_set():
+                opcode, payload = self._read_frame()
+                if opcode == _OPCODE_CLOSE:
+                    break
+                if opcode == _OPCODE_PING:
+                    self._send_frame(_OPCODE_PONG, payload)
+                elif opcode == _OPCODE_TEXT:
+                    self._handle_request(json.loads(payload))
+        except (OSError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        try:
+            self._send_frame(_OPCODE_CLOSE, b'')
+        except OSError:
+            pass
+        self._sock.close()
+
+    def _recv_exact(self, n: int) -> bytes:
+        data = b''
+        while len(data) < n:
+            chunk = self._sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError('Connection closed')
+            data += chunk
+        return data
+
+    def _handshake(self) -> None:
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = self._sock.recv(4096)
+            if not chunk:
+                raise ConnectionError('Connection closed during handshake')
+            request += chunk
+        headers = dict(line.split(': ', 1) for line in
+                       request.decode().split('\r\n\r\n')[0].split('\r\n')[1:] if ': ' in line)
+        key = {k.lower(): v for k, v in headers.items()}['sec-websocket-key']
+        accept = base64.b64encode(hashlib.sha1(key.encode() + _WS_GUID).digest()).decode()
+        self._sock.sendall((
+            'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+            f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode())
+
+    def _read_frame(self) -> Tuple[int, bytes]:
+        first, second = self._recv_exact(2)
+        length = second & 0x7f
+        if length == 126:
+            length, = struct.unpack('>H', self._recv_exact(2))
+        elif length == 127:
+            length, = struct.unpack('>Q', self._recv_exact(8))
+        mask = self._recv_exact(4) if second & 0x80 else None
+        payload = self._recv_exact(length)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return first & 0x0f, payload
+
+    def _send_frame(self, opcode: int, payload: bytes) -> None:
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('>BB', 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack('>BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('>BBQ', 0x80 | opcode, 127, length)
+        with self._send_lock:
+            self._sock.sendall(header + payload)
+
+    def send_json(self, message: Dict) -> None:
+        self._send_frame(_OPCODE_TEXT, json.dumps(message).encode())
+
+    def _handle_request(self, request: Dict) -> None:
+        op, channel, market = request.get('op'), request.get('channel'), request.get('market')
+        if op == 'ping':
+            self.send_json({'type': 'pong'})
+        elif op == 'subscribe':
+            self.send_json({'type': 'subscribed', 'channel': channel, 'market': market})
+            if channel in ('orderbook', 'trades', 'ticker'):
+                if market not in self._config.markets:
+                    self.send_json({'type': 'error', 'code': 404, 'msg': 'No such market'})
+                    return
+                sim = _MarketSimulator(self._config.markets[market],
+                                       random.Random(self._rng.random()))
+                if channel == 'orderbook':
+                    self._send_orderbook(market, 'partial', sim, *sim.partial)
+                with self._subscriptions_lock:
+                    self._subscriptions[(channel, market)] = sim
+        elif op == 'unsubscribe':
+            with self._subscriptions_lock:
+                self._subscriptions.pop((channel, market), None)
+            self.send_json({'type': 'unsubscribed', 'channel': channel, 'market': market})
+
+    def _send_orderbook(self, market: str, action: str, sim: _MarketSimulator,
+                        bids: List, asks: List) -> None:
+        checksum = sim.book.checksum()
+        if self._config.checksum_error_rate and \
+                self._rng.random() < self._config.checksum_error_rate:
+            checksum = (checksum + 1) % 2 ** 32
+        self.send_json({'channel': 'orderbook', 'market': market, 'type': action, 'data': {
+            'time': time.time(), 'checksum': checksum, 'bids': bids, 'asks': asks,
+            'action': action,
+        }})
+
+    def _publish_one(self, channel: str, market: str, sim: _MarketSimulator) -> None:
+        if channel == 'orderbook':
+            self._send_orderbook(market, 'update', sim, *sim.step())
+        elif channel == 'trades':
+            self.send_json({'channel': 'trades', 'market': market, 'type': 'update', 'data': [{
+                'id': next(self._trade_ids), 'price': sim.mid,
+                'size': round(self._rng.uniform(0.001, 2), 4),
+                'side': self._rng.choice(['buy', 'sell']), 'liquidation': False,
+                'time': datetime.utcnow().isoformat() + '+00:00',
+            }]})
+        else:
+            bid, ask = sim.book.bids.best(), sim.book.asks.best()
+            self.send_json({'channel': 'ticker', 'market': market, 'type': 'update', 'data': {
+                'bid': bid and bid[0], 'ask': ask and ask[0], 'bidSize': bid and bid[1],
+                'askSize': ask and ask[1], 'last': sim.mid, 'time': time.time(),
+            }})
+
+    def _publish(self) -> None:
+        rate, limit = self._config.ws_message_rate, self._config.reconnect_info_after
+        start, sent = time.monotonic(), 0
+        try:
+            while not self._closed.is_set():
+                with self._subscriptions_lock:
+                    subscriptions = list(self._subscriptions.items())
+                if not subscriptions:
+                    start, sent = time.monotonic(), 0
+                    time.sleep(0.001)
+                    continue
+                due = int((time.monotonic() - start) * rate) - sent
+                for _ in range(due):
+                    (channel, market), sim = self._rng.choice(subscriptions)
+                    self._publish_one(channel, market, sim)
+                    sent += 1
+                    if limit is not None and sent >= limit:
+                        self.send_json({'type': 'info', 'code': 20001,
+                                        'msg': 'Server restarting, please reconnect'})
+                        self.close()
+                        return
+                time.sleep(0.001)
+        except OSError:
+            self.close()
+
+
+_FIX_SESSION_MESSAGES = {
+    simplefix.MSGTYPE_HEARTBEAT, simplefix.MSGTYPE_TEST_REQUEST, simplefix.MSGTYPE_RESEND_REQUEST,
+    simplefix.MSGTYPE_REJECT, simplefix.MSGTYPE_SEQUENCE_RESET, simplefix.MSGTYPE_LOGOUT,
+    simplefix.MSGTYPE_LOGON,
+}
+
+
+class _FixHandler(socketserver.BaseRequestHandler):
+    state: _ExchangeState
+
+    def setup(self) -> None:
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._target_id: Optional[str] = None
+        self._send_lock = threading.Lock()
+        self._rng = random.Random(self.state.config.seed)
+
+    def handle(self) -> None:
+        parser = simplefix.FixParser()
+        while True:
+            try:
+                data = self.request.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            parser.append_buffer(data)
+            while True:
+                msg = parser.get_message()
+                if msg is None:
+                    break
+                if not self._handle_message(msg):
+                    return
+
+    def _encode(self, seq_num: int, values: List[Tuple[int, Any]],
+                orig_sending_time: Optional[bytes] = None) -> simplefix.FixMessage:
+        msg = simplefix.FixMessage()
+        msg.append_pair(simplefix.TAG_BEGINSTRING, 'FIX.4.2')
+        msg.append_pair(simplefix.TAG_SENDER_COMPID, 'FTX')
+        msg.append_pair(simplefix.TAG_TARGET_COMPID, self._target_id)
+        msg.append_pair(simplefix.TAG_MSGSEQNUM, seq_num)
+        msg.append_utc_timestamp(simplefix.TAG_SENDING_TIME)
+        if orig_sending_time is not None:
+            msg.append_pair(simplefix.TAG_POSSDUPFLAG, 'Y')
+            msg.append_pair(simplefix.TAG_ORIGSENDINGTIME, orig_sending_time)
+        for tag, value in values:
+            msg.append_pair(tag, value)
+        return msg
+
+    def _send(self, values: List[Tuple[int, Any]]) -> None:
+        with self._send_lock:
+            sent = self.state.fix_sent.setdefault(self._target_id, [])
+            msg = self._encode(len(sent) + 1, values)
+            sent.append((values, msg.get(simplefix.TAG_SENDING_TIME)))
+            self.request.sendall(msg.encode())
+
+    def _resend(self, begin_seq_num: int, end_seq_num: int) -> None:
+        with self._send_lock:
+            sent = self.state.fix_sent.get(self._target_id, [])
+            end_seq_num = min(end_seq_num or len(sent), len(sent))
+            gap_start = None
+            for seq_num in range(max(begin_seq_num, 1), end_seq_num + 1):
+                values, sending_time = sent[seq_num - 1]
+                if values[0][1] in _FIX_SESSION_MESSAGES:
+                    gap_start = gap_start or seq_num
+                    continue
+                if gap_start is not None:
+                    self._send_gap_fill(gap_start, seq_num)
+                    gap_start = None
+                self.request.sendall(self._encode(seq_num, values, sending_time).encode())
+            if gap_start is not None:
+                self._send_gap_fill(gap_start, end_seq_num + 1)
+
+    def _send_gap_fill(self, seq_num: int, new_seq_num: int) -> None:
+        self.request.sendall(self._encode(seq_num, [
+            (simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_SEQUENCE_RESET),
+            (simplefix.TAG_POSSDUPFLAG, 'Y'),
+            (simplefix.TAG_GAPFILLFLAG, 'Y'),
+            (simplefix.TAG_NEWSEQNO, new_seq_num),
+        ]).encode())
+
+    def _execution_report(self, order: Dict, exec_type: bytes, ord_status: bytes,
+                          cl_ord_id: Any) -> None:
+        self._send([
+            (simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_EXECUTION_REPORT),
+            (simplefix.TAG_ORDERID, order['id']),
+            (simplefix.TAG_CLORDID, cl_ord_id),
+            (simplefix.TAG_EXECID, f'{order["id"]}-{exec_type.decode()}'),
+            (simplefix.TAG_EXECTYPE, exec_type),
+            (simplefix.TAG_ORDSTATUS, ord_status),
+            (simplefix.TAG_SYMBOL, order['market']),
+            (simplefix.TAG_SIDE, simplefix.SIDE_BUY if order['side'] == 'buy'
+             else simplefix.SIDE_SELL),
+            (simplefix.TAG_ORDERQTY, order['size']),
+            (simplefix.TAG_PRICE, order['price']),
+            (simplefix.TAG_CUMQTY, order['filledSize']),
+            (simplefix.TAG_LEAVESQTY, order['remainingSize']),
+            (simplefix.TAG_AVGPX, order['avgFillPrice'] or 0),
+            *(((simplefix.TAG_LASTQTY, order['size']), (simplefix.TAG_LASTPX, order['price']))
+              if exec_type == simplefix.EXECTYPE_FILL else ()),
+        ])
+
+    def _handle_message(self, msg: simplefix.FixMessage) -> bool:
+        state, msg_type = self.state, msg.message_type
+        if self._target_id is None:
+            self._target_id = msg.get(simplefix.TAG_SENDER_COMPID).decode()
+        if state.config.fix_latency and msg_type != simplefix.MSGTYPE_HEARTBEAT:
+            time.sleep(state.config.fix_latency)
+        if msg_type == simplefix.MSGTYPE_LOGON:
+            if msg.get(simplefix.TAG_RESETSEQNUMFLAG) == b'Y':
+                with self._send_lock:
+                    state.fix_sent[self._target_id] = []
+            self._send([(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_LOGON),
+                        (simplefix.TAG_ENCRYPTMETHOD, 0),
+                        (simplefix.TAG_HEARTBTINT, msg.get(simplefix.TAG_HEARTBTINT) or 30)])
+        elif msg_type == simplefix.MSGTYPE_TEST_REQUEST:
+            self._send([(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_HEARTBEAT),
+                        (simplefix.TAG_TESTREQID, msg.get(simplefix.TAG_TESTREQID))])
+        elif msg_type == simplefix.MSGTYPE_LOGOUT:
+            self._send([(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_LOGOUT)])
+            return False
+        elif msg_type == simplefix.MSGTYPE_RESEND_REQUEST:
+            self._resend(int(msg.get(simplefix.TAG_BEGINSEQNO)),
+                         int(msg.get(simplefix.TAG_ENDSEQNO) or 0))
+        elif msg_type == simplefix.MSGTYPE_NEW_ORDER_SINGLE:
+            cl_ord_id = msg.get(simplefix.TAG_CLORDID)
+            order = state.new_order(
+                msg.get(simplefix.TAG_SYMBOL).decode(),
+                'buy' if msg.get(simplefix.TAG_SIDE) == simplefix.SIDE_BUY else 'sell',
+                float(msg.get(simplefix.TAG_PRICE)), float(msg.get(simplefix.TAG_ORDERQTY)),
+                cl_ord_id.decode())
+            self._execution_report(order, simplefix.EXECTYPE_NEW, simplefix.ORDSTATUS_NEW,
+                                   cl_ord_id)
+            if state.config.fix_fill_rate and self._rng.random() < state.config.fix_fill_rate:
+                self._execution_report(state.fill(order['id']), simplefix.EXECTYPE_FILL,
+                                       simplefix.ORDSTATUS_FILLED, cl_ord_id)
+        elif msg_type == simplefix.MSGTYPE_ORDER_CANCEL_REQUEST:
+            order_id, cl_ord_id = msg.get(simplefix.TAG_ORDERID), msg.get(simplefix.TAG_CLORDID)
+            order = state.cancel(int(order_id) if order_id else None,
+                                 cl_ord_id.decode() if cl_ord_id else None)
+            if order is None:
+                self._send([(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_ORDER_CANCEL_REJECT),
+                            (simplefix.TAG_ORDERID, order_id or 'NONE'),
+                            *(((simplefix.TAG_CLORDID, cl_ord_id),) if cl_ord_id else ()),
+                            (simplefix.TAG_ORDSTATUS, simplefix.ORDSTATUS_REJECTED),
+                            (102, 1), (simplefix.TAG_TEXT, 'Order not found')])
+            else:
+                self._execution_report(order, simplefix.EXECTYPE_CANCELED,
+                                       simplefix.ORDSTATUS_CANCELED,
+                                       order['clientId'] or cl_ord_id or '')
+        elif msg_type == simplefix.MSGTYPE_ORDER_MASS_CANCEL_REQUEST:
+            symbol = msg.get(simplefix.TAG_SYMBOL)
+            cancelled = state.cancel_all(symbol.decode() if symbol else None)
+            cl_ord_id = msg.get(simplefix.TAG_CLORDID)
+            self._send([(simplefix.TAG_MSGTYPE, simplefix.MSGTYPE_ORDER_MASS_CANCEL_REPORT),
+                        *(((simplefix.TAG_CLORDID, cl_ord_id),) if cl_ord_id else ()),
+                        (530, msg.get(530)), (531, msg.get(530)), (533, len(cancelled))])
+            for order in cancelled:
+                self._execution_report(order, simplefix.EXECTYPE_CANCELED,
+                                       simplefix.ORDSTATUS_CANCELED, order['clientId'] or '')
+        return True
+
+
+class MockExchange:
+    def __init__(self, config: Optional[MockExchangeConfig] = None,
+                 host: str = '127.0.0.1') -> None:
+        self.config = config or MockExchangeConfig()
+        self._host = host
+        self._state = _ExchangeState(self.config)
+        self._servers: List[Any] = []
+        self._ws_socket: Optional[socket.socket] = None
+        self._ws_connections = itertools.count()
+        self.rest_url = self.ws_url = self.fix_url = ''
+
+    def start(self) -> None:
+        rest_handler = type('RestHandler', (_RestHandler,), {'state': self._state})
+        rest_server = ThreadingHTTPServer((self._host, 0), rest_handler)
+        rest_server.daemon_threads = True
+        fix_handler = type('FixHandler', (_FixHandler,), {'state': self._state})
+        fix_server = socketserver.ThreadingTCPServer((self._host, 0), fix_handler)
+        fix_server.daemon_threads = True
+        for server in (rest_server, fix_server):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+
+        self._ws_socket = socket.create_server((self._host, 0))
+        threading.Thread(target=self._accept_websockets, daemon=True).start()
+
+        self.rest_url = f'http://{self._host}:{rest_server.server_address[1]}/api/'
+        self.ws_url = f'ws://{self._host}:{self._ws_socket.getsockname()[1]}/ws/'
+        self.fix_url = f'tcp://{self._host}:{fix_server.server_address[1]}'
+
+    def _accept_websockets(self) -> None:
+        while True:
+            try:
+                sock, _ = self._ws_socket.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = _WebsocketConnection(sock, self.config,
+                                              self.config.seed + next(self._ws_connections))
+            threading.Thread(target=connection.run, daemon=True).start()
+
+    def stop(self) -> None:
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+        if self._ws_socket is not None:
+            self._ws_socket.close()
+            self._ws_socket = None
+
+    def __enter__(self) -> 'MockExchange':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def _serve(config: MockExchangeConfig, urls: 'multiprocessing.connection.Connection') -> None:
+    exchange = MockExchange(config)
+    exchange.start()
+    urls.send((exchange.rest_url, exchange.ws_url, exchange.fix_url))
+    # Serve until the parent closes its end of the pipe
+    try:
+        urls.recv()
+    except EOFError:
+        pass
+    exchange.stop()
+
+
+class MockExchangeProcess:
+    """MockExchange running in a child process, so that the exchange does not compete with the
+    clients under test for the GIL and skew their latencies."""
+
+    def __init__(self, config: Optional[MockExchangeConfig] = None,
+                 start_timeout: float = 10.) -> None:
+        self.config = config or MockExchangeConfig()
+        self._start_timeout = start_timeout
+        self._process: Optional[multiprocessing.Process] = None
+        self._urls = None
+        self.rest_url = self.ws_url = self.fix_url = ''
+
+    def start(self) -> None:
+        self._urls, child_urls = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_serve, args=(self.config, child_urls),
+                                                daemon=True)
+        self._process.start()
+        if not self._urls.poll(self._start_timeout):
+            self.stop()
+            raise TimeoutError('Mock exchange did not start')
+        self.rest_url, self.ws_url, self.fix_url = self._urls.recv()
+
+    def stop(self) -> None:
+        if self._process is None:
+            return
+        self._urls.close()
+        self._process.join(5)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process = None
+
+    def __enter__(self) -> 'MockExchangeProcess':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
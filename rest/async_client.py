@@ -0,0 +1,191 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import ExitStack, nullcontext
+from itertools import islice
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+import aiohttp
+from requests import Session
+from yarl import URL
+
+from common.markets import MarketRegistry
+from common.metrics import MetricsRegistry
+from rest.batch import BatchResult, run_batch_async
+from rest.cache import ResponseCache
+from rest.client import FtxClient
+from rest.errors import FtxApiError
+from rest.scheduler import RequestScheduler
+from rest.trade_downloader import (
+    TradePager, next_window, open_columns, start_download, trade_windows, write_window,
+)
+
+
+class AsyncFtxClient(FtxClient):
+    """asyncio version of FtxClient.
+
+    Every endpoint method has the same signature as on FtxClient but returns a coroutine. Requests
+    are signed exactly like FtxClient's and sent over a shared aiohttp connection pool, so many
+    requests can be in flight from one event loop. Use as `async with AsyncFtxClient(...) as
+    client:` or call `await client.close()` when done. iter_all_trades is an async iterator.
+    """
+
+    def __init__(self, api_key=None, api_secret=None, subaccount_name=None,
+                 scheduler: Optional[RequestScheduler] = None, max_connections: int = 100,
+                 max_concurrency: Optional[int] = None, keepalive_timeout: float = 30.,
+                 metrics: Optional[MetricsRegistry] = None,
+                 cache: Optional[ResponseCache] = None,
+                 markets: Optional[MarketRegistry] = None) -> None:
+        super().__init__(api_key, api_secret, subaccount_name, scheduler, batch_workers=1,
+                         metrics=metrics, cache=cache, markets=markets)
+        self._max_connections = max_connections
+        self._keepalive_timeout = keepalive_timeout
+        self._concurrency = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self._aio_session: Optional[aiohttp.ClientSession] = None
+
+    @staticmethod
+    def _create_session(batch_workers: int) -> Optional[Session]:
+        # self._session stays None: requests go through the aiohttp session instead, and every
+        # method that uses the requests Session is overridden here
+        return None
+
+    async def __aenter__(self) -> 'AsyncFtxClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._aio_session is not None:
+            await self._aio_session.close()
+            self._aio_session = None
+
+    def _get_aio_session(self) -> aiohttp.ClientSession:
+        # Created lazily so that it binds to the running event loop
+        if self._aio_session is None or self._aio_session.closed:
+            connector = aiohttp.TCPConnector(limit=self._max_connections,
+                                             keepalive_timeout=self._keepalive_timeout)
+            self._aio_session = aiohttp.ClientSession(connector=connector)
+        return self._aio_session
+
+    async def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        if self._cache is None:
+            return await self._request('GET', path, params=params)
+        return await self._cache.get_async(self._endpoint_name(path), path, params,
+                                           lambda: self._request('GET', path, params=params))
+
+    async def _request(self, method: str, path: str, **kwargs) -> Any:
+        if self._metrics is None:
+            return await self._schedule_request(method, path, **kwargs)
+        endpoint = self._endpoint_name(path)
+        start = time.perf_counter()
+        try:
+            return await self._schedule_request(method, path, **kwargs)
+        except Exception:
+            self._metrics.counter('rest_errors_total', method=method, endpoint=endpoint).inc()
+            raise
+        finally:
+            self._metrics.histogram('rest_request_seconds', method=method,
+                                    endpoint=endpoint).record(time.perf_counter() - start)
+
+    async def _schedule_request(self, method: str, path: str, **kwargs) -> Any:
+        if self._scheduler is None:
+            return await self._send_request(method, path, **kwargs)
+        return await self._scheduler.call_async(method, path,
+                                                lambda: self._send_request(method, path, **kwargs))
+
+    async def _send_request(self, method: str, path: str, **kwargs) -> Any:
+        prepared = self._prepare_request(method, path, **kwargs)
+        session = self._get_aio_session()
+        async with self._concurrency or nullcontext():
+            async with session.request(prepared.method, URL(prepared.url, encoded=True),
+                                       data=prepared.body,
+                                       headers=prepared.headers) as response:
+                return await self._process_response(response)
+
+    async def _process_response(self, response: aiohttp.ClientResponse) -> Any:
+        try:
+            data = await response.json(content_type=None)
+        except ValueError:
+            response.raise_for_status()
+            raise
+        else:
+            if not data['success']:
+                raise FtxApiError(data['error'], response.status)
+            return data['result']
+
+    async def _run_batch(self, calls: List) -> BatchResult:
+        return await run_batch_async(calls)
+
+    async def get_position(self, name: str, show_avg_price: bool = False) -> dict:
+        return next(filter(lambda x: x['future'] == name,
+                           await self.get_positions(show_avg_price)), None)
+
+    async def _fetch_pager(self, market: str, start_time: Optional[float],
+                           end_time: Optional[float]) -> TradePager:
+        pager = TradePager(market, start_time, end_time)
+        while not pager.done:
+            pager.add_page(await self._get(pager.path, pager.params))
+        return pager
+
+    async def get_all_trades(self, market: str, start_time: float = None,
+                             end_time: float = None) -> List:
+        return (await self._fetch_pager(market, start_time, end_time)).trades
+
+    async def _iter_trade_windows(self, market: str, start_time: float, end_time: float,
+                                  window: float, max_workers: int, boundary_ids: Set[int]
+                                  ) -> AsyncIterator[Tuple[float, List, Set[int]]]:
+        """Like rest.trade_downloader.iter_trade_windows, with up to max_workers windows in
+        flight as tasks instead of threads."""
+        remaining = iter(trade_windows(start_time, end_time, window))
+        pending: Deque[Tuple[float, asyncio.Future]] = deque()
+
+        def submit_next(count: int) -> None:
+            for window_start, window_end in islice(remaining, count):
+                pending.append((window_end, asyncio.ensure_future(
+                    self._fetch_pager(market, window_start, window_end))))
+
+        submit_next(max_workers)
+        try:
+            while pending:
+                window_end, task = pending.popleft()
+                pager = await task
+                submit_next(1)
+                timed, boundary_ids = next_window(pager, boundary_ids)
+                yield window_end, timed, boundary_ids
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+    async def iter_all_trades(self, market: str, start_time: float, end_time: float = None,
+                              window: float = 3600., max_workers: int = 8
+                              ) -> AsyncIterator[dict]:
+        """Stream trades oldest first, fetching up to max_workers `window`-second slices of the
+        range concurrently."""
+        windows = self._iter_trade_windows(market, start_time,
+                                           time.time() if end_time is None else end_time,
+                                           window, max_workers, set())
+        try:
+            async for _, timed, _ in windows:
+                for _, trade in timed:
+                    yield trade
+        finally:
+            await windows.aclose()
+
+    async def download_all_trades(self, market: str, directory: str, start_time: float,
+                                  end_time: float = None, window: float = 3600.,
+                                  max_workers: int = 8) -> int:
+        """See FtxClient.download_all_trades. The column files are written from the event loop,
+        one window at a time."""
+        checkpoint = start_download(directory, market, start_time, end_time, window)
+        windows = self._iter_trade_windows(market, checkpoint['next_start_time'],
+                                           checkpoint['end_time'], window, max_workers,
+                                           set(checkpoint['boundary_ids']))
+        with ExitStack() as stack:
+            files = open_columns(directory, checkpoint, stack)
+            try:
+                async for window_end, timed, boundary_ids in windows:
+                    write_window(directory, files, checkpoint, window_end, timed, boundary_ids)
+            finally:
+                await windows.aclose()
+        return checkpoint['rows']
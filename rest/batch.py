@@ -0,0 +1,69 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class BatchResult:
+    """Per-request outcomes of a batch, in input order.
+
+    `results[i]` is the response of the i-th request (None if it failed) and `errors[i]` the
+    exception it raised (None if it succeeded). `latencies[i]` is its round trip time in seconds.
+    """
+
+    def __init__(self, outcomes: Sequence[Tuple[Any, Optional[Exception], float]],
+                 elapsed: float) -> None:
+        self.results: List[Any] = [result for result, _, _ in outcomes]
+        self.errors: List[Optional[Exception]] = [error for _, error, _ in outcomes]
+        self.latencies: List[float] = [latency for _, _, latency in outcomes]
+        self.elapsed = elapsed
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    @property
+    def ok(self) -> bool:
+        return not any(self.errors)
+
+    def stats(self) -> Dict[str, float]:
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return {'count': 0, 'errors': 0, 'elapsed': self.elapsed}
+        return {
+            'count': len(latencies),
+            'errors': sum(error is not None for error in self.errors),
+            'elapsed': self.elapsed,
+            'mean': sum(latencies) / len(latencies),
+            'min': latencies[0],
+            'p50': latencies[len(latencies) // 2],
+            'p99': latencies[min(len(latencies) - 1, int(len(latencies) * .99))],
+            'max': latencies[-1],
+        }
+
+
+def _timed(call: Callable[[], Any]) -> Tuple[Any, Optional[Exception], float]:
+    start = time.perf_counter()
+    try:
+        return call(), None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
+
+
+async def _timed_async(call: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[Exception], float]:
+    start = time.perf_counter()
+    try:
+        return await call(), None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
+
+
+def run_batch(executor: Executor, calls: Sequence[Callable[[], Any]]) -> BatchResult:
+    start = time.perf_counter()
+    outcomes = list(executor.map(_timed, calls))
+    return BatchResult(outcomes, time.perf_counter() - start)
+
+
+async def run_batch_async(calls: Sequence[Callable[[], Awaitable[Any]]]) -> BatchResult:
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*[_timed_async(call) for call in calls])
+    return BatchResult(outcomes, time.perf_counter() - start)
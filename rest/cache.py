@@ -0,0 +1,231 @@
+"""Opt-in cache for slow-changing GET endpoints of FtxClient / AsyncFtxClient.
+
+Responses are cached per path and query for the TTL of their endpoint (named as in the metrics
+labels, e.g. 'markets' or 'wallet/deposit_address/{}'); endpoints without a TTL are never
+cached. Entries beyond max_entries are evicted least recently used first. Concurrent identical
+GETs are coalesced: while one is in flight, the others wait for its response instead of sending
+their own.
+
+    cache = ResponseCache({'markets': 2.})
+    client = FtxClient(key, secret, cache=cache)
+    invalidate_from_websocket(cache, ws)    # drop positions, balances, ... on fills and orders
+    cache.stats()
+
+Cached responses are shared between callers and must not be modified. A cache holds the data of
+one account, so use one per client.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+# Endpoints whose cached responses a fill or an order update makes stale
+FILL_ENDPOINTS = ('fills', 'positions', 'wallet/balances', 'account')
+ORDER_ENDPOINTS = ('orders', 'orders/{}', 'orders/by_client_id/{}', 'orders/history',
+                   'conditional_orders', 'wallet/balances', 'account')
+
+
+class _Entry:
+    __slots__ = ('value', 'expires_at', 'endpoint')
+
+    def __init__(self, value: Any, expires_at: float, endpoint: str) -> None:
+        self.value = value
+        self.expires_at = expires_at
+        self.endpoint = endpoint
+
+
+class ResponseCache:
+    DEFAULT_TTLS: Dict[str, float] = {
+        # endpoint: seconds
+        'markets': 10.,
+        'markets/{}': 10.,
+        'futures': 10.,
+        'futures/{}': 10.,
+        'account': 2.,
+        'positions': 2.,
+        'wallet/balances': 2.,
+        'wallet/coins': 3600.,
+        'wallet/deposit_address/{}': 3600.,
+    }
+
+    def __init__(self, ttls: Optional[Dict[str, Optional[float]]] = None,
+                 max_entries: int = 1024) -> None:
+        """ttls override DEFAULT_TTLS per endpoint; a TTL of None or 0 disables caching of that
+        endpoint."""
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Key, _Entry]' = OrderedDict()
+        self._by_endpoint: Dict[str, Set[Key]] = {}
+        # Bumped on invalidation so that responses to requests sent before it are not stored
+        self._generations: Dict[str, int] = {}
+        self._generation = 0
+        self._in_flight: Dict[Key, Future] = {}
+        self._in_flight_async: Dict[Key, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(path: str, params: Optional[Dict[str, Any]]) -> Key:
+        if not params:
+            return path, ()
+        # None values are left out of the query string, so they do not change the response
+        return path, tuple(sorted((key, repr(value)) for key, value in params.items()
+                                  if value is not None))
+
+    def _lookup(self, key: Key) -> Tuple[bool, Any]:
+        """With the lock held: (True, value) on a fresh hit, else (False, None)."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry.value
+            self._remove(key)
+        return False, None
+
+    def _current_generation(self, endpoint: str) -> Hashable:
+        return self._generation, self._generations.get(endpoint, 0)
+
+    def _store(self, endpoint: str, key: Key, value: Any, ttl: float,
+               generation: Hashable) -> None:
+        """With the lock held."""
+        if generation != self._current_generation(endpoint):
+            return
+        self._entries[key] = _Entry(value, time.monotonic() + ttl, endpoint)
+        self._entries.move_to_end(key)
+        self._by_endpoint.setdefault(endpoint, set()).add(key)
+        while len(self._entries) > self._max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: Key) -> None:
+        entry = self._entries.pop(key)
+        keys = self._by_endpoint.get(entry.endpoint)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_endpoint[entry.endpoint]
+
+    def get(self, endpoint: str, path: str, params: Optional[Dict[str, Any]],
+            fetch: Callable[[], Any]) -> Any:
+        """The cached response for path and params, or else fetch()'s, shared with concurrent
+        callers and cached for the endpoint's TTL."""
+        ttl = self.ttls.get(endpoint)
+        if not ttl:
+            return fetch()
+        key = self._key(path, params)
+        generation = None
+        with self._lock:
+            hit, value = self._lookup(key)
+            if hit:
+                return value
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                future = self._in_flight[key] = Future()
+                generation = self._current_generation(endpoint)
+        if generation is None:
+            return future.result()
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+            self._store(endpoint, key, value, ttl, generation)
+        future.set_result(value)
+        return value
+
+    async def get_async(self, endpoint: str, path: str, params: Optional[Dict[str, Any]],
+                        fetch: Callable[[], Awaitable[Any]]) -> Any:
+        ttl = self.ttls.get(endpoint)
+        if not ttl:
+            return await fetch()
+        key = self._key(path, params)
+        generation = None
+        with self._lock:
+            hit, value = self._lookup(key)
+            if hit:
+                return value
+            future = self._in_flight_async.get(key)
+            if future is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                future = self._in_flight_async[key] = asyncio.get_running_loop().create_future()
+                generation = self._current_generation(endpoint)
+        if generation is None:
+            # Shielded so that a cancelled waiter does not cancel the shared request
+            return await asyncio.shield(future)
+        try:
+            value = await fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight_async[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Retrieved here so that asyncio does not log it when nobody else waits
+                future.exception()
+            raise
+        with self._lock:
+            del self._in_flight_async[key]
+            self._store(endpoint, key, value, ttl, generation)
+        future.set_result(value)
+        return value
+
+    def invalidate(self, *endpoints: str) -> None:
+        """Drop the cached responses of the given endpoints, or of all with none given."""
+        with self._lock:
+            self.invalidations += 1
+            if not endpoints:
+                self._generation += 1
+                self._entries.clear()
+                self._by_endpoint.clear()
+                return
+            for endpoint in endpoints:
+                self._generations[endpoint] = self._generations.get(endpoint, 0) + 1
+                for key in self._by_endpoint.pop(endpoint, ()):
+                    del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            requests = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_ratio': (self.hits + self.coalesced) / requests if requests else 0.,
+            }
+
+
+def invalidate_from_websocket(cache: ResponseCache, ws_client,
+                              fill_endpoints=FILL_ENDPOINTS,
+                              order_endpoints=ORDER_ENDPOINTS) -> List:
+    """Subscribe to the fills and orders channels of an FtxWebsocketClient (of the same account)
+    and invalidate the affected endpoints on every event. Returns the subscriptions; close them
+    to stop."""
+    return [
+        ws_client.subscribe('fills', callback=lambda event: cache.invalidate(*fill_endpoints)),
+        ws_client.subscribe('orders', callback=lambda event: cache.invalidate(*order_endpoints)),
+    ]
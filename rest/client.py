@@ -1,24 +1,87 @@
+import re
+import threading
 import time
 import urllib.parse
-from typing import Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from json import dumps as json_dumps
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 
-from requests import Request, Session, Response
+from requests import PreparedRequest, Request, Session, Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import requote_uri
 import hmac
-from ciso8601 import parse_datetime
 
+from common.markets import MarketRegistry
+from common.metrics import MetricsRegistry
+from rest.batch import BatchResult, run_batch
+from rest.cache import ResponseCache
+from rest.errors import FtxApiError
+from rest.scheduler import RequestScheduler
+from rest.trade_downloader import download_trades, fetch_trades, iter_trades
+
+
+_PATH_WORD = re.compile(r'[a-z_]+')
+
+
+def _query_pairs(params: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    # As requests encodes params: iterables expand to repeated keys and None values are dropped
+    for key, values in params.items():
+        if isinstance(values, (str, bytes)) or not hasattr(values, '__iter__'):
+            values = (values,)
+        for value in values:
+            if value is not None:
+                yield key, value
 
 
 class FtxClient:
     _ENDPOINT = 'https://ftx.com/api/'
 
-    def __init__(self, api_key=None, api_secret=None, subaccount_name=None) -> None:
-        self._session = Session()
+    def __init__(self, api_key=None, api_secret=None, subaccount_name=None,
+                 scheduler: Optional[RequestScheduler] = None, batch_workers: int = 10,
+                 metrics: Optional[MetricsRegistry] = None, session: Optional[Session] = None,
+                 batch_executor: Optional[ThreadPoolExecutor] = None,
+                 cache: Optional[ResponseCache] = None,
+                 markets: Optional[MarketRegistry] = None) -> None:
+        """session and batch_executor, if given, are shared with other clients (see
+        rest.subaccounts.SubaccountManager) and not owned by this one. With a cache, GETs of the
+        endpoints it has TTLs for are served from it (see rest.cache). With markets,
+        place_order rounds prices passively and sizes down to the market's increments."""
+        self._session = self._create_session(batch_workers) if session is None else session
         self._api_key = api_key
         self._api_secret = api_secret
         self._subaccount_name = subaccount_name
+        self._scheduler = scheduler
+        self._batch_workers = batch_workers
+        self._batch_executor = batch_executor
+        self._batch_executor_lock = threading.Lock()
+        self._metrics = metrics
+        self._cache = cache
+        self._markets = markets
+        # Signing state shared by every request: the keyed HMAC is copied per request instead of
+        # re-deriving the key, and the static auth headers are built once
+        self._hmac = hmac.new(api_secret.encode(), digestmod='sha256') if api_secret else None
+        self._auth_headers = {'FTX-KEY': api_key}
+        if subaccount_name:
+            self._auth_headers['FTX-SUBACCOUNT'] = urllib.parse.quote(subaccount_name)
+        # (endpoint, prepared endpoint URL, its path), refreshed if _ENDPOINT is changed
+        self._endpoint_parts: Optional[Tuple[str, str, str]] = None
+
+    @staticmethod
+    def _create_session(batch_workers: int) -> Session:
+        session = Session()
+        # Keep enough pooled connections alive for every batch worker
+        adapter = HTTPAdapter(pool_maxsize=batch_workers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
 
     def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
-        return self._request('GET', path, params=params)
+        if self._cache is None:
+            return self._request('GET', path, params=params)
+        return self._cache.get(self._endpoint_name(path), path, params,
+                               lambda: self._request('GET', path, params=params))
 
     def _post(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
         return self._request('POST', path, json=params)
@@ -27,23 +90,77 @@ class FtxClient:
         return self._request('DELETE', path, json=params)
 
     def _request(self, method: str, path: str, **kwargs) -> Any:
-        request = Request(method, self._ENDPOINT + path, **kwargs)
-        self._sign_request(request)
-        response = self._session.send(request.prepare())
+        if self._metrics is None:
+            return self._schedule_request(method, path, **kwargs)
+        endpoint = self._endpoint_name(path)
+        start = time.perf_counter()
+        try:
+            return self._schedule_request(method, path, **kwargs)
+        except Exception:
+            self._metrics.counter('rest_errors_total', method=method, endpoint=endpoint).inc()
+            raise
+        finally:
+            self._metrics.histogram('rest_request_seconds', method=method,
+                                    endpoint=endpoint).record(time.perf_counter() - start)
+
+    def _schedule_request(self, method: str, path: str, **kwargs) -> Any:
+        if self._scheduler is None:
+            return self._send_request(method, path, **kwargs)
+        return self._scheduler.call(method, path,
+                                    lambda: self._send_request(method, path, **kwargs))
+
+    @staticmethod
+    def _endpoint_name(path: str) -> str:
+        """Path with ids, markets and coins replaced by {}, to label metrics per endpoint."""
+        segments = path.split('/')
+        return '/'.join(
+            '{}' if not _PATH_WORD.fullmatch(segment) or segments[i - 1:i] == ['by_client_id']
+            else segment for i, segment in enumerate(segments))
+
+    def _send_request(self, method: str, path: str, **kwargs) -> Any:
+        response = self._session.send(self._prepare_request(method, path, **kwargs))
         return self._process_response(response)
 
-    def _sign_request(self, request: Request) -> None:
-        ts = int(time.time() * 1000)
-        prepared = request.prepare()
-        signature_payload = f'{ts}{prepared.method}{prepared.path_url}'.encode()
-        if prepared.body:
-            signature_payload += prepared.body
-        signature = hmac.new(self._api_secret.encode(), signature_payload, 'sha256').hexdigest()
-        request.headers['FTX-KEY'] = self._api_key
-        request.headers['FTX-SIGN'] = signature
-        request.headers['FTX-TS'] = str(ts)
-        if self._subaccount_name:
-            request.headers['FTX-SUBACCOUNT'] = urllib.parse.quote(self._subaccount_name)
+    def _prepare_request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                         json: Any = None) -> PreparedRequest:
+        """Build the signed request, encoding the query and body once. Produces the same URL,
+        body and headers as Request(method, url, params=params, json=json).prepare() plus the
+        FTX auth headers."""
+        endpoint = self._ENDPOINT
+        if self._endpoint_parts is None or self._endpoint_parts[0] is not endpoint:
+            prepared_endpoint = Request('GET', endpoint).prepare()
+            self._endpoint_parts = (endpoint, prepared_endpoint.url, prepared_endpoint.path_url)
+        _, endpoint_url, endpoint_path = self._endpoint_parts
+
+        path = requote_uri(path)
+        if params:
+            query = urllib.parse.urlencode(list(_query_pairs(params)), doseq=True)
+            if query:
+                path = f'{path}?{query}'
+        headers = {}
+        body = None
+        if json is not None:
+            body = json_dumps(json, allow_nan=False).encode()
+            headers['Content-Type'] = 'application/json'
+            headers['Content-Length'] = str(len(body))
+        elif method not in ('GET', 'HEAD'):
+            headers['Content-Length'] = '0'
+        if self._hmac is not None:
+            ts = str(int(time.time() * 1000))
+            signature = self._hmac.copy()
+            signature.update(f'{ts}{method}{endpoint_path}{path}'.encode())
+            if body:
+                signature.update(body)
+            headers.update(self._auth_headers)
+            headers['FTX-SIGN'] = signature.hexdigest()
+            headers['FTX-TS'] = ts
+
+        prepared = PreparedRequest()
+        prepared.method = method
+        prepared.url = endpoint_url + path
+        prepared.headers = CaseInsensitiveDict(headers)
+        prepared.body = body
+        return prepared
 
     def _process_response(self, response: Response) -> Any:
         try:
@@ -53,9 +170,17 @@ class FtxClient:
             raise
         else:
             if not data['success']:
-                raise Exception(data['error'])
+                raise FtxApiError(data['error'], response.status_code)
             return data['result']
 
+    def _run_batch(self, calls: List) -> BatchResult:
+        if self._batch_executor is None:
+            with self._batch_executor_lock:
+                if self._batch_executor is None:
+                    self._batch_executor = ThreadPoolExecutor(self._batch_workers,
+                                                              thread_name_prefix='ftx-batch')
+        return run_batch(self._batch_executor, calls)
+
     def list_futures(self) -> List[dict]:
         return self._get('futures')
 
@@ -96,12 +221,17 @@ class FtxClient:
             ** ({'clientId': client_order_id} if client_order_id is not None else {}),
         })
 
+    def get_order_status(self, order_id: str) -> dict:
+        return self._get(f'orders/{order_id}')
+
     def get_conditional_orders(self, market: str = None) -> List[dict]:
         return self._get(f'conditional_orders', {'market': market})
 
     def place_order(self, market: str, side: str, price: float, size: float, type: str = 'limit',
                     reduce_only: bool = False, ioc: bool = False, post_only: bool = False,
                     client_id: str = None) -> dict:
+        if self._markets is not None:
+            price, size = self._markets.round_order(market, price, size, side)
         return self._post('orders', {'market': market,
                                      'side': side,
                                      'price': price,
@@ -145,8 +275,24 @@ class FtxClient:
                                         'limitOrdersOnly': limit_orders,
                                         })
 
-    def get_fills(self) -> List[dict]:
-        return self._get(f'fills')
+    def place_orders(self, orders: List[Dict[str, Any]]) -> BatchResult:
+        """Place several orders concurrently; each entry holds the keyword arguments of
+        place_order. Results and errors are returned in input order."""
+        return self._run_batch([partial(self.place_order, **order) for order in orders])
+
+    def modify_orders(self, modifications: List[Dict[str, Any]]) -> BatchResult:
+        """Modify several orders concurrently; each entry holds the keyword arguments of
+        modify_order."""
+        return self._run_batch([partial(self.modify_order, **modification)
+                                for modification in modifications])
+
+    def cancel_orders_by_ids(self, order_ids: List[str]) -> BatchResult:
+        return self._run_batch([partial(self.cancel_order, order_id) for order_id in order_ids])
+
+    def get_fills(self, market: str = None, start_time: float = None,
+                  end_time: float = None) -> List[dict]:
+        return self._get(f'fills', {'market': market, 'start_time': start_time,
+                                    'end_time': end_time})
 
     def get_balances(self) -> List[dict]:
         return self._get('wallet/balances')
@@ -161,21 +307,20 @@ class FtxClient:
         return next(filter(lambda x: x['future'] == name, self.get_positions(show_avg_price)), None)
 
     def get_all_trades(self, market: str, start_time: float = None, end_time: float = None) -> List:
-        ids = set()
-        limit = 100
-        results = []
-        while True:
-            response = self._get(f'markets/{market}/trades', {
-                'end_time': end_time,
-                'start_time': start_time,
-            })
-            deduped_trades = [r for r in response if r['id'] not in ids]
-            results.extend(deduped_trades)
-            ids |= {r['id'] for r in deduped_trades}
-            print(f'Adding {len(response)} trades with end time {end_time}')
-            if len(response) == 0:
-                break
-            end_time = min(parse_datetime(t['time']) for t in response).timestamp()
-            if len(response) < limit:
-                break
-        return results
+        return fetch_trades(self, market, start_time, end_time)
+
+    def iter_all_trades(self, market: str, start_time: float, end_time: float = None,
+                        window: float = 3600., max_workers: int = 8) -> Iterator[dict]:
+        """Stream trades oldest first, fetching `window`-second slices of the range in
+        parallel."""
+        return iter_trades(self, market, start_time,
+                           time.time() if end_time is None else end_time, window, max_workers)
+
+    def download_all_trades(self, market: str, directory: str, start_time: float,
+                            end_time: float = None, window: float = 3600.,
+                            max_workers: int = 8) -> int:
+        """Write trades to column files in `directory`, resuming an interrupted download of the
+        same range (end_time=None resumes up to the time the download started). See
+        rest.trade_downloader.download_trades."""
+        return download_trades(self, market, start_time, end_time, directory, window,
+                               max_workers)
@@ -0,0 +1,10 @@
+from typing import Optional
+
+
+class FtxApiError(Exception):
+    """Error returned by the API, either as `success: false` or as a non-JSON HTTP error."""
+
+    def __init__(self, error: str, status_code: Optional[int] = None) -> None:
+        super().__init__(error)
+        self.error = error
+        self.status_code = status_code
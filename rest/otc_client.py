@@ -4,14 +4,18 @@ from requests import Request, Session, Response
 from typing import Dict
 import hmac
 
+from rest.errors import FtxApiError
+from rest.scheduler import RequestScheduler
+
 
 class FtxOtcClient:
     _ENDPOINT = 'https://otc.ftx.com/api/'
 
-    def __init__(self) -> None:
+    def __init__(self, scheduler: Optional[RequestScheduler] = None) -> None:
         self._session = Session()
         self._api_key = '' # TODO: Place your API key here
         self._api_secret = '' # TODO: Place your API secret here
+        self._scheduler = scheduler
 
     def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
         return self._request('GET', path, params=params)
@@ -37,6 +41,12 @@ class FtxOtcClient:
         })
 
     def _request(self, method: str, path: str, **kwargs) -> Any:
+        if self._scheduler is None:
+            return self._send_request(method, path, **kwargs)
+        return self._scheduler.call(method, path,
+                                    lambda: self._send_request(method, path, **kwargs))
+
+    def _send_request(self, method: str, path: str, **kwargs) -> Any:
         request = Request(method, self._ENDPOINT + path, **kwargs)
         self._sign_request(request, path)
         response = self._session.send(request.prepare())
@@ -61,7 +71,7 @@ class FtxOtcClient:
             raise
         else:
             if not data['success']:
-                raise Exception(data['error'])
+                raise FtxApiError(data['error'], response.status_code)
             return data['result']
 
     def get_balances(self):
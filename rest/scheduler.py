@@ -0,0 +1,161 @@
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+PRIORITY_CANCEL = 0
+PRIORITY_ORDER = 1
+PRIORITY_QUERY = 2
+
+_ORDER_PATHS = ('orders', 'conditional_orders', 'otc')
+_MARKET_DATA_PATHS = ('markets', 'futures')
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def try_take(self, now: float) -> float:
+        """Take a token if one is available. Returns 0 on success, otherwise the seconds until
+        the next token will be available."""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.
+        return (1 - self._tokens) / self.rate
+
+
+class RequestScheduler:
+    """Client-side rate limiting for the REST clients.
+
+    Requests are classified into budgets (token buckets) by endpoint and queued by priority within
+    each budget, so cancels go ahead of new orders and new orders ahead of queries once a budget is
+    exhausted. Failed requests are retried with exponential backoff when the error is retryable:
+    rate limit rejections always, server and transport errors only for GETs since a POST or DELETE
+    may already have been processed.
+
+    One scheduler can be shared by several FtxClient / FtxOtcClient instances (and threads) to
+    enforce a common budget. Override `classify` to change how requests map to budgets.
+    """
+
+    DEFAULT_BUDGETS: Dict[str, Tuple[float, float]] = {
+        # name: (requests per second, burst)
+        'orders': (25., 25.),
+        'market_data': (25., 50.),
+        'default': (10., 20.),
+    }
+
+    def __init__(self, budgets: Optional[Dict[str, Tuple[float, float]]] = None,
+                 max_retries: int = 3, backoff_base: float = 0.1,
+                 backoff_max: float = 2.) -> None:
+        budgets = {**self.DEFAULT_BUDGETS, **(budgets or {})}
+        self._buckets = {name: TokenBucket(rate, burst) for name, (rate, burst) in budgets.items()}
+        self._waiters: Dict[str, list] = {name: [] for name in budgets}
+        self._cond = threading.Condition()
+        self._ticket_ids = itertools.count()
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+
+    def classify(self, method: str, path: str) -> Tuple[str, int]:
+        root = path.split('/', 1)[0]
+        if method != 'GET' and root in _ORDER_PATHS:
+            return 'orders', PRIORITY_CANCEL if method == 'DELETE' else PRIORITY_ORDER
+        if root in _MARKET_DATA_PATHS:
+            return 'market_data', PRIORITY_QUERY
+        return 'default', PRIORITY_QUERY
+
+    def _enqueue(self, budget: str, priority: int) -> Tuple[int, int]:
+        ticket = (priority, next(self._ticket_ids))
+        heapq.heappush(self._waiters[budget], ticket)
+        return ticket
+
+    def _dequeue(self, budget: str, ticket: Tuple[int, int]) -> None:
+        waiters = self._waiters[budget]
+        if waiters[0] == ticket:
+            heapq.heappop(waiters)
+        else:
+            waiters.remove(ticket)
+            heapq.heapify(waiters)
+        self._cond.notify_all()
+
+    def _try_acquire(self, budget: str, ticket: Tuple[int, int]) -> Optional[float]:
+        if self._waiters[budget][0] != ticket:
+            return None
+        return self._buckets[budget].try_take(time.monotonic())
+
+    def acquire(self, budget: str, priority: int = PRIORITY_QUERY) -> None:
+        with self._cond:
+            ticket = self._enqueue(budget, priority)
+            try:
+                while True:
+                    wait = self._try_acquire(budget, ticket)
+                    if wait == 0:
+                        return
+                    self._cond.wait(wait)
+            finally:
+                self._dequeue(budget, ticket)
+
+    async def acquire_async(self, budget: str, priority: int = PRIORITY_QUERY) -> None:
+        with self._cond:
+            ticket = self._enqueue(budget, priority)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_acquire(budget, ticket)
+                if wait == 0:
+                    return
+                await asyncio.sleep(wait if wait is not None
+                                    else 1 / self._buckets[budget].rate)
+        finally:
+            with self._cond:
+                self._dequeue(budget, ticket)
+
+    @staticmethod
+    def _status_code(exc: Exception) -> Optional[int]:
+        status = getattr(exc, 'status_code', None) or getattr(exc, 'status', None)
+        if status is None and getattr(exc, 'response', None) is not None:
+            status = getattr(exc.response, 'status_code', None)
+        return status
+
+    def is_retryable(self, exc: Exception, method: str) -> bool:
+        status = self._status_code(exc)
+        if status == 429:
+            return True
+        if method != 'GET':
+            return False
+        return (status is not None and status >= 500) or \
+            (status is None and isinstance(exc, OSError))
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self._backoff_max, self._backoff_base * 2 ** attempt))
+
+    def call(self, method: str, path: str, send: Callable[[], Any]) -> Any:
+        budget, priority = self.classify(method, path)
+        for attempt in itertools.count():
+            self.acquire(budget, priority)
+            try:
+                return send()
+            except Exception as e:
+                if attempt >= self._max_retries or not self.is_retryable(e, method):
+                    raise
+            time.sleep(self._backoff(attempt))
+
+    async def call_async(self, method: str, path: str,
+                         send: Callable[[], Awaitable[Any]]) -> Any:
+        budget, priority = self.classify(method, path)
+        for attempt in itertools.count():
+            await self.acquire_async(budget, priority)
+            try:
+                return await send()
+            except Exception as e:
+                if attempt >= self._max_retries or not self.is_retryable(e, method):
+                    raise
+            await asyncio.sleep(self._backoff(attempt))
@@ -0,0 +1,138 @@
+"""Clients for many subaccounts over one connection pool.
+
+SubaccountManager hands out an FtxClient per subaccount (None is the main account). The clients
+share one requests Session, so a keep-alive connection to the API is reused whichever
+subaccount a request is for, and one thread pool for their batch requests. The manager's
+fan-out queries run the subaccounts concurrently on another pool. Each request is still signed
+with its own subaccount's key and FTX-SUBACCOUNT header.
+
+    manager = SubaccountManager(key, secret, ['arb', 'mm-1', 'mm-2'])
+    manager['arb'].place_order('BTC-PERP', 'buy', 40000, 0.1)
+    balances = manager.get_balances()       # {'arb': [...], 'mm-1': [...], 'mm-2': [...]}
+    totals = manager.get_total_balances()   # {'USD': {'total': ..., 'free': ...}, ...}
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from common.markets import MarketRegistry
+from common.metrics import MetricsRegistry
+from rest.batch import BatchResult, run_batch
+from rest.client import FtxClient
+from rest.scheduler import RequestScheduler
+
+# Balance fields summed by get_total_balances
+_BALANCE_FIELDS = ('total', 'free', 'availableWithoutBorrow', 'usdValue', 'spotBorrow')
+
+
+class SubaccountManager:
+    def __init__(self, api_key: Optional[str] = None, api_secret: Optional[str] = None,
+                 subaccounts: Iterable[Optional[str]] = (),
+                 scheduler: Optional[RequestScheduler] = None, max_connections: int = 20,
+                 workers: int = 10, batch_workers: int = 10,
+                 metrics: Optional[MetricsRegistry] = None,
+                 markets: Optional[MarketRegistry] = None) -> None:
+        """api_key and api_secret sign requests for subaccounts added without their own keys.
+        A scheduler, if given, rate limits the requests of all subaccounts together; markets,
+        if given, rounds the orders of all of them."""
+        self._api_key = api_key
+        self._api_secret = api_secret
+        self._scheduler = scheduler
+        self._metrics = metrics
+        self._markets = markets
+        self._session = Session()
+        adapter = HTTPAdapter(pool_maxsize=max_connections)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='ftx-subaccounts')
+        # Separate from the fan-out pool so that fanned-out calls can run batches
+        self._batch_executor = ThreadPoolExecutor(batch_workers, thread_name_prefix='ftx-batch')
+        self._clients: Dict[Optional[str], FtxClient] = {}
+        for name in subaccounts:
+            self.add(name)
+
+    def add(self, subaccount_name: Optional[str], api_key: Optional[str] = None,
+            api_secret: Optional[str] = None) -> FtxClient:
+        """Add a subaccount, signed with its own key if given (e.g. a subaccount-scoped key)."""
+        client = FtxClient(api_key or self._api_key, api_secret or self._api_secret,
+                           subaccount_name, self._scheduler, metrics=self._metrics,
+                           session=self._session, batch_executor=self._batch_executor,
+                           markets=self._markets)
+        self._clients[subaccount_name] = client
+        return client
+
+    def remove(self, subaccount_name: Optional[str]) -> None:
+        del self._clients[subaccount_name]
+
+    @property
+    def subaccounts(self) -> List[Optional[str]]:
+        return list(self._clients)
+
+    def __getitem__(self, subaccount_name: Optional[str]) -> FtxClient:
+        return self._clients[subaccount_name]
+
+    def __contains__(self, subaccount_name: Optional[str]) -> bool:
+        return subaccount_name in self._clients
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        self._batch_executor.shutdown()
+        self._session.close()
+
+    def __enter__(self) -> 'SubaccountManager':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def fan_out(self, call: Callable[[FtxClient], Any],
+                subaccounts: Optional[Sequence[Optional[str]]] = None
+                ) -> Tuple[List[Optional[str]], BatchResult]:
+        """Run call concurrently with the client of every subaccount (or of those given).
+        Returns the subaccount names and the BatchResult of the calls, in the same order."""
+        names = list(self._clients if subaccounts is None else subaccounts)
+        clients = [self._clients[name] for name in names]
+        return names, run_batch(self._executor, [lambda client=client: call(client)
+                                                  for client in clients])
+
+    def _query(self, call: Callable[[FtxClient], Any],
+               subaccounts: Optional[Sequence[Optional[str]]]) -> Dict[Optional[str], Any]:
+        names, batch = self.fan_out(call, subaccounts)
+        for error in batch.errors:
+            if error is not None:
+                raise error
+        return dict(zip(names, batch.results))
+
+    def get_balances(self, subaccounts: Optional[Sequence[Optional[str]]] = None
+                     ) -> Dict[Optional[str], List[dict]]:
+        return self._query(FtxClient.get_balances, subaccounts)
+
+    def get_positions(self, show_avg_price: bool = False,
+                      subaccounts: Optional[Sequence[Optional[str]]] = None
+                      ) -> Dict[Optional[str], List[dict]]:
+        return self._query(lambda client: client.get_positions(show_avg_price), subaccounts)
+
+    def get_open_orders(self, market: Optional[str] = None,
+                        subaccounts: Optional[Sequence[Optional[str]]] = None
+                        ) -> Dict[Optional[str], List[dict]]:
+        return self._query(lambda client: client.get_open_orders(market), subaccounts)
+
+    def get_account_info(self, subaccounts: Optional[Sequence[Optional[str]]] = None
+                         ) -> Dict[Optional[str], dict]:
+        return self._query(FtxClient.get_account_info, subaccounts)
+
+    def get_total_balances(self, subaccounts: Optional[Sequence[Optional[str]]] = None
+                           ) -> Dict[str, Dict[str, float]]:
+        """Balances of every coin summed over the subaccounts."""
+        totals: Dict[str, Dict[str, float]] = {}
+        for balances in self.get_balances(subaccounts).values():
+            for balance in balances:
+                total = totals.setdefault(balance['coin'], dict.fromkeys(_BALANCE_FIELDS, 0.))
+                for field in _BALANCE_FIELDS:
+                    total[field] += balance.get(field) or 0.
+        return totals
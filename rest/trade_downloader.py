@@ -0,0 +1,250 @@
+"""Historical trade download: windowed, concurrent and resumable.
+
+The requested time range is split into fixed windows that are paged concurrently, then yielded
+in chronological order. Only trades sharing a timestamp with a page or window boundary are
+deduplicated, so memory stays bounded by the windows in flight rather than the whole history.
+`download_trades` writes the stream to one binary file per column and checkpoints after every
+window so an interrupted download can be resumed. TradePager holds the paging logic itself; it
+and the checkpoint helpers are shared with the asyncio client.
+"""
+import json
+import os
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from itertools import islice
+from typing import IO, Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from ciso8601 import parse_datetime
+
+PAGE_SIZE = 100
+
+COLUMNS = {
+    'id': 'q',
+    'time': 'd',
+    'price': 'd',
+    'size': 'd',
+    'side': 'b',  # 1 for buys, -1 for sells
+    'liquidation': 'b',
+}
+
+_CHECKPOINT_FILE = 'checkpoint.json'
+
+
+class TradePager:
+    """Pages backwards through the trades of a market in [start_time, end_time], without doing
+    I/O itself so the sync and async clients share it:
+
+        pager = TradePager(market, start_time, end_time)
+        while not pager.done:
+            pager.add_page(client._get(pager.path, pager.params))
+
+    Trades accumulate newest first in `trades`, with their parsed timestamps in `times`.
+    """
+
+    def __init__(self, market: str, start_time: Optional[float] = None,
+                 end_time: Optional[float] = None) -> None:
+        self.path = f'markets/{market}/trades'
+        self.trades: List[dict] = []
+        self.times: List[float] = []
+        self.done = False
+        self._market = market
+        self._start_time = start_time
+        self._end_time = end_time
+        # Ids already seen at end_time, which the next page (ending there inclusively) repeats
+        self._boundary_ids: Set[int] = set()
+
+    @property
+    def params(self) -> Dict[str, Optional[float]]:
+        return {'end_time': self._end_time, 'start_time': self._start_time}
+
+    def add_page(self, response: List[dict]) -> None:
+        page = [(parse_datetime(trade['time']).timestamp(), trade) for trade in response
+                if trade['id'] not in self._boundary_ids]
+        for timestamp, trade in page:
+            self.times.append(timestamp)
+            self.trades.append(trade)
+        if len(response) < PAGE_SIZE:
+            self.done = True
+            return
+        if not page:
+            # A full page of trades at end_time that were all seen: the API cannot page past
+            # them, and stopping here would silently drop the rest
+            raise RuntimeError(f'More than {PAGE_SIZE} {self._market} trades at '
+                               f'{self._end_time}; cannot page past them')
+        end_time = min(timestamp for timestamp, _ in page)
+        boundary_ids = {trade['id'] for timestamp, trade in page if timestamp == end_time}
+        if end_time == self._end_time:
+            self._boundary_ids |= boundary_ids
+        else:
+            self._boundary_ids = boundary_ids
+        self._end_time = end_time
+
+
+def _fetch_pager(client: Any, market: str, start_time: Optional[float],
+                 end_time: Optional[float]) -> TradePager:
+    pager = TradePager(market, start_time, end_time)
+    while not pager.done:
+        pager.add_page(client._get(pager.path, pager.params))
+    return pager
+
+
+def fetch_trades(client: Any, market: str, start_time: Optional[float] = None,
+                 end_time: Optional[float] = None) -> List[dict]:
+    """Page backwards through [start_time, end_time]. Returns trades newest first, as the API
+    returns them."""
+    return _fetch_pager(client, market, start_time, end_time).trades
+
+
+def trade_windows(start_time: float, end_time: float,
+                  window: float) -> List[Tuple[float, float]]:
+    windows = []
+    window_start = start_time
+    while window_start < end_time:
+        windows.append((window_start, min(window_start + window, end_time)))
+        window_start += window
+    return windows
+
+
+def next_window(pager: TradePager, boundary_ids: Set[int]
+                ) -> Tuple[List[Tuple[float, dict]], Set[int]]:
+    """The (timestamp, trade) pairs of a fetched window oldest first, without those already
+    yielded at the previous window's last timestamp, and the ids at this window's last one."""
+    timed = [(timestamp, trade) for timestamp, trade in zip(reversed(pager.times),
+                                                             reversed(pager.trades))
+             if trade['id'] not in boundary_ids]
+    if timed:
+        last_timestamp = timed[-1][0]
+        boundary_ids = {trade['id'] for timestamp, trade in timed if timestamp == last_timestamp}
+    return timed, boundary_ids
+
+
+def iter_trade_windows(client: Any, market: str, start_time: float, end_time: float,
+                       window: float = 3600., max_workers: int = 8,
+                       boundary_ids: Optional[Set[int]] = None
+                       ) -> Iterator[Tuple[float, List[Tuple[float, dict]], Set[int]]]:
+    """Yield (window_end, trades, boundary_ids) per window in chronological order, where trades
+    are (timestamp, trade) pairs oldest first and boundary_ids are the ids at the window's last
+    timestamp."""
+    boundary_ids = set(boundary_ids or ())
+    with ThreadPoolExecutor(max_workers, thread_name_prefix='ftx-trades') as executor:
+        pending: Deque[Tuple[float, Future]] = deque()
+        remaining = iter(trade_windows(start_time, end_time, window))
+
+        def submit_next(count: int) -> None:
+            for window_start, window_end in islice(remaining, count):
+                pending.append((window_end, executor.submit(_fetch_pager, client, market,
+                                                            window_start, window_end)))
+
+        # Keep a bounded number of windows in flight ahead of the consumer
+        submit_next(max_workers * 2)
+        while pending:
+            window_end, future = pending.popleft()
+            submit_next(1)
+            timed, boundary_ids = next_window(future.result(), boundary_ids)
+            yield window_end, timed, boundary_ids
+
+
+def iter_trades(client: Any, market: str, start_time: float, end_time: float,
+                window: float = 3600., max_workers: int = 8) -> Iterator[dict]:
+    for _, timed, _ in iter_trade_windows(client, market, start_time, end_time, window,
+                                          max_workers):
+        for _, trade in timed:
+            yield trade
+
+
+def _load_checkpoint(directory: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, _CHECKPOINT_FILE)) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    if checkpoint['params'] != params:
+        raise ValueError(f'{directory} holds a download with different parameters: '
+                         f'{checkpoint["params"]}')
+    return checkpoint
+
+
+def _save_checkpoint(directory: str, checkpoint: Dict[str, Any]) -> None:
+    path = os.path.join(directory, _CHECKPOINT_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(path + '.tmp', path)
+
+
+def start_download(directory: str, market: str, start_time: float, end_time: Optional[float],
+                   window: float) -> Dict[str, Any]:
+    """The checkpoint to continue the download in `directory` from, a new one if there is
+    none. end_time=None means now for a new download and the saved end_time when resuming."""
+    os.makedirs(directory, exist_ok=True)
+    params = {'market': market, 'start_time': start_time, 'window': window}
+    checkpoint = _load_checkpoint(directory, params)
+    if checkpoint is None:
+        checkpoint = {
+            'params': params, 'end_time': time.time() if end_time is None else end_time,
+            'next_start_time': start_time, 'rows': 0, 'boundary_ids': [],
+        }
+    elif end_time is not None and end_time != checkpoint['end_time']:
+        raise ValueError(f'{directory} holds a download up to {checkpoint["end_time"]}, '
+                         f'not {end_time}')
+    return checkpoint
+
+
+def open_columns(directory: str, checkpoint: Dict[str, Any], stack: ExitStack
+                 ) -> Dict[str, IO]:
+    """The column files of a download, opened for appending (and closed by stack)."""
+    files = {}
+    for column, typecode in COLUMNS.items():
+        f = files[column] = stack.enter_context(
+            open(os.path.join(directory, f'{column}.bin'), 'ab'))
+        # Drop anything written after the last checkpoint
+        f.truncate(checkpoint['rows'] * array(typecode).itemsize)
+    return files
+
+
+def write_window(directory: str, files: Dict[str, IO], checkpoint: Dict[str, Any],
+                 window_end: float, timed: List[Tuple[float, dict]],
+                 boundary_ids: Set[int]) -> None:
+    """Append a window's trades to the column files, then checkpoint past it."""
+    columns = {column: array(typecode) for column, typecode in COLUMNS.items()}
+    for timestamp, trade in timed:
+        columns['id'].append(trade['id'])
+        columns['time'].append(timestamp)
+        columns['price'].append(trade['price'])
+        columns['size'].append(trade['size'])
+        columns['side'].append(1 if trade['side'] == 'buy' else -1)
+        columns['liquidation'].append(bool(trade.get('liquidation')))
+    for column, values in columns.items():
+        values.tofile(files[column])
+        files[column].flush()
+    checkpoint.update(next_start_time=window_end, rows=checkpoint['rows'] + len(timed),
+                      boundary_ids=sorted(boundary_ids))
+    _save_checkpoint(directory, checkpoint)
+
+
+def download_trades(client: Any, market: str, start_time: float, end_time: Optional[float],
+                    directory: str, window: float = 3600., max_workers: int = 8) -> int:
+    """Download trades into `directory` as one native-endian binary file per column (see
+    COLUMNS), resuming from the last completed window if the directory holds a checkpoint for
+    the same market, start_time and window. end_time=None means now for a new download and
+    the end_time it resolved to when resuming. Returns the number of rows written."""
+    checkpoint = start_download(directory, market, start_time, end_time, window)
+    with ExitStack() as stack:
+        files = open_columns(directory, checkpoint, stack)
+        for window_end, timed, boundary_ids in iter_trade_windows(
+                client, market, checkpoint['next_start_time'], checkpoint['end_time'], window,
+                max_workers, set(checkpoint['boundary_ids'])):
+            write_window(directory, files, checkpoint, window_end, timed, boundary_ids)
+    return checkpoint['rows']
+
+
+def read_trades(directory: str) -> Dict[str, array]:
+    columns = {}
+    for column, typecode in COLUMNS.items():
+        values = array(typecode)
+        with open(os.path.join(directory, f'{column}.bin'), 'rb') as f:
+            values.frombytes(f.read())
+        columns[column] = values
+    return columns
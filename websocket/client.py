@@ -1,47 +1,185 @@
 import hmac
 import json
+import logging
+import threading
 import time
-import zlib
 from collections import defaultdict, deque
-from itertools import zip_longest
-from typing import DefaultDict, Deque, List, Dict, Tuple, Optional
+from typing import (
+    Any, Callable, DefaultDict, Deque, List, Dict, Mapping, Set, Tuple, Optional, Union,
+)
+from ciso8601 import parse_datetime
 from gevent.event import Event
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from common.metrics import Counter, Histogram, MetricsRegistry
+from rest.client import FtxClient
+from websocket.order_store import OrderStore
+from websocket.orderbook import OrderBook
+from websocket.ring_buffer import FILL_COLUMNS, TRADE_COLUMNS, ColumnarRingBuffer
+from websocket.subscriptions import (
+    OVERFLOW_DROP_OLDEST, Fill, MarketsUpdate, OrderbookDelta, OrderUpdate, Subscription, Ticker,
+    Trade,
+)
 from websocket.websocket_manager import WebsocketManager
 
+logger = logging.getLogger(__name__)
+
+Decoder = Callable[[Union[str, bytes]], Any]
+DEFAULT_DECODER: Decoder = orjson.loads if orjson is not None else json.loads
+
 
 class FtxWebsocketClient(WebsocketManager):
     _ENDPOINT = 'wss://ftx.com/ws/'
 
-    def __init__(self) -> None:
+    def __init__(self, checksum_every: int = 1, checksum_interval: Optional[float] = None,
+                 columnar_buffers: bool = False, buffer_size: int = 10000,
+                 decoder: Optional[Decoder] = None,
+                 rest_client: Optional[FtxClient] = None,
+                 frame_recorder: Optional[Callable[[Union[str, bytes]], None]] = None,
+                 metrics: Optional[MetricsRegistry] = None,
+                 max_closed_orders: int = 10000) -> None:
+        """
+        By default every orderbook update is verified against its checksum. Set checksum_every
+        to verify only every Nth update per market and/or checksum_interval to verify at least
+        once per that many seconds; checksum_every=0 leaves only the time budget. Partials are
+        always verified.
+
+        With columnar_buffers (requires numpy) trades and fills are kept per market in
+        ColumnarRingBuffers instead of deques of dicts; see get_trade_buffer / get_fill_buffer.
+        get_trades and get_fills then rebuild rows from the columns (TRADE_COLUMNS /
+        FILL_COLUMNS), so their schema differs: time is a float timestamp, side is 1 for buys
+        and -1 for sells, and ids and other fields are not kept.
+
+        Orders are kept in an OrderStore; the last max_closed_orders closed ones are retained.
+
+        Frames are decoded with orjson when it is installed and the stdlib json module
+        otherwise; pass decoder to use another parser.
+
+        Subscriptions and the login are replayed automatically on reconnect. With a rest_client
+        (using the same account), orders and fills missed while disconnected are fetched from
+        REST and fed through the usual handlers.
+
+        frame_recorder, e.g. common.recorder.FrameLogWriter.websocket, is called with every raw
+        frame before it is decoded.
+
+        With metrics, per-channel message counts, exchange-timestamp-to-handler latency, handler
+        time and checksum failures are recorded.
+        """
         super().__init__()
-        self._trades: DefaultDict[str, Deque] = defaultdict(lambda: deque([], maxlen=10000))
-        self._fills: Deque = deque([], maxlen=10000)
+        self._rest_client = rest_client
+        self._frame_recorder = frame_recorder
+        self._metrics = metrics
+        self._channel_metrics: Dict[str, Tuple[Counter, Histogram, Histogram]] = {}
+        self._decode = decoder or DEFAULT_DECODER
+        self._channel_handlers: Dict[str, Callable[[Dict], None]] = {
+            'orderbook': self._handle_orderbook_message,
+            'trades': self._handle_trades_message,
+            'ticker': self._handle_ticker_message,
+            'fills': self._handle_fills_message,
+            'orders': self._handle_orders_message,
+            'markets': self._handle_markets_message,
+        }
+        # Replaced rather than mutated so the websocket thread can read them without locking
+        self._subscribers: Dict[Tuple[str, Optional[str]], List[Subscription]] = {}
+        self._subscribers_lock = threading.Lock()
+        self._checksum_every = checksum_every
+        self._checksum_interval = checksum_interval
+        self._columnar_buffers = columnar_buffers
+        self._trades: DefaultDict[str, Deque] = defaultdict(lambda: deque([], maxlen=buffer_size))
+        self._fills: Deque = deque([], maxlen=buffer_size)
+        # Ids of recent fills, so fills replayed from REST after a reconnect are not duplicated
+        self._fill_ids: Set[int] = set()
+        self._fill_id_history: Deque[int] = deque()
+        self._fill_id_limit = buffer_size
+        # Serialises the websocket handlers with the reconcile thread for orders and fills
+        self._private_state_lock = threading.RLock()
+        self._trade_buffers: DefaultDict[str, ColumnarRingBuffer] = defaultdict(
+            lambda: ColumnarRingBuffer(TRADE_COLUMNS, buffer_size))
+        self._fill_buffers: DefaultDict[str, ColumnarRingBuffer] = defaultdict(
+            lambda: ColumnarRingBuffer(FILL_COLUMNS, buffer_size))
         self._api_key = ''  # TODO: Place your API key here
         self._api_secret = ''  # TODO: Place your API secret here
         self._orderbook_update_events: DefaultDict[str, Event] = defaultdict(Event)
+        self._max_closed_orders = max_closed_orders
         self._reset_data()
 
-    def _on_open(self, ws):
-        self._reset_data()
+    def _on_open(self, ws) -> None:
+        # Order books are rebuilt from the partials that follow resubscribing; orders, fills and
+        # tickers are kept and private state is caught up from REST when a client is available.
+        # The fill cutoff, the last fill or message of the previous connection, is taken before
+        # resubscribing, while no new fills can have arrived. It is 0 on the first connection.
+        fill_cutoff = max(self._last_fill_time, self._last_message_at)
+        self._reset_orderbooks()
+        subscriptions, self._subscriptions = self._subscriptions, []
+        if self._logged_in:
+            self._login()
+        for subscription in subscriptions:
+            if subscription not in self._subscriptions:
+                self._subscribe(subscription)
+        if self._rest_client is not None and self._logged_in:
+            threading.Thread(target=self._reconcile_private_state, args=(fill_cutoff,),
+                             daemon=True).start()
 
     def _reset_data(self) -> None:
         self._subscriptions: List[Dict] = []
-        self._orders: DefaultDict[int, Dict] = defaultdict(dict)
+        self._orders = OrderStore(self._max_closed_orders)
         self._tickers: DefaultDict[str, Dict] = defaultdict(dict)
-        self._orderbook_timestamps: DefaultDict[str, float] = defaultdict(float)
         self._orderbook_update_events.clear()
-        self._orderbooks: DefaultDict[str, Dict[str, DefaultDict[float, float]]] = defaultdict(
-            lambda: {side: defaultdict(float) for side in {'bids', 'asks'}})
-        self._orderbook_timestamps.clear()
+        self._reset_orderbooks()
         self._logged_in = False
+        self._last_fill_time = 0.
+        self._last_message_at = 0.
+        self._fill_ids.clear()
+        self._fill_id_history.clear()
+
+    def _reset_orderbooks(self) -> None:
+        self._orderbooks: DefaultDict[str, OrderBook] = defaultdict(OrderBook)
+        self._orderbook_timestamps: DefaultDict[str, float] = defaultdict(float)
+        self._updates_since_checksum: DefaultDict[str, int] = defaultdict(int)
+        self._last_checksum_at: DefaultDict[str, float] = defaultdict(float)
         self._last_received_orderbook_data_at: float = 0.0
 
+    def _reconcile_private_state(self, fill_cutoff: float) -> None:
+        """Replay orders and fills that changed while disconnected through the usual handlers.
+
+        REST snapshots of an order are dropped if the websocket updated it after they were
+        requested, and fills since fill_cutoff are deduplicated by id against the websocket's.
+        Without a cutoff no fills are replayed: older fills would be reported as new.
+        """
+        try:
+            sequence = self._orders.sequence
+            open_orders = {order['id']: order for order in self._rest_client.get_open_orders()}
+            for order_id in list(self._orders.open_orders()):
+                if order_id not in open_orders:
+                    self._apply_order_snapshot(self._rest_client.get_order_status(order_id),
+                                               sequence)
+            for order in open_orders.values():
+                self._apply_order_snapshot(order, sequence)
+            if not fill_cutoff:
+                return
+            missed_fills = self._rest_client.get_fills(start_time=fill_cutoff)
+            for fill in sorted(missed_fills, key=lambda fill: fill['time']):
+                self._handle_fills_message({'data': fill})
+        except Exception:
+            logger.warning('Error reconciling orders and fills after reconnect', exc_info=True)
+
+    def _apply_order_snapshot(self, order: Dict, sequence: int) -> None:
+        with self._private_state_lock:
+            if (self._orders.updated_at(order['id']) <= sequence
+                    and self._orders.get(order['id']) != order):
+                self._handle_orders_message({'data': order})
+
     def _reset_orderbook(self, market: str) -> None:
         if market in self._orderbooks:
             del self._orderbooks[market]
         if market in self._orderbook_timestamps:
             del self._orderbook_timestamps[market]
+        self._updates_since_checksum.pop(market, None)
+        self._last_checksum_at.pop(market, None)
 
     def _get_url(self) -> str:
         return self._ENDPOINT
@@ -71,36 +209,66 @@ class FtxWebsocketClient(WebsocketManager):
         subscription = {'channel': 'fills'}
         if subscription not in self._subscriptions:
             self._subscribe(subscription)
+        if self._columnar_buffers:
+            return [{'market': market, **row} for market, buffer in self._fill_buffers.items()
+                    for row in self._buffer_rows(buffer)]
         return list(self._fills.copy())
 
-    def get_orders(self) -> Dict[int, Dict]:
+    def get_fill_buffer(self, market: str) -> ColumnarRingBuffer:
+        assert self._columnar_buffers, 'Columnar buffers are not enabled'
+        if not self._logged_in:
+            self._login()
+        subscription = {'channel': 'fills'}
+        if subscription not in self._subscriptions:
+            self._subscribe(subscription)
+        return self._fill_buffers[market]
+
+    def get_orders(self) -> Mapping[int, Dict]:
+        """Read-only view of the open and recently closed orders by id."""
+        return self.get_order_store().orders
+
+    def get_order_store(self) -> OrderStore:
         if not self._logged_in:
             self._login()
         subscription = {'channel': 'orders'}
         if subscription not in self._subscriptions:
             self._subscribe(subscription)
-        return dict(self._orders.copy())
+        return self._orders
 
     def get_trades(self, market: str) -> List[Dict]:
         subscription = {'channel': 'trades', 'market': market}
         if subscription not in self._subscriptions:
             self._subscribe(subscription)
+        if self._columnar_buffers:
+            return self._buffer_rows(self._trade_buffers[market])
         return list(self._trades[market].copy())
 
-    def get_orderbook(self, market: str) -> Dict[str, List[Tuple[float, float]]]:
+    def get_trade_buffer(self, market: str) -> ColumnarRingBuffer:
+        assert self._columnar_buffers, 'Columnar buffers are not enabled'
+        subscription = {'channel': 'trades', 'market': market}
+        if subscription not in self._subscriptions:
+            self._subscribe(subscription)
+        return self._trade_buffers[market]
+
+    @staticmethod
+    def _buffer_rows(buffer: ColumnarRingBuffer) -> List[Dict]:
+        columns = {name: values.tolist() for name, values in buffer.last(copy=True).items()}
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+    def _get_orderbook(self, market: str) -> OrderBook:
         subscription = {'channel': 'orderbook', 'market': market}
         if subscription not in self._subscriptions:
             self._subscribe(subscription)
         if self._orderbook_timestamps[market] == 0:
             self.wait_for_orderbook_update(market, 5)
-        return {
-            side: sorted(
-                [(price, quantity) for price, quantity in list(self._orderbooks[market][side].items())
-                 if quantity],
-                key=lambda order: order[0] * (-1 if side == 'bids' else 1)
-            )
-            for side in {'bids', 'asks'}
-        }
+        return self._orderbooks[market]
+
+    def get_orderbook(self, market: str,
+                      depth: Optional[int] = None) -> Dict[str, List[Tuple[float, float]]]:
+        return self._get_orderbook(market).snapshot(depth)
+
+    def get_top_of_book(self, market: str) -> Dict[str, Optional[Tuple[float, float]]]:
+        return self._get_orderbook(market).top_of_book()
 
     def get_orderbook_timestamp(self, market: str) -> float:
         return self._orderbook_timestamps[market]
@@ -125,46 +293,175 @@ class FtxWebsocketClient(WebsocketManager):
         data = message['data']
         if data['action'] == 'partial':
             self._reset_orderbook(market)
+        book = self._orderbooks[market]
         for side in {'bids', 'asks'}:
-            book = self._orderbooks[market][side]
-            for price, size in data[side]:
-                if size:
-                    book[price] = size
-                else:
-                    del book[price]
-            self._orderbook_timestamps[market] = data['time']
-        checksum = data['checksum']
-        orderbook = self.get_orderbook(market)
-        checksum_data = [
-            ':'.join([f'{float(order[0])}:{float(order[1])}' for order in (bid, offer) if order])
-            for (bid, offer) in zip_longest(orderbook['bids'][:100], orderbook['asks'][:100])
-        ]
-
-        computed_result = int(zlib.crc32(':'.join(checksum_data).encode()))
-        if computed_result != checksum:
-            self._last_received_orderbook_data_at = 0
-            self._reset_orderbook(market)
-            self._unsubscribe({'market': market, 'channel': 'orderbook'})
-            self._subscribe({'market': market, 'channel': 'orderbook'})
+            book.update(side, data[side])
+        self._orderbook_timestamps[market] = data['time']
+        if self._should_verify_checksum(market, data['action'] == 'partial') and \
+                book.checksum() != data['checksum']:
+            if self._metrics is not None:
+                self._metrics.counter('ws_checksum_failures_total', market=market).inc()
+            self.resync_orderbook(market)
         else:
             self._orderbook_update_events[market].set()
             self._orderbook_update_events[market].clear()
+            subscribers = self._get_subscribers('orderbook', market)
+            if subscribers:
+                self._publish(subscribers, OrderbookDelta(
+                    market, data['action'], data['time'],
+                    [(price, size) for price, size in data['bids']],
+                    [(price, size) for price, size in data['asks']]))
+
+    def _should_verify_checksum(self, market: str, is_partial: bool) -> bool:
+        self._updates_since_checksum[market] += 1
+        now = time.time()
+        if not (is_partial
+                or 0 < self._checksum_every <= self._updates_since_checksum[market]
+                or (self._checksum_interval is not None
+                    and now - self._last_checksum_at[market] >= self._checksum_interval)):
+            return False
+        self._updates_since_checksum[market] = 0
+        self._last_checksum_at[market] = now
+        return True
+
+    def resync_orderbook(self, market: str) -> None:
+        self._last_received_orderbook_data_at = 0
+        self._reset_orderbook(market)
+        self._unsubscribe({'market': market, 'channel': 'orderbook'})
+        self._subscribe({'market': market, 'channel': 'orderbook'})
 
     def _handle_trades_message(self, message: Dict) -> None:
-        self._trades[message['market']].append(message['data'])
+        market = message['market']
+        if not self._columnar_buffers:
+            self._trades[market].append(message['data'])
+        else:
+            buffer = self._trade_buffers[market]
+            for trade in message['data']:
+                buffer.append((parse_datetime(trade['time']).timestamp(), trade['price'],
+                               trade['size'], 1 if trade['side'] == 'buy' else -1,
+                               trade['liquidation']))
+        subscribers = self._get_subscribers('trades', market)
+        if subscribers:
+            for trade in message['data']:
+                self._publish(subscribers, Trade(market, trade['id'], trade['time'],
+                                                 trade['price'], trade['size'], trade['side'],
+                                                 trade['liquidation']))
 
     def _handle_ticker_message(self, message: Dict) -> None:
-        self._tickers[message['market']] = message['data']
+        market, data = message['market'], message['data']
+        self._tickers[market] = data
+        subscribers = self._get_subscribers('ticker', market)
+        if subscribers:
+            self._publish(subscribers, Ticker(market, data['time'], data.get('bid'),
+                                              data.get('ask'), data.get('bidSize'),
+                                              data.get('askSize'), data.get('last')))
 
     def _handle_fills_message(self, message: Dict) -> None:
-        self._fills.append(message['data'])
+        data = message['data']
+        with self._private_state_lock:
+            if not self._remember_fill(data.get('id')):
+                return
+            fill_time = parse_datetime(data['time']).timestamp()
+            self._last_fill_time = max(self._last_fill_time, fill_time)
+            if not self._columnar_buffers:
+                self._fills.append(data)
+            else:
+                self._fill_buffers[data['market']].append(
+                    (fill_time, data['price'], data['size'], 1 if data['side'] == 'buy' else -1,
+                     data['fee']))
+        subscribers = self._get_subscribers('fills', data['market'])
+        if subscribers:
+            self._publish(subscribers, Fill(data['market'], data))
+
+    def _remember_fill(self, fill_id: Optional[int]) -> bool:
+        """False if the fill was already handled."""
+        if fill_id is None:
+            return True
+        if fill_id in self._fill_ids:
+            return False
+        self._fill_ids.add(fill_id)
+        history = self._fill_id_history
+        history.append(fill_id)
+        if len(history) > self._fill_id_limit:
+            self._fill_ids.discard(history.popleft())
+        return True
 
     def _handle_orders_message(self, message: Dict) -> None:
         data = message['data']
-        self._orders.update({data['id']: data})
+        with self._private_state_lock:
+            if self._orders.is_stale(data):
+                return
+            self._orders.update(data)
+        subscribers = self._get_subscribers('orders', data['market'])
+        if subscribers:
+            self._publish(subscribers, OrderUpdate(data['market'], data))
+
+    def _handle_markets_message(self, message: Dict) -> None:
+        # The channel covers every market, so it only has market=None subscribers
+        subscribers = self._subscribers.get(('markets', None))
+        if subscribers:
+            data = message['data']
+            self._publish(subscribers, MarketsUpdate(data['action'], data['data']))
+
+    def subscribe(self, channel: str, market: Optional[str] = None,
+                  callback: Optional[Callable[[Any], None]] = None, maxsize: int = 1000,
+                  overflow: str = OVERFLOW_DROP_OLDEST) -> Subscription:
+        """Receive typed events (OrderbookDelta, Trade, Ticker, Fill, OrderUpdate,
+        MarketsUpdate) for a channel, either for one market or, with market=None, for every
+        market (the markets channel is always for every market). Events are pushed
+        to `callback` on the websocket thread, or else queued for iteration over the returned
+        Subscription; see Subscription for the queueing behaviour. Call close() on the
+        subscription to stop receiving events."""
+        subscription = Subscription((channel, market), self._remove_subscriber, callback,
+                                    maxsize, overflow)
+        with self._subscribers_lock:
+            self._subscribers = {**self._subscribers,
+                                 subscription.key: self._subscribers.get(subscription.key, []) +
+                                 [subscription]}
+        if channel in {'fills', 'orders'}:
+            if not self._logged_in:
+                self._login()
+            ws_subscription = {'channel': channel}
+        elif channel == 'markets':
+            ws_subscription = {'channel': channel}
+        elif market is not None:
+            ws_subscription = {'channel': channel, 'market': market}
+        else:
+            # Events for whichever markets the channel is already subscribed to
+            return subscription
+        if ws_subscription not in self._subscriptions:
+            self._subscribe(ws_subscription)
+        return subscription
+
+    def _remove_subscriber(self, subscription: Subscription) -> None:
+        with self._subscribers_lock:
+            remaining = [s for s in self._subscribers.get(subscription.key, [])
+                         if s is not subscription]
+            subscribers = {**self._subscribers, subscription.key: remaining}
+            if not remaining:
+                del subscribers[subscription.key]
+            self._subscribers = subscribers
+
+    def _get_subscribers(self, channel: str, market: str) -> List[Subscription]:
+        subscribers = self._subscribers
+        if not subscribers:
+            return []
+        return subscribers.get((channel, market), []) + subscribers.get((channel, None), [])
+
+    def _publish(self, subscribers: List[Subscription], event: Any) -> None:
+        for subscriber in subscribers:
+            subscriber.deliver(event)
+
+    def register_channel_handler(self, channel: str, handler: Callable[[Dict], None]) -> None:
+        """Route messages of `channel` to handler(message), replacing any existing handler.
+        Subscribe to custom channels with send_json({'op': 'subscribe', 'channel': ...})."""
+        self._channel_handlers[channel] = handler
 
     def _on_message(self, ws, raw_message: str) -> None:
-        message = json.loads(raw_message)
+        self._last_message_at = time.time()
+        if self._frame_recorder is not None:
+            self._frame_recorder(raw_message)
+        message = self._decode(raw_message)
         message_type = message['type']
         if message_type in {'subscribed', 'unsubscribed'}:
             return
@@ -173,15 +470,30 @@ class FtxWebsocketClient(WebsocketManager):
                 return self.reconnect()
         elif message_type == 'error':
             raise Exception(message)
-        channel = message['channel']
 
-        if channel == 'orderbook':
-            self._handle_orderbook_message(message)
-        elif channel == 'trades':
-            self._handle_trades_message(message)
-        elif channel == 'ticker':
-            self._handle_ticker_message(message)
-        elif channel == 'fills':
-            self._handle_fills_message(message)
-        elif channel == 'orders':
-            self._handle_orders_message(message)
+        handler = self._channel_handlers.get(message['channel'])
+        if handler is not None:
+            if self._metrics is None:
+                handler(message)
+            else:
+                self._handle_with_metrics(message, handler)
+
+    def _handle_with_metrics(self, message: Dict, handler: Callable[[Dict], None]) -> None:
+        channel = message['channel']
+        channel_metrics = self._channel_metrics.get(channel)
+        if channel_metrics is None:
+            channel_metrics = self._channel_metrics[channel] = (
+                self._metrics.counter('ws_messages_total', channel=channel),
+                self._metrics.histogram('ws_exchange_latency_seconds', channel=channel),
+                self._metrics.histogram('ws_handler_seconds', channel=channel),
+            )
+        messages, exchange_latency, handler_time = channel_metrics
+        messages.inc()
+        data = message.get('data')
+        # Only orderbook and ticker data carry a numeric exchange timestamp
+        exchange_time = data.get('time') if isinstance(data, dict) else None
+        if isinstance(exchange_time, float):
+            exchange_latency.record(time.time() - exchange_time)
+        start = time.perf_counter()
+        handler(message)
+        handler_time.record(time.perf_counter() - start)
@@ -0,0 +1,146 @@
+"""Orders of the websocket orders channel, indexed for constant-time lookups.
+
+OrderStore keeps the latest version of every order by exchange id, with secondary indexes by
+clientId, status and (for open orders) market. Closed orders move into a bounded history and
+are evicted oldest first, so memory stays constant however long the client runs; the ids of
+as many evicted orders again are remembered so late updates cannot bring them back. Reads return
+read-only live views (MappingProxyType) instead of copies; they are updated in place by the
+websocket thread, so take dict(view) before iterating one from another thread.
+"""
+from collections import deque
+from types import MappingProxyType
+from typing import Deque, Dict, Mapping, Optional, Set
+
+CLOSED = 'closed'
+
+
+class OrderStore:
+    def __init__(self, max_closed_orders: int = 10000) -> None:
+        """Closed orders stay available until more than max_closed_orders have closed since."""
+        self._max_closed_orders = max_closed_orders
+        self._by_id: Dict[int, Dict] = {}
+        self._by_client_id: Dict[str, Dict] = {}
+        self._by_status: Dict[str, Dict[int, Dict]] = {}
+        self._open: Dict[int, Dict] = {}
+        self._open_by_market: Dict[str, Dict[int, Dict]] = {}
+        self._closed: Deque[int] = deque()
+        self._evicted: Set[int] = set()
+        self._evicted_order: Deque[int] = deque()
+        self._sequence = 0
+        self._updated_at: Dict[int, int] = {}
+        self._status_views: Dict[str, Mapping[int, Dict]] = {}
+        self._market_views: Dict[str, Mapping[int, Dict]] = {}
+        self._orders_view = MappingProxyType(self._by_id)
+        self._open_view = MappingProxyType(self._open)
+
+    def update(self, order: Dict) -> Optional[Dict]:
+        """Store the latest version of an order; returns the one it replaces, if any.
+
+        Stale updates (see is_stale) are ignored."""
+        order_id = order['id']
+        previous = self._by_id.get(order_id)
+        if self.is_stale(order):
+            return previous
+        if previous is not None:
+            self._unindex(previous)
+        self._by_id[order_id] = order
+        self._sequence += 1
+        self._updated_at[order_id] = self._sequence
+        client_id = order.get('clientId')
+        if client_id is not None:
+            self._by_client_id[client_id] = order
+        status = order.get('status')
+        self._by_status.setdefault(status, {})[order_id] = order
+        if status == CLOSED:
+            if previous is None or previous.get('status') != CLOSED:
+                self._retire(order_id)
+        else:
+            self._open[order_id] = order
+            self._open_by_market.setdefault(order['market'], {})[order_id] = order
+        return previous
+
+    def is_stale(self, order: Dict) -> bool:
+        """Whether an update is older than what the store has seen, e.g. a REST snapshot that
+        raced the websocket: closed orders never reopen, and evicted ones never change again."""
+        order_id = order['id']
+        if order_id in self._evicted:
+            return True
+        previous = self._by_id.get(order_id)
+        return (previous is not None and previous.get('status') == CLOSED
+                and order.get('status') != CLOSED)
+
+    def _unindex(self, order: Dict) -> None:
+        order_id = order['id']
+        client_id = order.get('clientId')
+        if client_id is not None and self._by_client_id.get(client_id) is order:
+            del self._by_client_id[client_id]
+        # Emptied index dicts are kept: live views may refer to them
+        self._by_status.get(order.get('status'), {}).pop(order_id, None)
+        if self._open.pop(order_id, None) is not None:
+            self._open_by_market[order['market']].pop(order_id, None)
+
+    def _retire(self, order_id: int) -> None:
+        closed = self._closed
+        closed.append(order_id)
+        while len(closed) > self._max_closed_orders:
+            old_id = closed.popleft()
+            old = self._by_id.pop(old_id, None)
+            self._updated_at.pop(old_id, None)
+            if old is not None:
+                self._unindex(old)
+            self._evicted.add(old_id)
+            self._evicted_order.append(old_id)
+            if len(self._evicted_order) > self._max_closed_orders:
+                self._evicted.discard(self._evicted_order.popleft())
+
+    def clear(self) -> None:
+        for index in (self._by_id, self._by_client_id, self._open, *self._by_status.values(),
+                      *self._open_by_market.values()):
+            index.clear()
+        self._closed.clear()
+        self._evicted.clear()
+        self._evicted_order.clear()
+        self._updated_at.clear()
+
+    @property
+    def sequence(self) -> int:
+        """Number of updates stored so far; compare with updated_at to spot newer versions."""
+        return self._sequence
+
+    def updated_at(self, order_id: int) -> int:
+        """The sequence number of the order's latest update, or 0 if it is not stored."""
+        return self._updated_at.get(order_id, 0)
+
+    def get(self, order_id: int) -> Optional[Dict]:
+        return self._by_id.get(order_id)
+
+    def get_by_client_id(self, client_id: str) -> Optional[Dict]:
+        return self._by_client_id.get(client_id)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, order_id: int) -> bool:
+        return order_id in self._by_id
+
+    @property
+    def orders(self) -> Mapping[int, Dict]:
+        """Every open order and the retained closed ones, by id."""
+        return self._orders_view
+
+    def open_orders(self, market: Optional[str] = None) -> Mapping[int, Dict]:
+        if market is None:
+            return self._open_view
+        view = self._market_views.get(market)
+        if view is None:
+            view = self._market_views[market] = MappingProxyType(
+                self._open_by_market.setdefault(market, {}))
+        return view
+
+    def with_status(self, status: str) -> Mapping[int, Dict]:
+        """Orders by status ('new', 'open' or 'closed')."""
+        view = self._status_views.get(status)
+        if view is None:
+            view = self._status_views[status] = MappingProxyType(
+                self._by_status.setdefault(status, {}))
+        return view
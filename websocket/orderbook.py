@@ -0,0 +1,119 @@
+import zlib
+from bisect import bisect_left
+from itertools import zip_longest
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+Level = Tuple[float, float]
+
+CHECKSUM_DEPTH = 100
+
+
+class OrderBookSide:
+    """Price ladder kept in best-first order.
+
+    Prices are stored as sort keys in a bisect-maintained array (negated for bids so both sides
+    ascend from the best price), with sizes in a dict keyed by price. The side also remembers the
+    shallowest index touched since the last checksum so only that part of the top levels is
+    re-hashed.
+    """
+
+    def __init__(self, descending: bool) -> None:
+        self._descending = descending
+        self._keys: List[float] = []
+        self._sizes: Dict[float, float] = {}
+        self._formatted: Dict[float, str] = {}
+        self.dirty_from = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _key(self, price: float) -> float:
+        return -price if self._descending else price
+
+    def update(self, price: float, size: float) -> None:
+        key = self._key(price)
+        index = bisect_left(self._keys, key)
+        if size:
+            if price not in self._sizes:
+                self._keys.insert(index, key)
+            self._sizes[price] = size
+        elif price in self._sizes:
+            del self._sizes[price]
+            del self._keys[index]
+        else:
+            return
+        self._formatted.pop(price, None)
+        if index < self.dirty_from:
+            self.dirty_from = index
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._sizes.clear()
+        self._formatted.clear()
+        self.dirty_from = 0
+
+    def best(self) -> Optional[Level]:
+        if not self._keys:
+            return None
+        price = self._key(self._keys[0])
+        return price, self._sizes[price]
+
+    def levels(self, depth: Optional[int] = None) -> List[Level]:
+        keys = self._keys if depth is None else self._keys[:depth]
+        sizes = self._sizes
+        if self._descending:
+            return [(-key, sizes[-key]) for key in keys]
+        return [(key, sizes[key]) for key in keys]
+
+    def formatted_levels(self, start: int, stop: int) -> List[str]:
+        formatted = self._formatted
+        result = []
+        for key in self._keys[start:stop]:
+            price = -key if self._descending else key
+            level = formatted.get(price)
+            if level is None:
+                level = formatted[price] = f'{float(price)}:{float(self._sizes[price])}'
+            result.append(level)
+        return result
+
+
+class OrderBook:
+    def __init__(self) -> None:
+        self.bids = OrderBookSide(descending=True)
+        self.asks = OrderBookSide(descending=False)
+        # _checksum_prefixes[i] is the running CRC32 of the first i checksum rows
+        self._checksum_prefixes: List[int] = [0]
+
+    def side(self, side: str) -> OrderBookSide:
+        return self.bids if side == 'bids' else self.asks
+
+    def update(self, side: str, levels: Iterable[Sequence[float]]) -> None:
+        book_side = self.side(side)
+        for price, size in levels:
+            book_side.update(price, size)
+
+    def clear(self) -> None:
+        self.bids.clear()
+        self.asks.clear()
+        self._checksum_prefixes = [0]
+
+    def snapshot(self, depth: Optional[int] = None) -> Dict[str, List[Level]]:
+        return {'bids': self.bids.levels(depth), 'asks': self.asks.levels(depth)}
+
+    def top_of_book(self) -> Dict[str, Optional[Level]]:
+        return {'bid': self.bids.best(), 'ask': self.asks.best()}
+
+    def checksum(self) -> int:
+        prefixes = self._checksum_prefixes
+        start = min(self.bids.dirty_from, self.asks.dirty_from, len(prefixes) - 1)
+        if start < CHECKSUM_DEPTH:
+            del prefixes[start + 1:]
+            crc = prefixes[start]
+            rows = zip_longest(self.bids.formatted_levels(start, CHECKSUM_DEPTH),
+                               self.asks.formatted_levels(start, CHECKSUM_DEPTH))
+            for index, (bid, offer) in enumerate(rows, start):
+                row = f'{bid}:{offer}' if bid and offer else bid or offer
+                crc = zlib.crc32((f':{row}' if index else row).encode(), crc)
+                prefixes.append(crc)
+            self.bids.dirty_from = self.asks.dirty_from = CHECKSUM_DEPTH
+        return prefixes[-1]
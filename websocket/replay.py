@@ -0,0 +1,35 @@
+from typing import Optional
+
+from common.recorder import SOURCE_WEBSOCKET, replay
+from websocket.client import FtxWebsocketClient
+
+
+class ReplayWebsocketClient(FtxWebsocketClient):
+    """FtxWebsocketClient that is fed recorded frames instead of a socket.
+
+    Nothing is sent, and order books are tracked for every market that appears in the
+    recording, so the usual getters work on the replayed state.
+    """
+
+    def connect(self) -> None:
+        pass
+
+    def send(self, message) -> None:
+        pass
+
+    def _handle_orderbook_message(self, message) -> None:
+        subscription = {'channel': 'orderbook', 'market': message['market']}
+        if subscription not in self._subscriptions:
+            self._subscriptions.append(subscription)
+        super()._handle_orderbook_message(message)
+
+
+def replay_websocket(path: str, client: Optional[FtxWebsocketClient] = None,
+                     speed: Optional[float] = 1.) -> FtxWebsocketClient:
+    """Run the websocket frames of a frame log through client._on_message (a new
+    ReplayWebsocketClient by default) at `speed` times the recorded pace, or as fast as possible
+    with speed=None. Returns the client."""
+    client = client or ReplayWebsocketClient()
+    replay(path, {SOURCE_WEBSOCKET: lambda payload: client._on_message(None, bytes(payload))},
+           speed)
+    return client
@@ -0,0 +1,115 @@
+from typing import Dict, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for columnar buffers
+    np = None
+
+TRADE_COLUMNS: Dict[str, str] = {
+    'time': 'f8',
+    'price': 'f8',
+    'size': 'f8',
+    'side': 'i1',  # 1 for buys, -1 for sells
+    'liquidation': '?',
+}
+
+FILL_COLUMNS: Dict[str, str] = {
+    'time': 'f8',
+    'price': 'f8',
+    'size': 'f8',
+    'side': 'i1',
+    'fee': 'f8',
+}
+
+
+class ColumnarRingBuffer:
+    """Fixed-capacity ring buffer with one typed NumPy array per column.
+
+    Every row is written twice, at i and i + capacity, so the latest n rows (n <= capacity) are
+    always contiguous and can be returned as views without copying. Rows must be appended in
+    time order for the time-window queries.
+
+    Views alias the buffer's storage: once enough further rows are appended to wrap around onto
+    their slots, a held view shows newer rows in place of the ones it was taken for, and a view
+    read while the websocket thread appends can see a row half written. Pass copy=True (or read
+    inside a subscription callback, on the websocket thread) for data kept or used elsewhere.
+    """
+
+    def __init__(self, columns: Dict[str, str], capacity: int = 10000) -> None:
+        if np is None:
+            raise ImportError('numpy is required for columnar buffers')
+        self._capacity = capacity
+        self._names = tuple(columns)
+        self._columns = {name: np.zeros(2 * capacity, dtype=dtype)
+                         for name, dtype in columns.items()}
+        self._column_list = [self._columns[name] for name in self._names]
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def append(self, row: Sequence) -> None:
+        """Append one row with values in column order."""
+        index = self._next
+        mirror = index + self._capacity
+        for column, value in zip(self._column_list, row):
+            column[index] = column[mirror] = value
+        self._next = index + 1 if index + 1 < self._capacity else 0
+        if self._count < self._capacity:
+            self._count += 1
+
+    def _bounds(self, n: Optional[int] = None) -> Tuple[int, int]:
+        n = self._count if n is None else min(n, self._count)
+        stop = self._next + self._capacity if self._count == self._capacity else self._next
+        return stop - n, stop
+
+    def last(self, n: Optional[int] = None, copy: bool = False) -> Dict[str, 'np.ndarray']:
+        """Read-only views of the latest n rows (all rows by default), oldest first, valid
+        until later appends overwrite them; with copy, arrays the caller owns."""
+        start, stop = self._bounds(n)
+        return self._rows(start, stop, copy)
+
+    def between(self, start_time: float, end_time: Optional[float] = None,
+                copy: bool = False) -> Dict[str, 'np.ndarray']:
+        """Read-only views (or with copy, copies) of the rows with
+        start_time <= time < end_time; see last()."""
+        start, stop = self._bounds()
+        times = self._columns['time'][start:stop]
+        stop = start + (len(times) if end_time is None
+                        else int(np.searchsorted(times, end_time, side='left')))
+        start += int(np.searchsorted(times, start_time, side='left'))
+        return self._rows(start, stop, copy)
+
+    def _rows(self, start: int, stop: int, copy: bool) -> Dict[str, 'np.ndarray']:
+        if copy:
+            return {name: column[start:stop].copy() for name, column in self._columns.items()}
+        return {name: self._view(column, start, stop) for name, column in self._columns.items()}
+
+    @staticmethod
+    def _view(column: 'np.ndarray', start: int, stop: int) -> 'np.ndarray':
+        view = column[start:stop]
+        view.flags.writeable = False
+        return view
+
+    def _window(self, n: Optional[int], start_time: Optional[float]) -> Dict[str, 'np.ndarray']:
+        return self.last(n) if start_time is None else self.between(start_time)
+
+    def volume(self, n: Optional[int] = None, start_time: Optional[float] = None) -> float:
+        return float(self._window(n, start_time)['size'].sum())
+
+    def notional(self, n: Optional[int] = None, start_time: Optional[float] = None) -> float:
+        rows = self._window(n, start_time)
+        return float(np.dot(rows['price'], rows['size']))
+
+    def vwap(self, n: Optional[int] = None, start_time: Optional[float] = None
+             ) -> Optional[float]:
+        rows = self._window(n, start_time)
+        volume = rows['size'].sum()
+        if not volume:
+            return None
+        return float(np.dot(rows['price'], rows['size']) / volume)
@@ -0,0 +1,301 @@
+"""Spread market data subscriptions over several websocket connections.
+
+ShardedFtxWebsocketClient runs N FtxWebsocketClients in-process, each with its own socket and
+callback thread, behind the usual read API. ProcessShardedOrderBooks runs each shard in its own
+process and publishes order books back through shared memory, taking the Python work of hot
+markets off the reading process entirely.
+"""
+import multiprocessing
+import threading
+import time
+from collections import defaultdict
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, DefaultDict, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from websocket.client import FtxWebsocketClient
+from websocket.order_store import OrderStore
+from websocket.orderbook import OrderBook
+
+_MARKET_CHANNELS = ('orderbook', 'trades', 'ticker')
+
+
+class _ShardClient(FtxWebsocketClient):
+    def __init__(self, on_reconnect: Callable[['_ShardClient'], None], **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._on_shard_reconnect = on_reconnect
+        self.message_counts: DefaultDict[str, int] = defaultdict(int)
+        for channel in _MARKET_CHANNELS:
+            self._channel_handlers[channel] = self._counting(self._channel_handlers[channel])
+
+    def _counting(self, handler: Callable[[Dict], None]) -> Callable[[Dict], None]:
+        counts = self.message_counts
+
+        def counting_handler(message: Dict) -> None:
+            counts[message['market']] += 1
+            handler(message)
+        return counting_handler
+
+    def _reconnect(self, ws) -> None:
+        was_current = ws is self.ws
+        super()._reconnect(ws)
+        if was_current:
+            self._on_shard_reconnect(self)
+
+    def move_out(self, market: str) -> Set[str]:
+        channels = set()
+        for channel in _MARKET_CHANNELS:
+            subscription = {'channel': channel, 'market': market}
+            if subscription in self._subscriptions:
+                self._unsubscribe(subscription)
+                channels.add(channel)
+        self._reset_orderbook(market)
+        self.message_counts.pop(market, None)
+        return channels
+
+
+class ShardedFtxWebsocketClient:
+    """Market data client spread over `num_shards` websocket connections.
+
+    Markets are assigned to the least loaded shard when first requested. Whenever a shard
+    reconnects, markets are redistributed by the number of messages they produced since the
+    last rebalance (largest first onto the least loaded shard). Private channels (fills, orders)
+    use shard 0.
+    """
+
+    def __init__(self, num_shards: int = 4, rebalance_threshold: float = 1.2,
+                 **client_kwargs) -> None:
+        self._shards = [_ShardClient(self._on_shard_reconnect, **client_kwargs)
+                        for _ in range(num_shards)]
+        self._assignments: Dict[str, _ShardClient] = {}
+        self._rebalance_threshold = rebalance_threshold
+        self._lock = threading.RLock()
+
+    @property
+    def shards(self) -> List[FtxWebsocketClient]:
+        return list(self._shards)
+
+    def _shard_for(self, market: str) -> _ShardClient:
+        shard = self._assignments.get(market)
+        if shard is not None:
+            return shard
+        with self._lock:
+            if market not in self._assignments:
+                loads = self._shard_loads()
+                self._assignments[market] = min(self._shards, key=lambda s: loads[id(s)])
+            return self._assignments[market]
+
+    def _shard_loads(self) -> Dict[int, int]:
+        loads = {id(shard): 0 for shard in self._shards}
+        for market, shard in self._assignments.items():
+            # Count each market at least once so new markets spread out evenly
+            loads[id(shard)] += max(shard.message_counts.get(market, 0), 1)
+        return loads
+
+    def _on_shard_reconnect(self, reconnected: _ShardClient) -> None:
+        # The shard has already replayed its own subscriptions in _on_open
+        self.rebalance()
+
+    def rebalance(self) -> List[Tuple[str, int]]:
+        """Reassign markets across shards by recent message counts. Returns the moved markets
+        with their new shard index."""
+        with self._lock:
+            loads = self._shard_loads()
+            if not loads or max(loads.values()) <= self._rebalance_threshold * \
+                    (sum(loads.values()) / len(loads)):
+                return []
+            market_loads = sorted(
+                ((max(shard.message_counts.get(market, 0), 1), market)
+                 for market, shard in self._assignments.items()), reverse=True)
+            new_loads = {id(shard): 0 for shard in self._shards}
+            moved = []
+            for load, market in market_loads:
+                target = min(self._shards, key=lambda s: new_loads[id(s)])
+                new_loads[id(target)] += load
+                current = self._assignments[market]
+                if target is not current:
+                    channels = current.move_out(market)
+                    self._assignments[market] = target
+                    for channel in channels:
+                        target._subscribe({'channel': channel, 'market': market})
+                    moved.append((market, self._shards.index(target)))
+            for shard in self._shards:
+                shard.message_counts.clear()
+            return moved
+
+    def get_orderbook(self, market: str,
+                      depth: Optional[int] = None) -> Dict[str, List[Tuple[float, float]]]:
+        return self._shard_for(market).get_orderbook(market, depth)
+
+    def get_top_of_book(self, market: str) -> Dict[str, Optional[Tuple[float, float]]]:
+        return self._shard_for(market).get_top_of_book(market)
+
+    def get_orderbook_timestamp(self, market: str) -> float:
+        return self._shard_for(market).get_orderbook_timestamp(market)
+
+    def wait_for_orderbook_update(self, market: str, timeout: Optional[float]) -> None:
+        self._shard_for(market).wait_for_orderbook_update(market, timeout)
+
+    def get_trades(self, market: str) -> List[Dict]:
+        return self._shard_for(market).get_trades(market)
+
+    def get_ticker(self, market: str) -> Dict:
+        return self._shard_for(market).get_ticker(market)
+
+    def get_fills(self) -> List[Dict]:
+        return self._shards[0].get_fills()
+
+    def get_orders(self) -> Mapping[int, Dict]:
+        return self._shards[0].get_orders()
+
+    def get_order_store(self) -> OrderStore:
+        return self._shards[0].get_order_store()
+
+
+# Per-market slot in shared memory, as float64s:
+# [sequence, time, number of bids, number of asks, bids (price, size) * depth, asks * depth]
+_SLOT_HEADER = 4
+
+
+class _PublishingClient(FtxWebsocketClient):
+    def __init__(self, slots: Dict[str, memoryview], depth: int, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._slots = slots
+        self._depth = depth
+
+    def _handle_orderbook_message(self, message: Dict) -> None:
+        super()._handle_orderbook_message(message)
+        market = message['market']
+        slot = self._slots.get(market)
+        if slot is not None:
+            _write_slot(slot, self._depth, self._orderbooks[market],
+                        self._orderbook_timestamps[market])
+
+
+def _write_slot(slot: memoryview, depth: int, book: OrderBook, timestamp: float) -> None:
+    bids, asks = book.bids.levels(depth), book.asks.levels(depth)
+    # Seqlock: the sequence is odd while the slot is being written
+    slot[0] += 1
+    slot[1] = timestamp
+    slot[2] = len(bids)
+    slot[3] = len(asks)
+    for offset, levels in ((_SLOT_HEADER, bids), (_SLOT_HEADER + 2 * depth, asks)):
+        for i, (price, size) in enumerate(levels):
+            slot[offset + 2 * i] = price
+            slot[offset + 2 * i + 1] = size
+    slot[0] += 1
+
+
+def _run_shard_process(shm_name: str, markets: Sequence[Tuple[str, int]], depth: int,
+                       client_kwargs: Dict) -> None:
+    shm = SharedMemory(shm_name)
+    values = shm.buf.cast('d')
+    slot_size = _SLOT_HEADER + 4 * depth
+    slots = {market: values[index * slot_size:(index + 1) * slot_size]
+             for market, index in markets}
+    client = _PublishingClient(slots, depth, **client_kwargs)
+    for market, _ in markets:
+        client._subscribe({'channel': 'orderbook', 'market': market})
+    while True:
+        time.sleep(60)
+
+
+class ProcessShardedOrderBooks:
+    """Order books for a fixed set of markets maintained by `num_shards` worker processes.
+
+    Each worker runs its own FtxWebsocketClient and writes the top `depth` levels of every book
+    into a shared memory block after each update; reads here copy a consistent snapshot out of
+    shared memory without any inter-process messaging.
+
+    A read before the market's first update waits for it for up to first_update_timeout seconds,
+    then raises TimeoutError. Reads raise RuntimeError once the market's worker has exited,
+    rather than return its last book.
+    """
+
+    def __init__(self, markets: Sequence[str], num_shards: int = 4, depth: int = 100,
+                 first_update_timeout: float = 10., **client_kwargs) -> None:
+        self._markets = {market: index for index, market in enumerate(markets)}
+        self._first_update_timeout = first_update_timeout
+        self._num_shards = num_shards
+        self._depth = depth
+        self._slot_size = _SLOT_HEADER + 4 * depth
+        self._client_kwargs = client_kwargs
+        self._shm: Optional[SharedMemory] = None
+        self._values: Optional[memoryview] = None
+        self._processes: List[multiprocessing.Process] = []
+        self._market_processes: Dict[str, multiprocessing.Process] = {}
+
+    def start(self) -> None:
+        self._shm = SharedMemory(create=True, size=8 * self._slot_size * len(self._markets))
+        self._values = self._shm.buf.cast('d')
+        assignments: List[List[Tuple[str, int]]] = [[] for _ in range(self._num_shards)]
+        for market, index in self._markets.items():
+            assignments[index % self._num_shards].append((market, index))
+        for markets in assignments:
+            if not markets:
+                continue
+            process = multiprocessing.Process(
+                target=_run_shard_process,
+                args=(self._shm.name, markets, self._depth, self._client_kwargs), daemon=True)
+            process.start()
+            self._processes.append(process)
+            for market, _ in markets:
+                self._market_processes[market] = process
+
+    def close(self) -> None:
+        for process in self._processes:
+            process.terminate()
+        self._processes = []
+        self._market_processes = {}
+        if self._shm is not None:
+            self._values.release()
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def _read_slot(self, market: str) -> Tuple[float, List[float]]:
+        assert self._values is not None, 'start() has not been called'
+        start = self._markets[market] * self._slot_size
+        slot = self._values[start:start + self._slot_size]
+        process = self._market_processes[market]
+        deadline = None
+        while True:
+            if not process.is_alive():
+                raise RuntimeError(f'Order book worker for {market} exited with code '
+                                   f'{process.exitcode}')
+            sequence = slot[0]
+            if sequence == 0:
+                # Not written yet
+                if deadline is None:
+                    deadline = time.monotonic() + self._first_update_timeout
+                elif time.monotonic() > deadline:
+                    raise TimeoutError(f'No order book for {market} after '
+                                       f'{self._first_update_timeout}s')
+                time.sleep(0.001)
+            elif sequence % 2 == 0:
+                data = slot.tolist()
+                if slot[0] == sequence:
+                    return data[1], data
+            else:
+                time.sleep(0)
+
+    def get_orderbook(self, market: str,
+                      depth: Optional[int] = None) -> Dict[str, List[Tuple[float, float]]]:
+        _, data = self._read_slot(market)
+        n_bids, n_asks = int(data[2]), int(data[3])
+        if depth is not None:
+            n_bids, n_asks = min(n_bids, depth), min(n_asks, depth)
+        asks_start = _SLOT_HEADER + 2 * self._depth
+        return {
+            'bids': list(zip(data[_SLOT_HEADER:_SLOT_HEADER + 2 * n_bids:2],
+                             data[_SLOT_HEADER + 1:_SLOT_HEADER + 2 * n_bids:2])),
+            'asks': list(zip(data[asks_start:asks_start + 2 * n_asks:2],
+                             data[asks_start + 1:asks_start + 2 * n_asks:2])),
+        }
+
+    def get_top_of_book(self, market: str) -> Dict[str, Optional[Tuple[float, float]]]:
+        orderbook = self.get_orderbook(market, 1)
+        return {'bid': next(iter(orderbook['bids']), None),
+                'ask': next(iter(orderbook['asks']), None)}
+
+    def get_orderbook_timestamp(self, market: str) -> float:
+        return self._read_slot(market)[0]
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class OrderbookDelta(NamedTuple):
+    market: str
+    action: str  # 'partial' or 'update'
+    time: float
+    bids: List[Tuple[float, float]]
+    asks: List[Tuple[float, float]]
+
+
+class Trade(NamedTuple):
+    market: str
+    id: int
+    time: str
+    price: float
+    size: float
+    side: str
+    liquidation: bool
+
+
+class Ticker(NamedTuple):
+    market: str
+    time: float
+    bid: Optional[float]
+    ask: Optional[float]
+    bid_size: Optional[float]
+    ask_size: Optional[float]
+    last: Optional[float]
+
+
+class Fill(NamedTuple):
+    market: str
+    data: Dict
+
+
+class OrderUpdate(NamedTuple):
+    market: str
+    data: Dict
+
+
+class MarketsUpdate(NamedTuple):
+    action: str  # 'partial' (every market) or 'update' (the markets that changed)
+    data: Dict[str, Dict]  # market name -> market
+
+
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+
+
+class Subscription:
+    """Receives the events of one channel (optionally one market).
+
+    With a callback, events are delivered inline on the websocket thread as soon as they are
+    applied, so the callback must be quick; exceptions it raises are logged rather than passed
+    on to the connection. Without one, events are buffered in a bounded queue and consumed by
+    iterating (blocking) or async iterating the subscription; when the consumer
+    falls behind, the oldest (or newest) events are dropped and counted in `dropped` rather than
+    stalling the websocket thread.
+    """
+
+    def __init__(self, key: Tuple[str, Optional[str]],
+                 unsubscribe: Callable[['Subscription'], None],
+                 callback: Optional[Callable[[Any], None]] = None, maxsize: int = 1000,
+                 overflow: str = OVERFLOW_DROP_OLDEST) -> None:
+        assert overflow in (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST)
+        self.key = key
+        self.dropped = 0
+        self._unsubscribe = unsubscribe
+        self._callback = callback
+        self._maxsize = maxsize
+        self._overflow = overflow
+        self._queue: Deque = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Future] = None
+
+    def deliver(self, event: Any) -> None:
+        if self._callback is not None:
+            try:
+                self._callback(event)
+            except Exception:
+                logger.exception('Error in subscription callback for %s', self.key)
+            return
+        with self._cond:
+            if len(self._queue) >= self._maxsize:
+                self.dropped += 1
+                if self._overflow == OVERFLOW_DROP_NEWEST:
+                    return
+                self._queue.popleft()
+            self._queue.append(event)
+            self._notify()
+
+    def _notify(self) -> None:
+        self._cond.notify()
+        if self._wakeup is not None:
+            self._loop.call_soon_threadsafe(_resolve, self._wakeup)
+            self._wakeup = None
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """Next buffered event; raises TimeoutError after `timeout` seconds and StopIteration
+        once the subscription is closed and drained."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._queue or self._closed, timeout):
+                raise TimeoutError()
+            if self._queue:
+                return self._queue.popleft()
+            raise StopIteration
+
+    def __iter__(self) -> 'Subscription':
+        return self
+
+    def __next__(self) -> Any:
+        return self.get()
+
+    def __aiter__(self) -> 'Subscription':
+        return self
+
+    async def __anext__(self) -> Any:
+        while True:
+            with self._cond:
+                if self._queue:
+                    return self._queue.popleft()
+                if self._closed:
+                    raise StopAsyncIteration
+                self._loop = asyncio.get_running_loop()
+                self._wakeup = wakeup = self._loop.create_future()
+            await wakeup
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._notify()
+        self._unsubscribe(self)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
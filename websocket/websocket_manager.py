@@ -1,6 +1,5 @@
 import json
-import time
-from threading import Thread, Lock
+from threading import Event, Thread, Lock
 
 from websocket import WebSocketApp
 
@@ -18,6 +17,9 @@ class WebsocketManager:
     def _on_message(self, ws, message):
         raise NotImplementedError()
 
+    def _on_open(self, ws):
+        pass
+
     def send(self, message):
         self.connect()
         self.ws.send(message)
@@ -28,24 +30,32 @@ class WebsocketManager:
     def _connect(self):
         assert not self.ws, "ws should be closed before attempting to connect"
 
-        self.ws = WebSocketApp(
+        # Set once the socket is open (after _on_open has run) or has failed
+        done = Event()
+        self.ws = ws = WebSocketApp(
             self._get_url(),
+            on_open=self._wrap_callback(self._opened(done)),
             on_message=self._wrap_callback(self._on_message),
             on_close=self._wrap_callback(self._on_close),
             on_error=self._wrap_callback(self._on_error),
         )
 
-        wst = Thread(target=self._run_websocket, args=(self.ws,))
+        wst = Thread(target=self._run_websocket, args=(ws, done))
         wst.daemon = True
         wst.start()
 
-        # Wait for socket to connect
-        ts = time.time()
-        while self.ws and (not self.ws.sock or not self.ws.sock.connected):
-            if time.time() - ts > self._CONNECT_TIMEOUT_S:
+        if not done.wait(self._CONNECT_TIMEOUT_S) or not (ws.sock and ws.sock.connected):
+            if self.ws is ws:
                 self.ws = None
-                return
-            time.sleep(0.1)
+                ws.close()
+
+    def _opened(self, done):
+        def on_open(ws):
+            try:
+                self._on_open(ws)
+            finally:
+                done.set()
+        return on_open
 
     def _wrap_callback(self, f):
         def wrapped_f(ws, *args, **kwargs):
@@ -56,12 +66,13 @@ class WebsocketManager:
                     raise Exception(f'Error running websocket callback: {e}')
         return wrapped_f
 
-    def _run_websocket(self, ws):
+    def _run_websocket(self, ws, done):
         try:
             ws.run_forever()
         except Exception as e:
             raise Exception(f'Unexpected error while running websocket: {e}')
         finally:
+            done.set()
             self._reconnect(ws)
 
     def _reconnect(self, ws):